@@ -4,9 +4,16 @@ import datetime
 import dateutil.parser
 import codecs
 import subprocess
+import time
+import cProfile
+import tracemalloc
+import struct
+
+# Record of resource_samples.bin written by resource_sampler.py: time, pid, cpu ticks (utime + stime), rss (kB), read bytes, write bytes
+RESOURCE_SAMPLE = struct.Struct("<dIQQQQ")
 
 def usage():
-    print("[+] Usage: ./{} <path_to_data_directory> <source_chain_id> <destination_chain_id> <n_users> <n_txs> <messages_per_tx>".format(sys.argv[0].lstrip("/.")))
+    print("[+] Usage: ./{} <path_to_data_directory> <source_chain_id> <destination_chain_id> <n_users> <n_txs> <messages_per_tx> [--profile] [--cprofile] [--plots]".format(sys.argv[0].lstrip("/.")))
 
 
 def read_file(data_dir, filename):
@@ -22,41 +29,6 @@ def get_n_validators(node_addr):
     return n_validators
 
 
-def calc_average_block_time(block_data):
-    block_times = []
-    for i in range(len(block_data) - 1):
-        current_block = dateutil.parser.parse(block_data[i]["block_time"])
-        next_block = dateutil.parser.parse(block_data[i+1]["block_time"])
-        time_diff = (next_block - current_block).total_seconds()
-        block_times.append(time_diff)
-        
-    avg_block_time = sum(block_times) / len(block_times)
-    return avg_block_time
-
-
-def get_benchmark_length(block_data):
-    first_block_time = dateutil.parser.parse(block_data[0]["block_time"])
-    last_block_time = dateutil.parser.parse(block_data[-1]["block_time"])
-    benchmark_length = (last_block_time - first_block_time).total_seconds()
-    return benchmark_length
-
-
-def count_messages(block_data):
-    transfer_msgs = 0 # Packet transfer messages
-    recv_msgs = 0 # Messages to signal transfers were received
-    ack_msgs = 0 # Messages to acknowledge that transfers were received
-    timeout_msgs = 0 # Messages to inform that a tx timeout has occured
-
-    for block in block_data:
-        for tx in block["transactions"]:
-            transfer_msgs += tx["MsgTransfer"]
-            recv_msgs += tx["MsgRecvPacket"]
-            ack_msgs += tx["MsgAcknowledgement"]
-            timeout_msgs += tx["MsgTimeout"]
-
-    return transfer_msgs, recv_msgs, ack_msgs, timeout_msgs
-
-
 def write_results(data_dir, results, filename):
     # Write benchmarking results to a file
     with open(data_dir + filename, "w") as f:
@@ -82,102 +54,29 @@ def get_size_in_bytes(encoded_tx_data):
     return size
 
 
-def get_detailed_tx_size(block_data):
-    transfer_info = [] # Store transfer transactions and their size in bytes
-    recv_info = [] # Store recv transactions and their size in bytes
-    ack_info = [] # Store ack transactions and their size in bytes
-    timeout_info = []
-    block_info = []
-    # Now we need to estimate the size of data in block without any transactions in it
-    # From empirical observation: blocks with 1 validator ~ 0.5kb; 5 val = 1kb; 10 val ~ 1.5kb; 15 val ~ 2kb; 20 val ~ 2.5kb
-    # Should be good enough to estimate block header size
-   
-    
-    for block in block_data: # For each block in the JSON data
-        block_info.append(block["block_size"]) # Block size in bytes, retrieved from Tendermint RPC
-        
-        for tx in block["transactions"]: # For each transaction inside the block 
-            # Count how many of each IBC message the transaction contains
-            msg_count = {"transfer": tx["MsgTransfer"], "recv": tx["MsgRecvPacket"], "ack": tx["MsgAcknowledgement"], "timeout": tx["MsgTimeout"]}
-            
-            # Transactions always contain one or more of only one type of message. 
-            # Check which type of message has the most occurrences, i,e, the one that is not 0,
-            # get its size and append to the corresponding message type list
-            if max(msg_count, key = msg_count.get) == "transfer" and msg_count["transfer"] > 0:
-                transfer_info.append([msg_count["transfer"], get_size_in_bytes(tx["tx_data"])])
-
-            elif max(msg_count, key = msg_count.get) == "recv" and msg_count["recv"] > 0:
-                recv_info.append([msg_count["recv"], get_size_in_bytes(tx["tx_data"])])
-
-            elif max(msg_count, key = msg_count.get) == "ack" and msg_count["ack"] > 0:
-                ack_info.append([msg_count["ack"], get_size_in_bytes(tx["tx_data"])])
+def get_tx_class(counts):
+    # Txs only contain messages of one type: index of the most frequent type in the (transfer, recv, ack, timeout) counts
+    # (the first one on ties), None if the tx has no IBC messages
+    tx_class = 0
+    for i in (1, 2, 3):
+        if counts[i] > counts[tx_class]:
+            tx_class = i
+    return tx_class if counts[tx_class] > 0 else None
 
-            elif max(msg_count, key = msg_count.get) == "timeout" and msg_count["timeout"] > 0:
-                timeout_info.append([msg_count["timeout"], get_size_in_bytes(tx["tx_data"])])
 
-    
-    return transfer_info, recv_info, ack_info, timeout_info, block_info
-
-
-def get_tx_size(block_data):
-    transfer_info = []
-    recv_info = []
-    ack_info = []
-    timeout_info = []
-    block_info = []
-
-    for block in block_data:
-        block_info.append(block["block_size"])
-        
-        for tx in block["transactions"]:
-            msg_count = {"transfer": tx["MsgTransfer"], "recv": tx["MsgRecvPacket"], "ack": tx["MsgAcknowledgement"],"timeout": tx["MsgTimeout"] }
-
-            if max(msg_count, key = msg_count.get) == "transfer" and msg_count["transfer"] > 0:
-                transfer_info.append(msg_count["transfer"])
-
-            elif max(msg_count, key = msg_count.get) == "recv" and msg_count["recv"] > 0:
-                recv_info.append(msg_count["recv"])
-
-            elif max(msg_count, key = msg_count.get) == "ack" and msg_count["ack"] > 0:
-                ack_info.append(msg_count["ack"])
-
-            elif max(msg_count, key = msg_count.get) == "timeout" and msg_count["timeout"] > 0:
-                timeout_info.append(msg_count["timeout"])
-
-    return transfer_info, recv_info, ack_info, timeout_info, block_info        
-
-
-def calc_data_size(transfer_info, recv_info, ack_info, timeout_info, block_info, chain_id, last_throughput_block):
+def format_data_size(tx_classes, total_block_data, n_blocks, chain_id):
+    # 'tx_classes' holds the [txs, messages] of the transfer, recv, ack and timeout txs. 'total_block_data' is the size of the
+    # 'n_blocks' blocks before the empty blocks at the end, all data committed including txs, messages and block information
     results = list()
-    
-    num_transfer_txs = len(transfer_info)
-    num_recv_txs = len(recv_info)
-    num_ack_txs = len(ack_info)
-    num_timeout_txs = len(timeout_info)
-    num_total_txs = num_transfer_txs + num_recv_txs + num_ack_txs + num_timeout_txs
 
-
-    num_transfer_msgs = sum(transfer_info)
-    num_recv_msgs = sum(recv_info)
-    num_ack_msgs = sum(ack_info)
-    num_timeout_msgs = sum(timeout_info)
+    (num_transfer_txs, num_transfer_msgs), (num_recv_txs, num_recv_msgs), (num_ack_txs, num_ack_msgs), (num_timeout_txs, num_timeout_msgs) = tx_classes
+    num_total_txs = num_transfer_txs + num_recv_txs + num_ack_txs + num_timeout_txs
     num_total_messages = num_transfer_msgs + num_recv_msgs + num_ack_msgs + num_timeout_msgs
 
-    total_block_data = sum(block_info[:last_throughput_block]) # All data committed to the blockchain including txs, messages and block information
-
-    if num_transfer_txs > 0:
-        avg_transfers_per_tx = num_transfer_msgs / num_transfer_txs
-
-    if num_recv_txs > 0:    
-        avg_recvs_per_tx = num_recv_msgs / num_recv_txs
-
-    if num_ack_txs > 0:       
-        avg_acks_per_tx = num_ack_msgs / num_ack_txs
-
     results.append("[+] {} analysis for chain '{}':\n".format("Data", chain_id))
     #results.append(" Number of blocks finalized: {}".format(len(block_info)) )
     results.append(" Collective size of all blocks (excl. empty blocks at the end): {}".format(format_size_unit(total_block_data)))
-    results.append(" Avg. block size (excl. empty blocks at the end): {}".format(format_size_unit(total_block_data / len(block_info[:last_throughput_block]))))
+    results.append(" Avg. block size (excl. empty blocks at the end): {}".format(format_size_unit(total_block_data / n_blocks)))
     results.append(" Number of transactions committed to the blockchain: {}".format(num_total_txs))
     results.append(" Number of messages committed in the blockchain: {}".format(num_total_messages))
     results.append("")
@@ -205,28 +104,17 @@ def calc_data_size(transfer_info, recv_info, ack_info, timeout_info, block_info,
     #results.append(" Avg. number of recv messages per tx:")
     return results
 
-def calc_detailed_data_size(transfer_info, recv_info, ack_info, timeout_info, block_info, chain_id):
+def format_detailed_data_size(tx_classes, tx_class_bytes, total_block_data, n_blocks, chain_id):
+    # 'tx_classes' holds the [txs, messages] and 'tx_class_bytes' the size of the transfer, recv, ack and timeout txs.
+    # 'total_block_data' is the size of all 'n_blocks' blocks, including txs, messages and block information
     results = list()
 
-    num_transfer_txs = len(transfer_info)
-    num_recv_txs = len(recv_info)
-    num_ack_txs = len(ack_info)
-    num_timeout_txs = len(timeout_info)
+    (num_transfer_txs, num_transfer_msgs), (num_recv_txs, num_recv_msgs), (num_ack_txs, num_ack_msgs), (num_timeout_txs, num_timeout_msgs) = tx_classes
     num_total_txs = num_transfer_txs + num_recv_txs + num_ack_txs + num_timeout_txs
-
-    num_transfer_msgs = sum([x[0] for x in transfer_info])
-    num_recv_msgs = sum([x[0] for x in recv_info])
-    num_ack_msgs = sum([x[0] for x in ack_info])
-    num_timeout_msgs = sum([x[0] for x in timeout_info])
     num_total_messages = num_transfer_msgs + num_recv_msgs + num_ack_msgs + num_timeout_msgs
 
-    all_transfer_data = sum([x[1] for x in transfer_info]) # Sum the size of all transfer transactions
-    all_recv_data = sum([x[1] for x in recv_info]) # Sum the size of all recv transactions
-    all_ack_data = sum([x[1] for x in ack_info]) # Sum the size of all ack transactions
-    all_timeout_data = sum([x[1] for x in timeout_info])
-
+    all_transfer_data, all_recv_data, all_ack_data, all_timeout_data = tx_class_bytes # Size of all transfer, recv, ack and timeout transactions
     total_tx_data = all_transfer_data + all_recv_data + all_ack_data + all_timeout_data # All tx data committed to the blockchain for the IBC transfers
-    total_block_data = sum(block_info) # All data committed to the blockchain including txs, messages and block information
 
     # Initialize variables as 0 and only add to results if they changed to != 0
     avg_transfer_tx_size = 0
@@ -253,9 +141,9 @@ def calc_detailed_data_size(transfer_info, recv_info, ack_info, timeout_info, bl
 
     
     results.append("[+] {} analysis for chain '{}':\n".format("Data", chain_id))
-    results.append(" Number of blocks finalized: {}".format(len(block_info)) )
+    results.append(" Number of blocks finalized: {}".format(n_blocks) )
     results.append(" Collective size of all blocks: {}".format(format_size_unit(total_block_data)))
-    results.append(" Avg. block size: {}".format(format_size_unit(total_block_data / len(block_info))))
+    results.append(" Avg. block size: {}".format(format_size_unit(total_block_data / n_blocks)))
     results.append(" Number of transactions committed to the blockchain: {}".format(num_total_txs))
     results.append(" Number of messages inside transactions: {}".format(num_total_messages))
     results.append(" Collective size of all transactions: {}".format(format_size_unit(total_tx_data)))
@@ -312,10 +200,11 @@ def get_transfer_status(src_transfers, dst_recvs, src_acks, src_timeouts, n_ibc_
     return finished, partially_finished, initiated, not_initiated, timed_out
 
 
-def calc_success_rate(src_data, dst_data, n_users, n_txs, msgs_per_tx, src_chain_id, dst_chain_id):
+def format_success_rate(src_messages, dst_messages, n_users, n_txs, msgs_per_tx, src_chain_id, dst_chain_id, channel=None):
+    # 'src_messages' and 'dst_messages' are the (transfer, recv, ack, timeout) message counts of each chain
     n_ibc_transfers = n_users * (n_txs * msgs_per_tx) 
-    src_transfers, src_recvs, src_acks, src_timeouts = count_messages(src_data)
-    dst_transfers, dst_recvs, dst_acks, dst_timeouts = count_messages(dst_data)
+    src_transfers, src_recvs, src_acks, src_timeouts = src_messages
+    dst_transfers, dst_recvs, dst_acks, dst_timeouts = dst_messages
     finished, partially_finished, initiated, not_initiated, timed_out = get_transfer_status(src_transfers, dst_recvs, src_acks, src_timeouts, n_ibc_transfers)
     finished_percentage = finished * 100 / n_ibc_transfers
     partially_finished_percentage = partially_finished * 100 / n_ibc_transfers
@@ -325,7 +214,7 @@ def calc_success_rate(src_data, dst_data, n_users, n_txs, msgs_per_tx, src_chain
     
     results = list()
 
-    results.append("[+] Success rate analysis for channel '{} -> {}':\n".format(src_chain_id, dst_chain_id))
+    results.append("[+] Success rate analysis for channel '{} -> {}'{}:\n".format(src_chain_id, dst_chain_id, format_channel(channel)))
 
     results.append(" IBC transfers submitted to '{}': {}".format(src_chain_id, n_ibc_transfers))
     results.append(" 'Transfer' messages committed to '{}': {}".format(src_chain_id, src_transfers))
@@ -344,17 +233,13 @@ def calc_success_rate(src_data, dst_data, n_users, n_txs, msgs_per_tx, src_chain
     return results
 
 
-def calc_throughput(block_data, last_throughput_block):
-    chain_id = block_data[0]["chain-id"]
-    block_data = block_data[:last_throughput_block]
-    n_blocks = len(block_data)
-    n_empty_blocks = sum([1 for block in block_data if len(block["transactions"]) == 0])
+def format_throughput(chain_id, n_blocks, n_empty_blocks, n_transactions, messages, first_block_time, last_block_time):
+    # Throughput over the blocks of the throughput window, 'messages' are the (transfer, recv, ack, timeout) message counts
     percentage_empty_blocks = n_empty_blocks *  100 / n_blocks
-    n_transactions = sum([len(block["transactions"]) for block in block_data])
     avg_txs_per_block = n_transactions / n_blocks
 
     #avg_txs_per_block_non_empty = n_transactions / (n_blocks - n_empty_blocks)
-    transfer_msgs, recv_msgs, ack_msgs, timeout_msgs = count_messages(block_data) 
+    transfer_msgs, recv_msgs, ack_msgs, timeout_msgs = messages
     n_messages = transfer_msgs + recv_msgs + ack_msgs + timeout_msgs
     
     if n_transactions == 0:
@@ -364,8 +249,8 @@ def calc_throughput(block_data, last_throughput_block):
 
     avg_msgs_per_block = avg_msgs_per_tx * avg_txs_per_block
     #avg_msgs_per_block_non_empty = avg_msgs_per_tx * avg_txs_per_block_non_empty
-    avg_block_time = calc_average_block_time(block_data)
-    benchmark_seconds = get_benchmark_length(block_data)
+    benchmark_seconds = (dateutil.parser.parse(last_block_time) - dateutil.parser.parse(first_block_time)).total_seconds()
+    avg_block_time = benchmark_seconds / (n_blocks - 1) # The block intervals add up to the time between the first and the last block
     txs_per_sec = n_transactions / benchmark_seconds
     messages_per_sec = n_messages / benchmark_seconds
     transfers_per_sec = transfer_msgs / benchmark_seconds
@@ -472,18 +357,9 @@ def parse_recv_latency(data):
     return recv_txs
 
 
-def calc_tx_distribution(block_data, chain_id):
-    # Get the distribution of transactions in the blocks generated during benchmark
-    tx_distribution = {}
+def format_tx_distribution(tx_distribution, chain_id):
+    # 'tx_distribution' maps a number of txs to the number of blocks containing that many txs
     results = list()
-    for block in block_data: # For each block
-        num_txs = block['num_transactions'] # Retrieve number of txs inside block
-        if num_txs in tx_distribution.keys():
-            tx_distribution[num_txs] += 1  # Add occurrence to dictionary (1 more block with 'num_txs' transactions)
-        else:
-            tx_distribution[num_txs] = 1 # Initialize key on dictionary (blocks containing 'num_txs' transactions)
-
-
     results.append("[+] Transaction distribution analysis for {}:\n".format(chain_id))
     for key in sorted(tx_distribution.keys()):
         results.append(" {} tx(s): {} block(s)".format(key, tx_distribution[key]))
@@ -517,32 +393,19 @@ def format_time_unit(time):
 
     return time
 
-def parse_txs_from_blocks(data):
-    transactions = {}
-    for block in data:
-        for tx in block['transactions']:
-            tx_hash = tx['tx_hash']
-            num_transfer_msgs = tx['MsgTransfer']
-            num_recv_msgs = tx['MsgRecvPacket']
-            num_ack_msgs = tx['MsgAcknowledgement']
-            num_timeout_msgs = tx['MsgTimeout']
-            transactions[tx_hash] = {'MsgTransfer': num_transfer_msgs, 'MsgRecvPacket': num_recv_msgs, 'MsgAcknowledgement': num_ack_msgs, 'MsgTimeout': num_timeout_msgs} 
-            
-    return transactions
-
-
-def calc_round_trip_time(relayer_data, src_chain_id, dst_chain_id, src_txs, dst_txs, data_dir):
+def calc_round_trip_time(relayer_data, src_chain_id, dst_chain_id, src_txs, dst_txs, data_dir, channel=None):
+    # When 'channel' is given, src_txs and dst_txs only contain that channel's txs and events of other channels are skipped
     transfer_broadcasts = []
     recv_broadcasts = []
     ack_broadcasts = []
     ack_confirmations = []    
-    ack_hashes = []
+    ack_hashes = set()
     rt_times = []    
     transfer_times = []
     recv_times = []
     ack_times = []
     ack_confirmation_times = []
-    transfer_hashes = []
+    transfer_hashes = set()
     results = []
 
     for event in relayer_data:
@@ -554,13 +417,13 @@ def calc_round_trip_time(relayer_data, src_chain_id, dst_chain_id, src_txs, dst_
             timestamp = event[:27]
             tx_hash = event.split("transaction::Hash")[-1].split()[0].strip("()") # Get transaction hash of broadcasted transaction
             ack_broadcasts.append([timestamp, tx_hash])
-            ack_hashes.append(tx_hash) # Ack tx hash, used later to check if a confirmed tx hash is an ack or a recv tx
+            ack_hashes.add(tx_hash) # Ack tx hash, used later to check if a confirmed tx hash is an ack or a recv tx
         elif 'event="SendPacket"' in event and "ERROR" not in event:
             timestamp = event[:27]
             tx_hash = event.split(" ")[-2]
             if tx_hash not in transfer_hashes: # Every transaction has many SendPacket events, one for each message, if the transaction hash has already been tracked, skip
                 transfer_broadcasts.append([timestamp, tx_hash])
-                transfer_hashes.append(tx_hash)
+                transfer_hashes.add(tx_hash)
 
     for event in relayer_data:
         if "transactions confirmed" in event: # If a transaction has been confirmed
@@ -577,6 +440,8 @@ def calc_round_trip_time(relayer_data, src_chain_id, dst_chain_id, src_txs, dst_
     for transfer in transfer_broadcasts:
         transfer_tx_hash = transfer[1]
         transfer_timestamp = transfer[0]
+        if transfer_tx_hash not in src_txs: # Transfer on another channel
+            continue
         num_transfers = src_txs[transfer_tx_hash]['MsgTransfer']
         for i in range(num_transfers):
             transfer_times.append(transfer_timestamp)
@@ -585,11 +450,11 @@ def calc_round_trip_time(relayer_data, src_chain_id, dst_chain_id, src_txs, dst_
     for recv in recv_broadcasts:
         recv_tx_hash = recv[1]
         recv_timestamp = recv[0]
-        if recv_tx_hash in dst_txs.keys():
+        if recv_tx_hash in dst_txs:
             num_recvs = dst_txs[recv_tx_hash]['MsgRecvPacket']
             for i in range(num_recvs):
                 recv_times.append(recv_timestamp)
-        else:        
+        elif channel is None:
             print("######## UNKNOWN RECV TX HASH #########")
             print(recv_tx_hash)
  
@@ -597,16 +462,19 @@ def calc_round_trip_time(relayer_data, src_chain_id, dst_chain_id, src_txs, dst_
     for confirmation in ack_confirmations:
         confirmation_hash = confirmation[1]
         confirmation_timestamp = confirmation[0]
+        if confirmation_hash not in src_txs: # Ack on another channel
+            continue
         # Confirmation hash is the same as ack hash, it merely confirms the commitment of the tx with this specific hash that was broadcasted before
         num_confirmations = src_txs[confirmation_hash]['MsgAcknowledgement']
         for i in range(num_confirmations):
             ack_confirmation_times.append(confirmation_timestamp)
 
 
+    confirmed_ack_hashes = set([confirmation[1] for confirmation in ack_confirmations])
     for ack in ack_broadcasts:
         ack_tx_hash = ack[1]
         ack_timestamp = ack[0]
-        if ack_tx_hash in [x[1] for x in ack_confirmations]: # Only count ack tx if its hash is in the confirmed acks list, i.e, not timed out
+        if ack_tx_hash in confirmed_ack_hashes and ack_tx_hash in src_txs: # Only count ack tx if its hash is in the confirmed acks list, i.e, not timed out
             num_acks = src_txs[ack_tx_hash]['MsgAcknowledgement']
             for i in range(num_acks):
                 ack_times.append(ack_timestamp)  
@@ -614,15 +482,23 @@ def calc_round_trip_time(relayer_data, src_chain_id, dst_chain_id, src_txs, dst_
 
     completed_msg_round_trips = min(len(transfer_times), len(recv_times), len(ack_times), len(ack_confirmation_times))
 
-    with open(data_dir + "round_trip_times.txt", "w") as f:
+    rtt_filename = "round_trip_times.txt" if channel is None else "round_trip_times_{}.txt".format(channel)
+
+    parsed_times = {} # Messages of the same tx share their timestamps, parse each timestamp once
+    def parse_time(timestamp):
+        if timestamp not in parsed_times:
+            parsed_times[timestamp] = dateutil.parser.parse(timestamp)
+        return parsed_times[timestamp]
+
+    with open(data_dir + rtt_filename, "w") as f:
         header = "transfer_broadcast;recv_broadcast;ack_broadcast;ack_confirmation;round_trip_time"
         f.write(header + "\n")
         for i in range(completed_msg_round_trips):
-            rtt = (dateutil.parser.parse(ack_confirmation_times[i]) - dateutil.parser.parse(transfer_times[i])).total_seconds()
+            rtt = (parse_time(ack_confirmation_times[i]) - parse_time(transfer_times[i])).total_seconds()
             f.write("{};{};{};{};{}\n".format(transfer_times[i], recv_times[i], ack_times[i], ack_confirmation_times[i], rtt))
             rt_times.append(rtt)
         
-    results.append("[+] Round trip time analysis for chains '{} -> {}':\n".format(src_chain_id, dst_chain_id))
+    results.append("[+] Round trip time analysis for chains '{} -> {}'{}:\n".format(src_chain_id, dst_chain_id, format_channel(channel)))
 
     if len(rt_times) > 0: # If at least one message got delivered (transfer, recv, ack)
         avg_rtt = sum(rt_times)/len(rt_times)
@@ -638,7 +514,66 @@ def calc_round_trip_time(relayer_data, src_chain_id, dst_chain_id, src_txs, dst_
     return results
 
 
-def calc_latency(transfer_latency, recv_latency, ack_latency, src_chain_id, dst_chain_id):
+def parse_relayer_broadcasts(relayer_data, chain_id):
+    # Get the hashes of the transactions a relayer broadcasted to 'chain_id' and how many of them were rejected as redundant
+    tx_hashes = set()
+    redundant_rejections = 0
+
+    for event in relayer_data:
+        if "send_tx_with_account_sequence_retry{id=" + chain_id + "}" not in event:
+            continue
+        if "broadcast_tx_sync" in event and "ERROR" not in event:
+            tx_hashes.add(event.split("transaction::Hash")[-1].split()[0].strip("()"))
+        elif "redundant" in event: # Every packet in the tx had already been relayed by someone else, rejected on CheckTx
+            redundant_rejections += 1
+
+    return tx_hashes, redundant_rejections
+
+
+def calc_relayer_attribution(relayer_logs, src_chain_id, dst_chain_id, src_messages, dst_messages, src_txs, dst_txs):
+    # Attribute the recv/ack messages committed to the chains to the relayer instance that broadcasted them and
+    # estimate how many relayed messages were wasted on packets that had already been relayed. 'src_messages' and
+    # 'dst_messages' are the (transfer, recv, ack, timeout) message counts of each chain
+    src_transfers, src_recvs, src_acks, src_timeouts = src_messages
+    dst_transfers, dst_recvs, dst_acks, dst_timeouts = dst_messages
+    results = list()
+
+    results.append("[+] Relayer attribution analysis for channel '{} -> {}':\n".format(src_chain_id, dst_chain_id))
+    results.append(" Relayer instances: {}".format(len(relayer_logs)))
+    results.append("")
+
+    for relayer in sorted(relayer_logs.keys()):
+        recv_hashes, recv_rejections = parse_relayer_broadcasts(relayer_logs[relayer], dst_chain_id)
+        ack_hashes, ack_rejections = parse_relayer_broadcasts(relayer_logs[relayer], src_chain_id)
+
+        recv_txs = [dst_txs[tx_hash] for tx_hash in recv_hashes if tx_hash in dst_txs] # Only txs committed to the chain
+        ack_txs = [src_txs[tx_hash] for tx_hash in ack_hashes if tx_hash in src_txs]
+        relayer_recvs = sum([tx['MsgRecvPacket'] for tx in recv_txs])
+        relayer_acks = sum([tx['MsgAcknowledgement'] for tx in ack_txs])
+
+        results.append(" {}:".format(relayer))
+        results.append("  'Receive' messages committed to '{}': {} in {} tx(s) ({:.2f}%)".format(dst_chain_id, relayer_recvs, len(recv_txs),
+            relayer_recvs * 100 / dst_recvs if dst_recvs > 0 else 0))
+        results.append("  'Acknowledgement' messages committed to '{}': {} in {} tx(s) ({:.2f}%)".format(src_chain_id, relayer_acks, len(ack_txs),
+            relayer_acks * 100 / src_acks if src_acks > 0 else 0))
+        results.append("  Txs rejected as redundant: {} recv, {} ack".format(recv_rejections, ack_rejections))
+        results.append("")
+
+    # Each transfer can be received and acknowledged only once, committed messages above that were redundant relays
+    # (the "more acks than transfers" case handled in get_transfer_status)
+    redundant_recvs = max(dst_recvs - src_transfers, 0)
+    redundant_acks = max(src_acks - src_transfers, 0)
+    relayed_msgs = dst_recvs + src_acks
+
+    results.append(" Redundant 'Receive' messages committed to '{}': {}".format(dst_chain_id, redundant_recvs))
+    results.append(" Redundant 'Acknowledgement' messages committed to '{}': {}".format(src_chain_id, redundant_acks))
+    results.append(" Wasted relayed messages: {} ({:.2f}% of relayed messages)".format(redundant_recvs + redundant_acks,
+        (redundant_recvs + redundant_acks) * 100 / relayed_msgs if relayed_msgs > 0 else 0))
+
+    return results
+
+
+def calc_latency(transfer_latency, recv_latency, ack_latency, src_chain_id, dst_chain_id, channel=None):
     results = list()
 
     if len(transfer_latency) == 0:
@@ -668,7 +603,7 @@ def calc_latency(transfer_latency, recv_latency, ack_latency, src_chain_id, dst_
         shortest_ack = min(ack_latency, key = lambda ack_latency:ack_latency[1])[1]
         longest_ack = max(ack_latency, key = lambda ack_latency:ack_latency[1])[1]
 
-    results.append("[+] {} analysis for chains '{} -> {}':\n".format("IBC messages confirmation latency", src_chain_id, dst_chain_id))
+    results.append("[+] {} analysis for chains '{} -> {}'{}:\n".format("IBC messages confirmation latency", src_chain_id, dst_chain_id, format_channel(channel)))
 
     results.append(" Avg. transfer message confirmation latency: {}".format(format_time_unit(avg_transfer_latency)))
     results.append(" Shortest transfer latency observed: {}".format(format_time_unit(shortest_transfer)))
@@ -685,6 +620,233 @@ def calc_latency(transfer_latency, recv_latency, ack_latency, src_chain_id, dst_
     return results
 
 
+def calc_commit_latency(commit_data, chain_id):
+    # Analyze consensus commits: validator vote latency, multi-round blocks and block time per proposer
+    vote_latency = {} # Validator address -> list of signature delays relative to the block time (seconds)
+    missed_votes = {} # Validator address -> number of commits in which the validator did not sign the block
+    proposer_intervals = {} # Proposer address -> list of intervals between the previous block and the block they proposed
+    multi_round_blocks = 0
+    results = list()
+
+    previous_block_time = None
+    block_intervals = []
+
+    for commit in commit_data:
+        block_time = dateutil.parser.parse(commit["block_time"])
+
+        if int(commit["round"]) > 0: # The block was not committed in the first round
+            multi_round_blocks += 1
+
+        if previous_block_time is not None:
+            interval = (block_time - previous_block_time).total_seconds()
+            block_intervals.append(interval)
+            proposer_intervals.setdefault(commit["proposer"], []).append(interval)
+        previous_block_time = block_time
+
+        for signature in commit["signatures"]:
+            validator = signature["validator"]
+            if int(signature["flag"]) != 2 or not validator: # Only BlockIDFlagCommit (2) carries a vote for the block
+                if validator:
+                    missed_votes[validator] = missed_votes.get(validator, 0) + 1
+                continue
+            delay = (dateutil.parser.parse(signature["timestamp"]) - block_time).total_seconds()
+            vote_latency.setdefault(validator, []).append(delay)
+
+    n_commits = len(commit_data)
+    avg_block_time = sum(block_intervals) / len(block_intervals) if len(block_intervals) > 0 else 0
+
+    results.append("[+] Consensus commit analysis for chain '{}':\n".format(chain_id))
+    results.append(" Commits analyzed: {}".format(n_commits))
+    if n_commits == 0:
+        return results
+
+    results.append(" Blocks committed after more than one round: {} ({:.2f}%)".format(multi_round_blocks, multi_round_blocks * 100 / n_commits))
+    results.append("")
+
+    results.append(" Validator vote latency (signature time - block time):")
+    for validator in missed_votes.keys(): # Validators that never signed still need to show up in the report
+        vote_latency.setdefault(validator, [])
+
+    # Slowest validators first, since those are the ones delaying the commits
+    for validator in sorted(vote_latency.keys(), key = lambda v: sum(vote_latency[v]) / len(vote_latency[v]) if len(vote_latency[v]) > 0 else float("inf"), reverse = True):
+        delays = vote_latency[validator]
+        if len(delays) == 0:
+            results.append("  {}: no votes for committed blocks, missed votes: {}".format(validator, missed_votes[validator]))
+            continue
+        avg_delay = sum(delays) / len(delays)
+        if avg_block_time > 0:
+            share = " ({:.2f}% of avg. block time)".format(avg_delay * 100 / avg_block_time)
+        else:
+            share = ""
+        results.append("  {}: avg. {}{}, max {}, missed votes: {}".format(validator, format_time_unit(max(avg_delay, 0)), share,
+            format_time_unit(max(max(delays), 0)), missed_votes.get(validator, 0)))
+
+    results.append("")
+    results.append(" Block time by proposer (avg. block time: {:.3f} seconds):".format(avg_block_time))
+    for proposer in sorted(proposer_intervals.keys(), key = lambda p: sum(proposer_intervals[p]) / len(proposer_intervals[p]), reverse = True):
+        intervals = proposer_intervals[proposer]
+        avg_interval = sum(intervals) / len(intervals)
+        results.append("  {}: {} block(s), avg. {:.3f}s ({:+.3f}s), min {:.3f}s, max {:.3f}s".format(proposer, len(intervals), avg_interval,
+            avg_interval - avg_block_time, min(intervals), max(intervals)))
+
+    return results
+
+
+def read_consensus_params(data_dir, filename):
+    # Block limits of the chain as {"max_bytes": int, "max_gas": int}, None when the file was not collected (older runs).
+    # A max_gas of -1 means blocks have no gas limit
+    try:
+        consensus_params = json.loads("".join(read_file(data_dir, filename)))
+    except (OSError, ValueError):
+        return None
+    if not consensus_params or "block" not in consensus_params:
+        return None
+    return {"max_bytes": int(consensus_params["block"]["max_bytes"]), "max_gas": int(consensus_params["block"]["max_gas"])}
+
+
+def get_percentile(sorted_values, percentile):
+    # Nearest-rank percentile of an already sorted list
+    index = max(int(-(-len(sorted_values) * percentile // 100)) - 1, 0)
+    return sorted_values[index]
+
+
+def format_utilization(utilization, saturation_threshold):
+    # Distribution summary of per-block utilization ratios
+    utilization = sorted(utilization)
+    saturated = sum([1 for value in utilization if value >= saturation_threshold])
+    results = list()
+    results.append("  Avg.: {:.2f}%, min: {:.2f}%, p50: {:.2f}%, p90: {:.2f}%, p99: {:.2f}%, max: {:.2f}%".format(sum(utilization) * 100 / len(utilization),
+        utilization[0] * 100, get_percentile(utilization, 50) * 100, get_percentile(utilization, 90) * 100, get_percentile(utilization, 99) * 100, utilization[-1] * 100))
+    results.append("  Saturated blocks (>= {:.0f}% of the limit): {} ({:.2f}%)".format(saturation_threshold * 100, saturated, saturated * 100 / len(utilization)))
+    return results
+
+
+def format_block_utilization(block_sizes, block_gas_wanted, gas_used, has_gas, consensus_params, chain_id, saturation_threshold = 0.9):
+    # How close blocks were to the max_bytes and max_gas limits of the consensus parameters. Gas is counted by the gas
+    # wanted of the txs, which is what the proposer checks against max_gas when filling a block. 'block_sizes' and
+    # 'block_gas_wanted' have one value per block, 'gas_used' is the total of the blocks
+    results = list()
+
+    results.append("[+] Block capacity utilization analysis for chain '{}':\n".format(chain_id))
+    if consensus_params is None:
+        results.append(" Consensus parameters were not collected, block capacity cannot be analyzed.")
+        return results
+    if len(block_sizes) == 0:
+        results.append(" No blocks to analyze.")
+        return results
+
+    max_bytes = consensus_params["max_bytes"]
+    max_gas = consensus_params["max_gas"]
+    gas_wanted = sum(block_gas_wanted)
+
+    results.append(" Max. block size: {}".format(format_size_unit(max_bytes)))
+    results.append(" Max. block gas: {}".format(max_gas if max_gas > 0 else "unlimited"))
+    results.append("")
+
+    results.append(" Block size utilization:")
+    results += format_utilization([block_size / max_bytes for block_size in block_sizes], saturation_threshold)
+    results.append("")
+
+    if not has_gas:
+        results.append(" Tx gas was not collected, block gas cannot be analyzed.")
+        return results
+
+    results.append(" Avg. gas wanted per block: {:.0f}, avg. gas used per block: {:.0f} ({:.2f}% of gas wanted)".format(gas_wanted / len(block_sizes),
+        gas_used / len(block_sizes), gas_used * 100 / gas_wanted if gas_wanted > 0 else 0))
+    results.append(" Max. gas wanted in a block: {}".format(max(block_gas_wanted)))
+    if max_gas > 0:
+        results.append("")
+        results.append(" Block gas utilization (gas wanted):")
+        results += format_utilization([block_gas / max_gas for block_gas in block_gas_wanted], saturation_threshold)
+
+    return results
+
+
+def read_resource_samples(data_dir):
+    # {pid: [[time, cpu ticks, rss kB, read bytes, write bytes], ...]} and the process description written by resource_sampler.py,
+    # (None, None) when resource usage was not sampled
+    try:
+        with open(data_dir + "resource_processes.json", "r") as f:
+            processes = json.load(f)
+        with open(data_dir + "resource_samples.bin", "rb") as f:
+            data = f.read()
+    except (OSError, ValueError):
+        return None, None
+
+    samples = {}
+    complete = len(data) - len(data) % RESOURCE_SAMPLE.size # Ignore a record truncated when the sampler was stopped
+    for timestamp, pid, cpu_ticks, rss, read_bytes, write_bytes in RESOURCE_SAMPLE.iter_unpack(data[:complete]):
+        samples.setdefault(pid, []).append([timestamp, cpu_ticks, rss, read_bytes, write_bytes])
+    return samples, processes
+
+
+def read_benchmark_phases(data_dir, filename):
+    # [[phase, start, end], ...] from the '<phase> <unix time>' lines benchmark.sh writes when a phase starts, the last line marks the end
+    try:
+        marks = [line.split() for line in read_file(data_dir, filename) if len(line.split()) == 2]
+    except OSError:
+        return []
+    return [[marks[i][0], float(marks[i][1]), float(marks[i + 1][1])] for i in range(len(marks) - 1)]
+
+
+def calc_resource_usage(samples, processes, phases):
+    # CPU utilization (100% = one core), RSS peak and disk I/O rates of each process in each benchmark phase
+    results = list()
+    results.append("[+] Resource usage of local gaiad and hermes processes:\n")
+
+    if samples is None:
+        results.append(" Resource usage was not sampled.")
+        return results
+
+    clock_ticks = processes["clock_ticks"]
+    labels = processes["processes"]
+    if len(phases) == 0: # No phase marks, report the whole sampling period
+        all_times = [sample[0] for pid_samples in samples.values() for sample in pid_samples]
+        phases = [["run", min(all_times), max(all_times)]] if len(all_times) > 0 else []
+
+    for phase, start, end in phases:
+        results.append(" Phase '{}' ({}):".format(phase, format_time_unit(end - start)))
+        for pid in sorted(samples.keys(), key = lambda pid: labels.get(str(pid), "")):
+            phase_samples = [sample for sample in samples[pid] if start <= sample[0] <= end]
+            if len(phase_samples) < 2:
+                continue
+            first, last = phase_samples[0], phase_samples[-1]
+            elapsed = last[0] - first[0]
+            if elapsed <= 0:
+                continue
+            # Utilization between consecutive samples, the maximum shows bursts the phase average hides
+            interval_cpu = [(b[1] - a[1]) / clock_ticks * 100 / (b[0] - a[0]) for a, b in zip(phase_samples, phase_samples[1:]) if b[0] > a[0]]
+            results.append("  {} (pid {}): CPU avg. {:.1f}% (max {:.1f}%), RSS peak {}, disk read {}/s, write {}/s".format(labels.get(str(pid), "unknown"), pid,
+                (last[1] - first[1]) / clock_ticks * 100 / elapsed, max(interval_cpu), format_size_unit(max([sample[2] for sample in phase_samples]) * 1024),
+                format_size_unit((last[3] - first[3]) / elapsed), format_size_unit((last[4] - first[4]) / elapsed)))
+        results.append("")
+
+    return results
+
+
+def format_channel(channel):
+    # Suffix for report headers of per-channel analyses, empty for the aggregate over all channels
+    if channel is None:
+        return ""
+    return " ({})".format(channel)
+
+
+def sort_channels(channels):
+    # Channels (on the source chain) in numeric order, e.g. ['channel-0', 'channel-1', ..., 'channel-10']
+    return sorted(channels, key = lambda channel: int(channel.split("-")[-1]))
+
+
+def filter_latency_by_txs(latency, txs):
+    # Keep only the [tx_hash, latency] pairs whose transaction is in 'txs'
+    return [tx for tx in latency if tx[0] in txs]
+
+
+def get_channel_users(n_users, n_channels, channel):
+    # Number of users submitting to 'channel', users are assigned to channels in round robin by benchmark.sh
+    channel_index = int(channel.split("-")[-1])
+    return len([user for user in range(1, n_users + 1) if (user - 1) % n_channels == channel_index])
+
+
 def load_json(data):
     block_data = list()
     
@@ -693,6 +855,181 @@ def load_json(data):
         block_data.append(block)
     return block_data
 
+class BlockMetrics:
+    # Per-chain aggregates of the block data, updated one block at a time (add_block) so every block and tx is visited once
+    # for all analyses: message counts, tx distribution, tx classification, the throughput window (the first
+    # 'last_throughput_block' blocks, all of them when None) with its block size and gas values for the capacity analysis,
+    # the per-channel message counts and the tx hash index used by the round trip time analysis
+    def __init__(self, last_throughput_block = None):
+        self.last_throughput_block = last_throughput_block
+        self.chain_id = None
+        self.n_blocks = 0
+        self.bytes = 0 # Size of all blocks
+        self.messages = [0, 0, 0, 0] # Transfer, recv, ack and timeout messages in all blocks
+        self.tx_distribution = {} # Number of txs -> blocks containing that many txs
+        self.tx_classes = [[0, 0], [0, 0], [0, 0], [0, 0]] # [txs, messages] of the transfer, recv, ack and timeout txs
+        self.tx_class_bytes = [0, 0, 0, 0] # Encoded size of the transfer, recv, ack and timeout txs, when the tx data was collected
+        self.txs = {} # Tx hash -> message counts
+        self.channels = {} # Channel -> {"messages": [transfer, recv, ack, timeout], "txs": {tx hash -> message counts}}
+
+        self.window_blocks = 0
+        self.window_empty_blocks = 0
+        self.window_txs = 0
+        self.window_messages = [0, 0, 0, 0]
+        self.window_bytes = 0
+        self.window_first_time = None
+        self.window_last_time = None
+        self.window_block_sizes = list()
+        self.window_block_gas_wanted = list()
+        self.window_gas_used = 0
+        self.window_has_gas = True # Gas was not collected by older runs
+
+    def add_block(self, block):
+        if self.chain_id is None:
+            self.chain_id = block["chain-id"]
+        in_window = self.last_throughput_block is None or self.n_blocks < self.last_throughput_block
+        self.n_blocks += 1
+        self.bytes += block["block_size"]
+
+        n_txs = block["num_transactions"]
+        self.tx_distribution[n_txs] = self.tx_distribution.get(n_txs, 0) + 1
+
+        messages = self.messages
+        window_messages = self.window_messages
+        block_gas_wanted = 0
+        for tx in block["transactions"]:
+            counts = (tx["MsgTransfer"], tx["MsgRecvPacket"], tx["MsgAcknowledgement"], tx["MsgTimeout"])
+            messages[0] += counts[0]
+            messages[1] += counts[1]
+            messages[2] += counts[2]
+            messages[3] += counts[3]
+            if in_window:
+                window_messages[0] += counts[0]
+                window_messages[1] += counts[1]
+                window_messages[2] += counts[2]
+                window_messages[3] += counts[3]
+                if "gas_wanted" not in tx:
+                    self.window_has_gas = False
+                block_gas_wanted += tx.get("gas_wanted", 0)
+                self.window_gas_used += tx.get("gas_used", 0)
+
+            tx_class = get_tx_class(counts)
+            if tx_class is not None:
+                self.tx_classes[tx_class][0] += 1
+                self.tx_classes[tx_class][1] += counts[tx_class]
+                if "tx_data" in tx: # Detailed tx analysis
+                    self.tx_class_bytes[tx_class] += get_size_in_bytes(tx["tx_data"])
+
+            tx_counts = {"MsgTransfer": counts[0], "MsgRecvPacket": counts[1], "MsgAcknowledgement": counts[2], "MsgTimeout": counts[3]}
+            self.txs[tx["tx_hash"]] = tx_counts
+
+            if tx.get("channel"):
+                channel = self.channels.get(tx["channel"])
+                if channel is None:
+                    channel = self.channels[tx["channel"]] = {"messages": [0, 0, 0, 0], "txs": {}}
+                channel_messages = channel["messages"]
+                channel_messages[0] += counts[0]
+                channel_messages[1] += counts[1]
+                channel_messages[2] += counts[2]
+                channel_messages[3] += counts[3]
+                channel["txs"][tx["tx_hash"]] = tx_counts # Shared with the tx index, not copied
+
+        if in_window:
+            self.window_blocks += 1
+            self.window_txs += len(block["transactions"])
+            self.window_bytes += block["block_size"]
+            if len(block["transactions"]) == 0:
+                self.window_empty_blocks += 1
+            if self.window_first_time is None:
+                self.window_first_time = block["block_time"]
+            self.window_last_time = block["block_time"]
+            self.window_block_sizes.append(int(block["block_size"]))
+            self.window_block_gas_wanted.append(block_gas_wanted)
+
+    def get_throughput_window(self):
+        # Arguments of format_throughput after the chain id
+        return self.window_blocks, self.window_empty_blocks, self.window_txs, self.window_messages, self.window_first_time, self.window_last_time
+
+    def get_channel(self, channel):
+        # Message counts and tx index of a channel, empty when no tx of the chain belongs to it
+        return self.channels.get(channel, {"messages": [0, 0, 0, 0], "txs": {}})
+
+
+def read_block_metrics(data_dir, filename, last_throughput_block = None, keep_blocks = False):
+    # Stream a block data file (one JSON block per line) into a BlockMetrics, returning the metrics and, with 'keep_blocks',
+    # the parsed blocks (None otherwise). Without them, only one block is held in memory at a time
+    block_data = list() if keep_blocks else None
+    metrics = BlockMetrics(last_throughput_block)
+    with open(data_dir + filename, "r") as f:
+        for line in f:
+            block = json.loads(line)
+            metrics.add_block(block)
+            if keep_blocks:
+                block_data.append(block)
+    return block_data, metrics
+
+
+class StageProfiler:
+    # Measures wall time, CPU time and peak memory (tracemalloc) of each analysis stage, optionally with a cProfile
+    # profile per stage. When disabled, run() only calls the stage function so the analysis is not slowed down.
+    # Like benchmark_analysis.py, time and memory are measured in separate runs of each stage: tracemalloc hooks every
+    # allocation and would slow allocation-heavy stages down several times
+    def __init__(self, enabled = False, cprofile = False):
+        self.enabled = enabled
+        self.cprofile = cprofile
+        self.stages = {} # Stage name -> {"calls", "wall", "cpu", "peak_memory"}, in order of first execution
+        self.profiles = {} # Stage name -> cProfile.Profile
+
+    def run(self, name, function, *args):
+        if not self.enabled:
+            return function(*args)
+
+        if self.cprofile and name not in self.profiles:
+            self.profiles[name] = cProfile.Profile()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        if self.cprofile:
+            self.profiles[name].enable()
+
+        result = function(*args)
+
+        if self.cprofile:
+            self.profiles[name].disable()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+
+        # Memory run, the stage is executed again under tracemalloc and its result discarded
+        tracemalloc.start()
+        function(*args)
+        peak_memory = tracemalloc.get_traced_memory()[1] # Memory allocated by this stage on top of what was already in use
+        tracemalloc.stop()
+
+        stage = self.stages.setdefault(name, {"calls": 0, "wall": 0, "cpu": 0, "peak_memory": 0})
+        stage["calls"] += 1
+        stage["wall"] += wall
+        stage["cpu"] += cpu
+        stage["peak_memory"] = max(stage["peak_memory"], peak_memory)
+        return result
+
+    def write(self, data_dir, filename):
+        # Write the measurements as JSON and the cProfile stats of each stage as profile_<stage>.prof
+        with open(data_dir + filename, "w") as f:
+            json.dump({"stages": self.stages}, f, indent = 2)
+        for name, profile in self.profiles.items():
+            profile.dump_stats(data_dir + "profile_{}.prof".format(name))
+
+    def get_results(self):
+        results = list()
+        results.append("[+] Analysis profile{}:\n".format(" (timings under cProfile)" if self.cprofile else ""))
+        for name, stage in sorted(self.stages.items(), key = lambda item: item[1]["wall"], reverse = True):
+            results.append(" {}: wall {}, cpu {}, peak memory {} ({} call(s))".format(name, format_time_unit(stage["wall"]),
+                format_time_unit(stage["cpu"]), format_size_unit(stage["peak_memory"]), stage["calls"]))
+        results.append("")
+        results.append(" Total analysis time: {}".format(format_time_unit(sum([stage["wall"] for stage in self.stages.values()]))))
+        return results
+
+
 def pretty_print_time(seconds):
     if seconds < 3600:
         elapsed = "{}m {}s".format((seconds // 60), (seconds % 60))
@@ -14,6 +14,22 @@ display_usage() {
   echo " -w | --wait-for-blocks     [Optional] Stop waiting for transactions to complete/timeout and start analyzing data after this many empty blocks have been produced in a row (default: 5)."
   echo " --tx-timeout               [Optional] Specify how many new blocks can be created before a cross-chain transfer times out (default: 25)."
   echo " --transaction-analysis     [Optional] Enables analysis of transaction and IBC message sizes (slower)."
+  echo " --src-endpoints            [Optional] Comma separated RPC addresses of source chain validators to spread data collection across (default: --source-addr)."
+  echo " --dst-endpoints            [Optional] Comma separated RPC addresses of destination chain validators to spread data collection across (default: --destination-addr)."
+  echo " --rpc-concurrency          [Optional] Number of block ranges retrieved in parallel from each RPC endpoint (default: 1)."
+  echo " --profile-analysis         [Optional] Measure time and memory of each data analysis stage (written to analysis_profile.json and the report)."
+  echo " --plots                    [Optional] Render latency, round trip time and throughput figures to <OUTPUT_DIR>/plots/ (requires matplotlib)."
+  echo " --resource-interval        [Optional] Seconds between CPU, memory and disk I/O samples of the local gaiad and hermes processes, 0 disables sampling (default: 1)."
+  echo " --pprof                    [Optional] Capture CPU profiles of this many seconds and heap profiles from the pprof endpoints of the local gaiad nodes at the start of each phase and when a chain saturates."
+  echo " --hermes-config            [Optional] Configuration file of the relaying hermes instances, tx submissions always use hermes_config.toml (default: hermes_config.toml)."
+  echo " --cpus                     [Optional] Pin the benchmark, its relayers and tx submissions to these CPUs, e.g. the ones left free by setup_chains.sh --pin-cpus (taskset list, e.g. 0-3)."
+  echo " --ready-timeout            [Optional] Seconds to wait for the nodes to be synchronized and the relayers to start before giving up (default: 180)."
+  echo " -r | --relayers            [Optional] Number of relayer instances to run, each with its own key and log (default: 1)."
+  echo " -c | --channels            [Optional] Number of transfer channels (channel-0 ... channel-<N-1>) to distribute users across, as created by setup_chains.sh (default: 1)."
+  echo " --relayer-mode             [Optional] 'compete' (every relayer relays every channel) or 'partition' (channels are split between relayers) (default: compete)."
+  echo " --blast-rate               [Optional] Pre-sign every transfer tx before the benchmark and broadcast them asynchronously at this many txs per second (0: as fast as possible) instead of through hermes."
+  echo " --blast-connections        [Optional] Number of pooled RPC connections used by --blast-rate (default: 8)."
+  echo " --replay                   [Optional] Re-issue the submissions of a workload_trace.txt recorded by a previous run at the same times (-u, -t, -m and -c are taken from the trace)."
   echo -e "\n Example: ./$(basename $BASH_SOURCE)  -S 'localhost:26657' -D 'localhost:36657' -u 10 -t 25 -m 20 -o 'benchmarking_test' \n"
   exit 1
 }
@@ -84,12 +100,17 @@ get_relayer_data(){
 
 
 get_block_data() {
-    FIRST_BLOCK=$1
-    LAST_BLOCK=$2
-    CHAIN_ID=$3
-    CHAIN_ADDR=$4
-    OUTPUT_DIR=$5
-    TX_DATA_ANALYSIS=$6
+    # Locals only, since collect_sharded calls it in the foreground for retries and relies on its own range variables
+    local FIRST_BLOCK=$1
+    local LAST_BLOCK=$2
+    local CHAIN_ID=$3
+    local CHAIN_ADDR=$4
+    local OUTPUT_DIR=$5
+    local TX_DATA_ANALYSIS=$6
+    local OUTPUT_FILE=${7:-$OUTPUT_DIR/block_data_$CHAIN_ID.txt}
+    local SHOW_PROGRESS=${8:-true} # Disabled when several shards are retrieved in parallel
+    local n_blocks i p block_data block_height block_time block_size num_txs block_hash last_block_hash detailed_block_data tx_data num_pages
+    local tx_hashes json_data tx_info tx_hash channel msg_transfer msg_recv msg_ack msg_timeout gas_wanted gas_used
 
     n_blocks=$(($LAST_BLOCK - $FIRST_BLOCK))
 
@@ -100,6 +121,8 @@ get_block_data() {
         block_time=$(echo -n "$block_data" | jq '.result.block_metas[0].header.time')
         block_size=$(echo -n "$block_data" | jq '.result.block_metas[0].block_size' | tr -d '"')
         num_txs=$(echo -n "$block_data" | jq '.result.block_metas[0].num_txs' | tr -d '"')
+        block_hash=$(echo -n "$block_data" | jq '.result.block_metas[0].block_id.hash') # Used to check that blocks retrieved from different nodes are consistent
+        last_block_hash=$(echo -n "$block_data" | jq '.result.block_metas[0].header.last_block_id.hash')
 
         if [ "$TX_DATA_ANALYSIS" = "true" ]; then # Perform detailed analysis of transaction and message sizes
             detailed_block_data=$(gaiad --node "tcp://$CHAIN_ADDR" query block $i)
@@ -113,17 +136,21 @@ get_block_data() {
 
         tx_hashes=() # Array to store transaction hashes
         
-        json_data="{\"chain-id\": \"$CHAIN_ID\", \"block_height\": $block_height, \"block_time\": $block_time,  \"block_size\": $block_size, \"num_transactions\": $num_txs,  \"transactions\": ["
+        json_data="{\"chain-id\": \"$CHAIN_ID\", \"block_height\": $block_height, \"block_time\": $block_time,  \"block_size\": $block_size, \"block_hash\": $block_hash, \"last_block_hash\": $last_block_hash, \"num_transactions\": $num_txs,  \"transactions\": ["
         for (( p=1; p<=num_pages; p++ )); do
             tx_info=$(gaiad --node "tcp://$CHAIN_ADDR" query txs --events tx.height=$i --limit 1 --page $p)
             tx_hash=$(echo "${tx_info}" | grep txhash | awk '{$1=$1;print}' | cut -d ":" -f 2- | tr -d \ \ | paste -sd " " -)
+            channel=$(echo "${tx_info}" | grep -o "source_channel: channel-[0-9]*" | head -1 | awk '{print $2}') # Channel of the packets on the source chain
 
             msg_transfer=$(echo $tx_info | grep -o "'@type': /ibc.applications.transfer.v1.MsgTransfer" | wc -l ) # Get number of MsgTransfer packets
             msg_recv=$(echo $tx_info | grep -o "'@type': /ibc.core.channel.v1.MsgRecvPacket" | wc -l ) # Get number of MsgRecv packets
             msg_ack=$(echo $tx_info | grep -o "'@type': /ibc.core.channel.v1.MsgAcknowledgement" | wc -l ) # Get number of MsgAcknowledgement packets
             msg_timeout=$(echo $tx_info | grep -o "'@type': /ibc.core.channel.v1.MsgTimeout" | wc -l ) # Get number of Timeout messages
+            gas_wanted=$(echo "${tx_info}" | grep -o "gas_wanted: \"[0-9]*\"" | head -1 | tr -dc '0-9') # Gas requested by the tx, counted against the block's max_gas
+            gas_used=$(echo "${tx_info}" | grep -o "gas_used: \"[0-9]*\"" | head -1 | tr -dc '0-9')
 
             json_data+="{\"tx_hash\": \"${tx_hash}\", "
+            json_data+="\"channel\": \"${channel}\", "
           #  if [ "$TX_DATA_ANALYSIS" = "true" ]; then
           #      json_data+="\"tx_data\": \"${tx_data[$j]}\", "
           #  fi
@@ -131,7 +158,9 @@ get_block_data() {
             json_data+="\"MsgTransfer\": $msg_transfer, "
             json_data+="\"MsgRecvPacket\": $msg_recv, "
             json_data+="\"MsgAcknowledgement\": $msg_ack, "
-            json_data+="\"MsgTimeout\": $msg_timeout}"
+            json_data+="\"MsgTimeout\": $msg_timeout, "
+            json_data+="\"gas_wanted\": ${gas_wanted:-0}, "
+            json_data+="\"gas_used\": ${gas_used:-0}}"
 
             if [ $p -lt ${num_pages} ]; then # if it is not the last transaction in the block
                 json_data+="," # Add comma to indicate that there's another transaction after the current one
@@ -143,8 +172,10 @@ get_block_data() {
         json_data+="}"
         tx_hashes="" # Reset variable
 
-        echo $json_data >> $OUTPUT_DIR/block_data_$CHAIN_ID.txt
-        loading "[+] Retrieving blockchain data from $CHAIN_ID:" "$(($i - $FIRST_BLOCK ))" "$n_blocks"        
+        echo $json_data >> $OUTPUT_FILE
+        if [ "$SHOW_PROGRESS" = "true" ]; then
+            loading "[+] Retrieving blockchain data from $CHAIN_ID:" "$(($i - $FIRST_BLOCK ))" "$n_blocks"
+        fi
         
         # for (( p=1; p<=num_pages; p++ )); do
         #     tx_hashes+=($( gaiad --node "tcp://$CHAIN_ADDR" query txs --events tx.height=$i --limit 1 --page $p | grep txhash | awk '{$1=$1;print}' | cut -d ":" -f 2- | tr -d \ \ | paste -sd " " - ))
@@ -185,7 +216,335 @@ get_block_data() {
         # loading "[+] Retrieving blockchain data from $CHAIN_ID:" "$(($i - $FIRST_BLOCK ))" "$n_blocks"
 
     done
-    echo
+    if [ "$SHOW_PROGRESS" = "true" ]; then
+        echo
+    fi
+}
+
+
+get_commit_data() {
+    # Retrieve the commit (round, proposer and validator signatures) of every block in the measured range
+    local FIRST_BLOCK=$1
+    local LAST_BLOCK=$2
+    local CHAIN_ID=$3
+    local CHAIN_ADDR=$4
+    local OUTPUT_DIR=$5
+    local OUTPUT_FILE=${6:-$OUTPUT_DIR/commit_data_$CHAIN_ID.txt}
+    local SHOW_PROGRESS=${7:-true}
+    local n_blocks i
+
+    n_blocks=$(($LAST_BLOCK - $FIRST_BLOCK))
+
+    for (( i=$FIRST_BLOCK; i<=$LAST_BLOCK; i++ )); do
+
+        # Keep only the fields used by the analysis, one JSON object per line
+        curl -s "$CHAIN_ADDR/commit?height=$i" | jq -c --arg chain_id "$CHAIN_ID" '.result.signed_header | {"chain-id": $chain_id, "block_height": (.header.height | tonumber), "block_time": .header.time, "proposer": .header.proposer_address, "round": .commit.round, "signatures": [.commit.signatures[] | {"validator": .validator_address, "timestamp": .timestamp, "flag": .block_id_flag}]}' >> $OUTPUT_FILE
+
+        if [ "$SHOW_PROGRESS" = "true" ]; then
+            loading "[+] Retrieving commit data from $CHAIN_ID:" "$(($i - $FIRST_BLOCK ))" "$n_blocks"
+        fi
+
+    done
+    if [ "$SHOW_PROGRESS" = "true" ]; then
+        echo
+    fi
+}
+
+
+render_relayer_config() {
+    # Create a hermes configuration for relayer instance $RELAYER_NUM, which signs with its own keys
+    # (testkey_hermes<N>_chain<C>) and serves REST/telemetry on its own ports
+    RELAYER_NUM=$1
+    N_RELAYERS=$2
+    RELAYER_MODE=$3
+    N_CHANNELS=$4
+    OUTPUT_DIR=$5
+
+    PACKET_FILTER=""
+    if [ "$RELAYER_MODE" = "partition" ]; then
+        # Each relayer only relays the channels assigned to it (channel index modulo number of relayers)
+        PACKET_FILTER="[chains.packet_filter]\npolicy = 'allow'\nlist = ["
+        for (( c=$RELAYER_NUM; c<$N_CHANNELS; c+=$N_RELAYERS )); do
+            PACKET_FILTER+="['transfer', 'channel-$c'],"
+        done
+        PACKET_FILTER+="]\n"
+    fi
+
+    sed -e "s/key_name = 'testkey_hermes0_chain/key_name = 'testkey_hermes${RELAYER_NUM}_chain/" \
+        -e "s/^port = 3000$/port = $(( 3000 + $RELAYER_NUM * 10 ))/" \
+        -e "s/^port = 3001$/port = $(( 3001 + $RELAYER_NUM * 10 ))/" $HERMES_CONFIG |
+    awk -v filter="$PACKET_FILTER" '/^\[\[chains\]\]/ { if (seen) printf "%s", filter; seen=1 } { print } END { printf "%s", filter }' > $OUTPUT_DIR/hermes_config_relayer$RELAYER_NUM.toml
+}
+
+
+start_relayers() {
+    N_RELAYERS=$1
+    RELAYER_MODE=$2
+    N_CHANNELS=$3
+    OUTPUT_DIR=$4
+
+    if [ $N_RELAYERS -eq 1 ]; then
+        hermes --config $HERMES_CONFIG start &> $OUTPUT_DIR/hermes_log.txt &
+        return
+    fi
+
+    for (( r=0; r<$N_RELAYERS; r++ )); do
+        render_relayer_config "$r" "$N_RELAYERS" "$RELAYER_MODE" "$N_CHANNELS" "$OUTPUT_DIR"
+        hermes --config $OUTPUT_DIR/hermes_config_relayer$r.toml start &> $OUTPUT_DIR/hermes_log_relayer$r.txt &
+    done
+}
+
+
+wait_for_readiness() {
+    # Return as soon as the nodes are synchronized and producing blocks and every relayer has started, fail after READY_TIMEOUT seconds
+    N_RELAYERS=$1
+    OUTPUT_DIR=$2
+    READY_TIMEOUT=$3
+
+    NODE_ENDPOINTS=$(echo "${SRC_ENDPOINTS:-$SRC_CHAIN_ADDR},${DST_ENDPOINTS:-$DST_CHAIN_ADDR}" | tr "," " ")
+    if ! python3 readiness.py --timeout "$READY_TIMEOUT" nodes $NODE_ENDPOINTS; then
+        return 1
+    fi
+
+    # Relayers are probed through their log and REST endpoint (ports are incremented by 10 for each instance by render_relayer_config)
+    if [ $N_RELAYERS -eq 1 ]; then
+        RELAYER_PROBES="$OUTPUT_DIR/hermes_log.txt=127.0.0.1:3000"
+    else
+        RELAYER_PROBES=""
+        for (( r=0; r<$N_RELAYERS; r++ )); do
+            RELAYER_PROBES="$RELAYER_PROBES $OUTPUT_DIR/hermes_log_relayer$r.txt=127.0.0.1:$(( 3000 + $r * 10 ))"
+        done
+    fi
+    python3 readiness.py --timeout "$READY_TIMEOUT" relayers $RELAYER_PROBES
+}
+
+
+merge_relayer_logs() {
+    # Merge the logs of every relayer instance into hermes_log.txt ordered by timestamp, keeping the per-relayer
+    # logs for attributing relayed messages to each instance
+    N_RELAYERS=$1
+    OUTPUT_DIR=$2
+
+    if [ $N_RELAYERS -gt 1 ]; then
+        sort -s -m -k1,1 $OUTPUT_DIR/hermes_log_relayer*.txt > $OUTPUT_DIR/hermes_log.txt
+    fi
+}
+
+
+fetch_shard() {
+    # Retrieve the block or commit data of blocks [SHARD_FIRST, SHARD_LAST] from a single RPC endpoint into SHARD_FILE
+    local DATA_TYPE=$1
+    local SHARD_FIRST=$2
+    local SHARD_LAST=$3
+    local CHAIN_ID=$4
+    local CHAIN_ADDR=$5
+    local OUTPUT_DIR=$6
+    local TX_DATA_ANALYSIS=$7
+    local SHARD_FILE=$8
+    local SHOW_PROGRESS=$9
+
+    rm -f $SHARD_FILE
+    if [ "$DATA_TYPE" = "block" ]; then
+        get_block_data "$SHARD_FIRST" "$SHARD_LAST" "$CHAIN_ID" "$CHAIN_ADDR" "$OUTPUT_DIR" "$TX_DATA_ANALYSIS" "$SHARD_FILE" "$SHOW_PROGRESS"
+    else
+        get_commit_data "$SHARD_FIRST" "$SHARD_LAST" "$CHAIN_ID" "$CHAIN_ADDR" "$OUTPUT_DIR" "$SHARD_FILE" "$SHOW_PROGRESS"
+    fi
+}
+
+
+get_consensus_params() {
+    # Block limits (max_bytes, max_gas) from the genesis generated by setup_testnet.py, or from the node when it is not on this machine
+    CHAIN_ID=$1
+    CHAIN_ADDR=$2
+    OUTPUT_DIR=$3
+    GENESIS_FILE=$CHAIN_ID/node0/gaiad/config/genesis.json
+
+    if [ -f "$GENESIS_FILE" ]; then
+        jq -c '.consensus_params' "$GENESIS_FILE" > $OUTPUT_DIR/consensus_params_$CHAIN_ID.txt
+    else
+        curl -s "$CHAIN_ADDR/genesis" | jq -c '.result.genesis.consensus_params' > $OUTPUT_DIR/consensus_params_$CHAIN_ID.txt
+    fi
+}
+
+
+check_shard() {
+    # A shard is complete when it has one valid JSON line for every block in its range
+    local SHARD_FILE=$1
+    local N_BLOCKS=$2
+    [ -f "$SHARD_FILE" ] && jq -e -s --argjson n "$N_BLOCKS" 'length == $n and all(.[]; .block_height != null)' "$SHARD_FILE" > /dev/null 2>&1
+}
+
+
+get_inconsistent_heights() {
+    # Blocks retrieved from different nodes must form a single chain: the last_block_id of every block is the hash of the previous one.
+    # Prints the heights of the blocks that do not link to the previous block
+    local BLOCK_FILE=$1
+    jq -s -r '. as $blocks | range(1; length) | select($blocks[.].last_block_hash != $blocks[. - 1].block_hash) | $blocks[.].block_height' "$BLOCK_FILE" | paste -sd " " -
+}
+
+
+check_range() {
+    # The merged data must hold every block of [FIRST_BLOCK, LAST_BLOCK] exactly once and in order, whatever happened to the other shards
+    local MERGED_FILE=$1
+    local FIRST_BLOCK=$2
+    local LAST_BLOCK=$3
+    [ -f "$MERGED_FILE" ] && jq -e -s --argjson first "$FIRST_BLOCK" --argjson last "$LAST_BLOCK" 'map(.block_height) == [range($first; $last + 1)]' "$MERGED_FILE" > /dev/null 2>&1
+}
+
+
+merge_shards() {
+    # Concatenate the shards of a collection in height order into MERGED_FILE
+    local SHARD_DIR=$1
+    local SHARD_PREFIX=$2
+    local MERGED_FILE=$3
+    local shard_first
+    shift 3
+
+    rm -f $MERGED_FILE
+    for shard_first in "$@"; do
+        cat "$SHARD_DIR/${SHARD_PREFIX}_$shard_first.txt" >> $MERGED_FILE 2> /dev/null
+    done
+}
+
+
+collect_sharded() {
+    # Split the blocks [FIRST_BLOCK, LAST_BLOCK] into shards retrieved in parallel from several RPC endpoints of the same
+    # chain, with at most RPC_CONCURRENCY shards per endpoint at a time. Failed shards are retried on another endpoint, and so are
+    # the shards around a block whose hash does not link to the previous block
+    local DATA_TYPE=$1 # 'block' or 'commit'
+    local FIRST_BLOCK=$2
+    local LAST_BLOCK=$3
+    local CHAIN_ID=$4
+    local ENDPOINTS=$5 # Comma separated list of RPC addresses
+    local OUTPUT_DIR=$6
+    local TX_DATA_ANALYSIS=$7
+    local endpoints n_endpoints n_blocks n_shards shard_size SHARD_DIR show_progress shard_firsts shard_pids shard_first shard_last
+    local shard_file max_attempts collection_failed attempt endpoint merged_file inconsistent height s
+
+    IFS=',' read -r -a endpoints <<< "$ENDPOINTS"
+    n_endpoints=${#endpoints[@]}
+    n_blocks=$(( $LAST_BLOCK - $FIRST_BLOCK + 1 ))
+    n_shards=$(( $n_endpoints * $RPC_CONCURRENCY ))
+    if [ $n_shards -gt $n_blocks ]; then
+        n_shards=$n_blocks
+    fi
+    shard_size=$(( ($n_blocks + $n_shards - 1) / $n_shards )) # Ceiling division
+    SHARD_DIR=$OUTPUT_DIR/shards
+    mkdir -p $SHARD_DIR
+
+    show_progress="false"
+    if [ $n_shards -eq 1 ]; then
+        show_progress="true"
+    else
+        echo "[+] Retrieving $DATA_TYPE data from $CHAIN_ID in $n_shards shards across $n_endpoints endpoint(s)..."
+    fi
+
+    shard_firsts=()
+    for (( s=0; s<$n_shards; s++ )); do
+        shard_first=$(( $FIRST_BLOCK + $s * $shard_size ))
+        if [ $shard_first -le $LAST_BLOCK ]; then
+            shard_firsts+=($shard_first)
+        fi
+    done
+
+    # Shard s is retrieved from endpoint (s % n_endpoints)
+    shard_pids=()
+    for s in ${!shard_firsts[@]}; do
+        shard_first=${shard_firsts[$s]}
+        shard_last=$(( $shard_first + $shard_size - 1 < $LAST_BLOCK ? $shard_first + $shard_size - 1 : $LAST_BLOCK ))
+        fetch_shard "$DATA_TYPE" "$shard_first" "$shard_last" "$CHAIN_ID" "${endpoints[$(( $s % $n_endpoints ))]}" "$OUTPUT_DIR" "$TX_DATA_ANALYSIS" "$SHARD_DIR/${DATA_TYPE}_${CHAIN_ID}_$shard_first.txt" "$show_progress" &
+        shard_pids+=($!)
+    done
+
+    for shard_pid in ${shard_pids[*]}; do
+        wait $shard_pid
+    done
+
+    # Retry incomplete shards on the next endpoints (at least once, even with a single endpoint)
+    max_attempts=$(( $n_endpoints > 1 ? $n_endpoints : 2 ))
+    collection_failed="false"
+    for s in ${!shard_firsts[@]}; do
+        shard_first=${shard_firsts[$s]}
+        shard_last=$(( $shard_first + $shard_size - 1 < $LAST_BLOCK ? $shard_first + $shard_size - 1 : $LAST_BLOCK ))
+        shard_file="$SHARD_DIR/${DATA_TYPE}_${CHAIN_ID}_$shard_first.txt"
+        attempt=1
+        while ! check_shard "$shard_file" "$(( $shard_last - $shard_first + 1 ))"; do
+            if [ $attempt -ge $max_attempts ]; then
+                echo "[!] WARNING: failed to retrieve $DATA_TYPE data for blocks $shard_first-$shard_last of $CHAIN_ID from every endpoint."
+                collection_failed="true"
+                break
+            fi
+            endpoint=${endpoints[$(( ($s + $attempt) % $n_endpoints ))]}
+            echo "[+] Retrying $DATA_TYPE data for blocks $shard_first-$shard_last of $CHAIN_ID on $endpoint..."
+            fetch_shard "$DATA_TYPE" "$shard_first" "$shard_last" "$CHAIN_ID" "$endpoint" "$OUTPUT_DIR" "$TX_DATA_ANALYSIS" "$shard_file" "false"
+            attempt=$(( $attempt + 1 ))
+        done
+    done
+
+    merged_file="$SHARD_DIR/${DATA_TYPE}_${CHAIN_ID}_merged.txt"
+    merge_shards "$SHARD_DIR" "${DATA_TYPE}_${CHAIN_ID}" "$merged_file" ${shard_firsts[*]}
+
+    if [ "$DATA_TYPE" = "block" ] && [ "$collection_failed" = "false" ]; then
+        # A block that does not link to the previous one means the shard on either side of it came from a node on a different
+        # chain or returned stale data, both shards are retrieved again from the next endpoints
+        attempt=1
+        inconsistent=$(get_inconsistent_heights "$merged_file")
+        while [ -n "$inconsistent" ]; do
+            if [ $attempt -ge $max_attempts ]; then
+                echo "[!] WARNING: blocks retrieved from $CHAIN_ID do not form a consistent chain at height(s): $inconsistent"
+                collection_failed="true"
+                break
+            fi
+            for s in ${!shard_firsts[@]}; do
+                shard_first=${shard_firsts[$s]}
+                shard_last=$(( $shard_first + $shard_size - 1 < $LAST_BLOCK ? $shard_first + $shard_size - 1 : $LAST_BLOCK ))
+                for height in $inconsistent; do
+                    if [ $height -ge $shard_first ] && [ $(( $height - 1 )) -le $shard_last ]; then
+                        endpoint=${endpoints[$(( ($s + $attempt) % $n_endpoints ))]}
+                        echo "[+] Block hashes of $CHAIN_ID are inconsistent at height $height, retrieving blocks $shard_first-$shard_last again on $endpoint..."
+                        shard_file="$SHARD_DIR/${DATA_TYPE}_${CHAIN_ID}_$shard_first.txt"
+                        fetch_shard "$DATA_TYPE" "$shard_first" "$shard_last" "$CHAIN_ID" "$endpoint" "$OUTPUT_DIR" "$TX_DATA_ANALYSIS" "$shard_file" "false"
+                        if ! check_shard "$shard_file" "$(( $shard_last - $shard_first + 1 ))"; then
+                            echo "[!] WARNING: failed to retrieve $DATA_TYPE data for blocks $shard_first-$shard_last of $CHAIN_ID again."
+                            collection_failed="true"
+                        fi
+                        break
+                    fi
+                done
+            done
+            merge_shards "$SHARD_DIR" "${DATA_TYPE}_${CHAIN_ID}" "$merged_file" ${shard_firsts[*]}
+            if [ "$collection_failed" = "true" ]; then
+                break
+            fi
+            inconsistent=$(get_inconsistent_heights "$merged_file")
+            attempt=$(( $attempt + 1 ))
+        done
+        if [ "$collection_failed" = "false" ]; then
+            echo "[+] Block hashes of $CHAIN_ID are consistent across shards."
+        fi
+    fi
+
+    if [ "$collection_failed" = "false" ] && ! check_range "$merged_file" "$FIRST_BLOCK" "$LAST_BLOCK"; then
+        echo "[!] WARNING: the $DATA_TYPE data retrieved from $CHAIN_ID does not cover blocks $FIRST_BLOCK-$LAST_BLOCK exactly once."
+    fi
+
+    cat $merged_file >> $OUTPUT_DIR/${DATA_TYPE}_data_$CHAIN_ID.txt
+    rm -r $SHARD_DIR
+}
+
+
+mark_phase() {
+    # Record the start of a benchmark phase, used to align the sampled resource usage with the phases in the report
+    echo "$1 $(date +%s.%N)" >> $OUTPUT_DIR/benchmark_phases.txt
+}
+
+
+capture_profiles() {
+    # CPU and heap profiles of the local nodes of both chains at a fixed point of the benchmark, in the background. A CPU
+    # profile still running on a node (previous phase or saturation) is waited for by pprof_capture.py
+    PHASE=$1
+    python3 pprof_capture.py --seconds "$PPROF_SECONDS" capture "$OUTPUT_DIR" "$PHASE" "$SRC_CHAIN_ID" "$DST_CHAIN_ID" > /dev/null 2>&1 &
+    pprof_pids+=($!)
 }
 
 
@@ -194,9 +553,16 @@ clear_data() {
     OUTPUT_DIR=$1
     CHAIN_ID=$2
     rm $OUTPUT_DIR/hermes_log.txt > /dev/null 2>&1
+    rm $OUTPUT_DIR/hermes_log_relayer*.txt > /dev/null 2>&1
+    rm $OUTPUT_DIR/hermes_config_relayer*.toml > /dev/null 2>&1
     rm $OUTPUT_DIR/transfer_log.txt > /dev/null 2>&1
+    rm $OUTPUT_DIR/workload_trace*.txt > /dev/null 2>&1
+    rm $OUTPUT_DIR/tx_pool.txt > /dev/null 2>&1
+    rm $OUTPUT_DIR/benchmark_phases.txt $OUTPUT_DIR/resource_samples.bin $OUTPUT_DIR/resource_processes.json > /dev/null 2>&1
     #rm $OUTPUT_DIR/block_data_${CHAIN_ID}.txt > /dev/null 2>&1
     rm $OUTPUT_DIR/logs_${CHAIN_ID}.txt > /dev/null 2>&1
+    rm $OUTPUT_DIR/commit_data_${CHAIN_ID}.txt > /dev/null 2>&1
+    rm $OUTPUT_DIR/consensus_params_${CHAIN_ID}.txt > /dev/null 2>&1
 }
 
 
@@ -271,20 +637,84 @@ display_loading() {
   echo -e "$text\n[+] Done!\n"
 }
 
+record_submission() {
+    # Append one submission to the workload trace, times are seconds since WORKLOAD_START
+    # Format: user,tx,channel,messages,intended,actual,duration,status
+    TRACE_FILE=$1
+    awk -v user="$2" -v tx="$3" -v channel="$4" -v messages="$5" -v intended="$6" -v actual="$7" -v end="$8" -v status="$9" -v origin="$WORKLOAD_START" \
+        'BEGIN { printf "%s,%s,%s,%s,%.6f,%.6f,%.6f,%s\n", user, tx, channel, messages, intended - origin, actual - origin, end - actual, status }' >> $TRACE_FILE
+}
+
+
+wait_until() {
+    # Sleep until OFFSET seconds after WORKLOAD_START, returns immediately if that time has already passed
+    OFFSET=$1
+    delay=$(awk -v offset="$OFFSET" -v origin="$WORKLOAD_START" -v now="$(date +%s.%N)" 'BEGIN { d = origin + offset - now; printf "%.6f", (d > 0 ? d : 0) }')
+    sleep $delay
+}
+
+
 submit_txs() {
     USER_NUM=$1
     N_TRANSACTIONS=$2
     N_MESSAGES=$3 
     OUTPUT_DIR=$4
     TX_TIMEOUT=$5
+    SRC_CHANNEL=$6
 for (( i=1; i<=$N_TRANSACTIONS; i++ ));
 do
-    hermes --config hermes_config.toml tx ft-transfer --dst-chain blockchain1 --src-chain blockchain0 --src-port transfer --src-channel channel-0 --amount 1 --denom "coins" --number-msgs $N_MESSAGES --timeout-height-offset $TX_TIMEOUT  --key-name "user$USER_NUM" >> $OUTPUT_DIR/transfer_log.txt 2>&1
+    # Each user submits its next transfer as soon as the previous one returns, so the intended time is the actual time
+    start=$(date +%s.%N)
+    hermes --config hermes_config.toml tx ft-transfer --dst-chain blockchain1 --src-chain blockchain0 --src-port transfer --src-channel $SRC_CHANNEL --amount 1 --denom "coins" --number-msgs $N_MESSAGES --timeout-height-offset $TX_TIMEOUT  --key-name "user$USER_NUM" >> $OUTPUT_DIR/transfer_log.txt 2>&1
+    status=$?
+    record_submission "$OUTPUT_DIR/workload_trace_user$USER_NUM.txt" "$USER_NUM" "$i" "$SRC_CHANNEL" "$N_MESSAGES" "$start" "$start" "$(date +%s.%N)" "$status"
     #loading "[+] Submitting IBC transfers to source blockchain..." "$(( $(($i * $N_USERS)) - $(($N_USERS - $j)) ))" "$(($N_TRANSACTIONS * $N_USERS))" 
 done
 }
 
 
+replay_txs() {
+    # Re-issue the submissions of USER_NUM from a workload trace at their recorded times (relative to WORKLOAD_START).
+    # Submissions of a user stay sequential, since each one holds the user's account sequence until it returns
+    USER_NUM=$1
+    REPLAY_FILE=$2
+    OUTPUT_DIR=$3
+    TX_TIMEOUT=$4
+
+    grep "^$USER_NUM," "$REPLAY_FILE" | sort -t "," -k 6 -g | while IFS="," read -r user tx channel messages intended actual duration status; do
+        wait_until "$actual" # The recorded actual times become the schedule of the replay
+        scheduled=$(awk -v offset="$actual" -v origin="$WORKLOAD_START" 'BEGIN { printf "%.6f", origin + offset }')
+        start=$(date +%s.%N)
+        hermes --config hermes_config.toml tx ft-transfer --dst-chain blockchain1 --src-chain blockchain0 --src-port transfer --src-channel $channel --amount 1 --denom "coins" --number-msgs $messages --timeout-height-offset $TX_TIMEOUT  --key-name "user$USER_NUM" >> $OUTPUT_DIR/transfer_log.txt 2>&1
+        status=$?
+        record_submission "$OUTPUT_DIR/workload_trace_user$USER_NUM.txt" "$USER_NUM" "$tx" "$channel" "$messages" "$scheduled" "$start" "$(date +%s.%N)" "$status"
+    done
+}
+
+
+merge_workload_trace() {
+    # Merge the per-user traces into workload_trace.txt, ordered by actual submission time
+    OUTPUT_DIR=$1
+    TRACE_FILE=$OUTPUT_DIR/workload_trace.txt
+
+    echo "# users=$N_USERS transactions=$N_TRANSACTIONS messages=$N_MESSAGES channels=$N_CHANNELS tx_timeout=$TX_TIMEOUT" > $TRACE_FILE
+    echo "user,tx,channel,messages,intended,actual,duration,status" >> $TRACE_FILE
+    cat $OUTPUT_DIR/workload_trace_user*.txt 2> /dev/null | sort -t "," -k 6 -g >> $TRACE_FILE
+    rm $OUTPUT_DIR/workload_trace_user*.txt > /dev/null 2>&1
+
+    failed=$(grep -v "^#\|^user" $TRACE_FILE | awk -F "," '$8 != 0' | wc -l)
+    if [ $failed -gt 0 ]; then
+        echo "[!] WARNING: $failed submission(s) exited with an error, see $OUTPUT_DIR/transfer_log.txt"
+    fi
+}
+
+
+get_trace_param() {
+    # Read a workload parameter (users, transactions, messages, channels, tx_timeout) from the header of a trace
+    grep -m 1 "^#" "$1" | tr " " "\n" | grep "^$2=" | cut -d "=" -f 2
+}
+
+
 trap quit SIGTERM
 
 # Whether to analyze transaction data in detail or not 
@@ -298,6 +728,43 @@ BLOCKS_TO_WAIT=5
 # Number of blocks that can be created before an IBC transfer times out
 TX_TIMEOUT=50
 
+# RPC endpoints used for data collection (defaults to the source/destination address) and parallel requests per endpoint
+SRC_ENDPOINTS=""
+DST_ENDPOINTS=""
+RPC_CONCURRENCY=1
+
+# Extra flags for data_analysis.py (e.g. --profile, --plots)
+ANALYSIS_FLAGS=""
+
+# Number of relayer instances and whether they compete for the same packets or partition the channels
+N_RELAYERS=1
+RELAYER_MODE="compete"
+
+# Number of transfer channels between the chains
+N_CHANNELS=1
+
+# Txs per second of the pre-signed tx blaster (empty: submit through hermes) and its number of RPC connections
+BLAST_RATE=""
+BLAST_CONNECTIONS=8
+
+# Seconds between resource usage samples of the local gaiad and hermes processes (0: disabled)
+RESOURCE_INTERVAL=1
+
+# Configuration of the relaying hermes instances. Users submit their transfers with hermes_config.toml, so the workload does not change with it
+HERMES_CONFIG="hermes_config.toml"
+
+# CPUs the benchmark, relayers and tx submissions are pinned to (empty: not pinned)
+BENCHMARK_CPUS=""
+
+# Seconds to wait for the nodes and relayers to be ready
+READY_TIMEOUT=180
+
+# Duration of the CPU profiles captured from the local gaiad nodes (empty: no profiles)
+PPROF_SECONDS=""
+
+# Workload trace of a previous run to replay instead of submitting transfers in a closed loop
+REPLAY_TRACE=""
+
 # Check and assign argument values
 while [[ $# -gt 0 ]]; do
   case $1 in
@@ -340,11 +807,89 @@ while [[ $# -gt 0 ]]; do
       TX_DATA_ANALYSIS="true"
       shift
       ;;
+    --src-endpoints)
+      SRC_ENDPOINTS="$2"
+      shift
+      shift
+      ;;
+    --dst-endpoints)
+      DST_ENDPOINTS="$2"
+      shift
+      shift
+      ;;
+    --rpc-concurrency)
+      RPC_CONCURRENCY="$2"
+      shift
+      shift
+      ;;
+    --profile-analysis)
+      ANALYSIS_FLAGS="$ANALYSIS_FLAGS --profile"
+      shift
+      ;;
+    --plots)
+      ANALYSIS_FLAGS="$ANALYSIS_FLAGS --plots"
+      shift
+      ;;
     --tx-timeout)
       TX_TIMEOUT="$2"
       shift
       shift
       ;;
+    -r|--relayers)
+      N_RELAYERS="$2"
+      shift
+      shift
+      ;;
+    -c|--channels)
+      N_CHANNELS="$2"
+      shift
+      shift
+      ;;
+    --relayer-mode)
+      RELAYER_MODE="$2"
+      shift
+      shift
+      ;;
+    --blast-rate)
+      BLAST_RATE="$2"
+      shift
+      shift
+      ;;
+    --blast-connections)
+      BLAST_CONNECTIONS="$2"
+      shift
+      shift
+      ;;
+    --hermes-config)
+      HERMES_CONFIG="$2"
+      shift
+      shift
+      ;;
+    --cpus)
+      BENCHMARK_CPUS="$2"
+      shift
+      shift
+      ;;
+    --ready-timeout)
+      READY_TIMEOUT="$2"
+      shift
+      shift
+      ;;
+    --pprof)
+      PPROF_SECONDS="$2"
+      shift
+      shift
+      ;;
+    --resource-interval)
+      RESOURCE_INTERVAL="$2"
+      shift
+      shift
+      ;;
+    --replay)
+      REPLAY_TRACE="$2"
+      shift
+      shift
+      ;;
    -h|--help)
       display_usage
       ;;
@@ -360,12 +905,50 @@ while [[ $# -gt 0 ]]; do
   esac
 done
 
+
+if [ -n "$REPLAY_TRACE" ]; then
+  if [ ! -f "$REPLAY_TRACE" ]; then
+    display_usage " Workload trace '$REPLAY_TRACE' not found.\n"
+    exit 1
+  fi
+  # The replayed workload defines the number of users, transactions, messages and channels
+  N_USERS=$(get_trace_param "$REPLAY_TRACE" "users")
+  N_TRANSACTIONS=$(get_trace_param "$REPLAY_TRACE" "transactions")
+  N_MESSAGES=$(get_trace_param "$REPLAY_TRACE" "messages")
+  N_CHANNELS=$(get_trace_param "$REPLAY_TRACE" "channels")
+  TX_TIMEOUT=$(get_trace_param "$REPLAY_TRACE" "tx_timeout")
+  REPLAY_COPY=$(mktemp) # The output directory, which may contain the trace, is cleared below
+  cp "$REPLAY_TRACE" "$REPLAY_COPY"
+fi
   
 if [[ -z "$SRC_CHAIN_ADDR" || -z "$DST_CHAIN_ADDR" || -z "$N_USERS" || -z "$N_TRANSACTIONS" || -z "$N_MESSAGES" || -z "$OUTPUT_DIR" ]]; then
   display_usage " Missing required parameter. Please check if all parameters were specified.\n"
   exit 1
 fi
 
+if [[ "$RELAYER_MODE" != "compete" && "$RELAYER_MODE" != "partition" ]]; then
+  display_usage " Unknown relayer mode '$RELAYER_MODE'. Use 'compete' or 'partition'.\n"
+  exit 1
+fi
+
+if [[ "$RELAYER_MODE" = "partition" && $N_RELAYERS -gt $N_CHANNELS ]]; then
+  display_usage " Partition mode assigns whole channels to relayers and needs at least as many channels as relayers ($N_RELAYERS relayers, $N_CHANNELS channel(s)).\n"
+  exit 1
+fi
+
+if [[ -n "$BLAST_RATE" && -n "$REPLAY_TRACE" ]]; then
+  display_usage " --blast-rate and --replay cannot be used together.\n"
+  exit 1
+fi
+
+if [ -n "$BENCHMARK_CPUS" ]; then
+  # Every process started from here on (relayers, tx submissions, data collection and analysis) inherits the CPU affinity
+  if ! taskset -cp "$BENCHMARK_CPUS" $$ > /dev/null; then
+    display_usage " Could not pin the benchmark to CPUs '$BENCHMARK_CPUS'.\n"
+    exit 1
+  fi
+fi
+
 SRC_CHAIN_ID=$(get_chain_id "$SRC_CHAIN_ADDR")
 DST_CHAIN_ID=$(get_chain_id "$DST_CHAIN_ADDR")
 
@@ -388,19 +971,47 @@ then
 fi
 
 
+if [ -n "$BLAST_RATE" ]; then
+    # Sign the whole workload before the benchmark, so signing cost is not part of the measured submission
+    echo "[+] Pre-signing $(( $N_USERS * $N_TRANSACTIONS )) transfer transactions..."
+    RECEIVER=$(gaiad keys show testkey_hermes0_chain1 -a --keyring-backend test --home $DST_CHAIN_ID/node0/gaiad)
+    if ! python3 tx_blaster.py prepare "$SRC_CHAIN_ADDR" "$SRC_CHAIN_ID" "$OUTPUT_DIR/tx_pool.txt" --home "$SRC_CHAIN_ID/node0/gaiad" --receiver "$RECEIVER" \
+        -u "$N_USERS" -t "$N_TRANSACTIONS" -m "$N_MESSAGES" -c "$N_CHANNELS" --tx-timeout "$TX_TIMEOUT"; then
+        echo "[!] Failed to prepare the tx pool. Aborting..."
+        exit 1
+    fi
+fi
+
+
 # Increase number of max connections to allow for multiple processes submitting IBC transactions through the relayer
 ulimit -Sn 16384
 
-# Start hermes relayer
-hermes --config hermes_config.toml start &> $OUTPUT_DIR/hermes_log.txt &
+# Sample resource usage of the local nodes and relayers for the whole benchmark
+if [ "$RESOURCE_INTERVAL" != "0" ]; then
+    python3 resource_sampler.py "$OUTPUT_DIR" --interval "$RESOURCE_INTERVAL" &
+    SAMPLER_PID=$!
+fi
+
+# Start hermes relayer(s)
+start_relayers "$N_RELAYERS" "$RELAYER_MODE" "$N_CHANNELS" "$OUTPUT_DIR"
 
 echo "[+] Initializing benchmark..."
+mark_phase "warmup"
+
+if [ -n "$PPROF_SECONDS" ]; then
+    capture_profiles "warmup"
+fi
 
 START=`date +%s.%N`
 
 SECONDS=0
 
-sleep 60
+if ! wait_for_readiness "$N_RELAYERS" "$OUTPUT_DIR" "$READY_TIMEOUT"; then
+    echo "[!] The nodes or relayers are not ready. Aborting..."
+    killall hermes &> /dev/null 2>&1
+    kill -TERM $SAMPLER_PID ${pprof_pids[*]} > /dev/null 2>&1
+    exit 1
+fi
 
 clear
     
@@ -410,10 +1021,38 @@ DST_FIRST_BLOCK=$(( $(get_current_height "$DST_CHAIN_ADDR")  + 1 ))
 TRANSFERS_TIME=$SECONDS
 
 
-for (( j=1; j<=$N_USERS; j++ ));
+if [ -n "$REPLAY_TRACE" ]; then
+    mv "$REPLAY_COPY" "$OUTPUT_DIR/replayed_workload_trace.txt"
+fi
+
+WORKLOAD_START=$(date +%s.%N) # Origin of the times in the workload trace
+mark_phase "submission"
+
+if [ -n "$PPROF_SECONDS" ]; then
+    capture_profiles "submission"
+    # Profile the nodes of a chain again once it saturates (blocks full or more txs pending than committed for several blocks)
+    python3 pprof_capture.py --seconds "$PPROF_SECONDS" watch "$OUTPUT_DIR" "$SRC_CHAIN_ID=$SRC_CHAIN_ADDR" "$DST_CHAIN_ID=$DST_CHAIN_ADDR" &
+    PPROF_WATCH_PID=$!
+fi
+
+if [ -n "$BLAST_RATE" ]; then
+    N_USERS_TO_START=0 # The blaster broadcasts the txs of every user
+    python3 tx_blaster.py blast "$SRC_CHAIN_ADDR" "$OUTPUT_DIR/tx_pool.txt" --rate "$BLAST_RATE" --connections "$BLAST_CONNECTIONS" \
+        --trace "$OUTPUT_DIR/workload_trace.txt" -c "$N_CHANNELS" --tx-timeout "$TX_TIMEOUT" &
+    user_pids[0]=$!
+else
+    N_USERS_TO_START=$N_USERS
+fi
+
+for (( j=1; j<=$N_USERS_TO_START; j++ ));
 do
-    submit_txs "$j" "$N_TRANSACTIONS" "$N_MESSAGES" "$OUTPUT_DIR" "$TX_TIMEOUT" &
-    user_pids[${i}]=$!
+    if [ -n "$REPLAY_TRACE" ]; then
+        replay_txs "$j" "$OUTPUT_DIR/replayed_workload_trace.txt" "$OUTPUT_DIR" "$TX_TIMEOUT" &
+    else
+        # Users are distributed across channels in round robin (user1 -> channel-0, user2 -> channel-1, ...)
+        submit_txs "$j" "$N_TRANSACTIONS" "$N_MESSAGES" "$OUTPUT_DIR" "$TX_TIMEOUT" "channel-$(( ($j - 1) % $N_CHANNELS ))" &
+    fi
+    user_pids[${j}]=$!
 done
 
 echo "[+] Submitting and confirming transactions..."
@@ -424,6 +1063,15 @@ for user_pid in ${user_pids[*]}; do
 done
 echo
 
+if [ -z "$BLAST_RATE" ]; then
+    merge_workload_trace "$OUTPUT_DIR" # The blaster writes its own trace
+fi
+
+if [ -n "$REPLAY_TRACE" ]; then
+    # How far the replay deviated from the recorded schedule (submissions of a user start late when the previous one takes longer than it did)
+    grep -v "^#\|^user" $OUTPUT_DIR/workload_trace.txt | awk -F "," '{ lag = $6 - $5; total += lag; if (lag > max) max = lag } END { if (NR > 0) printf "[+] Replayed %d submissions, avg. %.3fs and max. %.3fs after their recorded time\n", NR, total / NR, max }'
+fi
+
 
 TRANSFERS_TIME=$(( $SECONDS - $TRANSFERS_TIME )) # How long it took to submit all the transfers to the source chain
 
@@ -432,6 +1080,11 @@ TRANSFERS_TIME=$(( $SECONDS - $TRANSFERS_TIME )) # How long it took to submit al
 # of the system 
 
 BLOCK_WAITING_TIME=$SECONDS
+mark_phase "waiting"
+
+if [ -n "$PPROF_SECONDS" ]; then
+    capture_profiles "waiting"
+fi
 
 SRC_LAST_TPUT_BLOCK=$(( $(get_current_height "$SRC_CHAIN_ADDR")  + 1 ))
 DST_LAST_TPUT_BLOCK=$(( $(get_current_height "$DST_CHAIN_ADDR")  + 1 ))
@@ -443,12 +1096,23 @@ wait_for_empty_blocks "$SRC_CHAIN_ADDR" "$BLOCKS_TO_WAIT"
 
 BLOCK_WAITING_TIME=$(( $SECONDS - $BLOCK_WAITING_TIME ))
 
+# Finish profiling before data collection, so the captures do not slow down the RPC endpoints
+if [ -n "$PPROF_SECONDS" ]; then
+    kill -TERM $PPROF_WATCH_PID > /dev/null 2>&1
+    for pprof_pid in $PPROF_WATCH_PID ${pprof_pids[*]}; do
+        wait $pprof_pid
+    done
+    echo "[+] pprof profiles written to '$OUTPUT_DIR/pprof/'"
+fi
+
 SRC_LAST_BLOCK=$(get_current_height "$SRC_CHAIN_ADDR")
 DST_LAST_BLOCK=$(get_current_height "$DST_CHAIN_ADDR")
 
 # Stop running relayer processes
 killall hermes &> /dev/null 2>&1
 
+merge_relayer_logs "$N_RELAYERS" "$OUTPUT_DIR"
+
 # Display summary of benchmarking
 display_elapsed_time "Transfers" "$TRANSFERS_TIME"
 
@@ -461,22 +1125,37 @@ echo -e "[+] Last block: $DST_LAST_BLOCK\n"
 
 
 DATA_COLLECTION_TIME=$SECONDS
+mark_phase "data_collection"
 
 # Get data for source chain
-get_block_data "$SRC_FIRST_BLOCK" "$SRC_LAST_BLOCK" "$SRC_CHAIN_ID" "$SRC_CHAIN_ADDR" "$OUTPUT_DIR" "$TX_DATA_ANALYSIS"
+collect_sharded "block" "$SRC_FIRST_BLOCK" "$SRC_LAST_BLOCK" "$SRC_CHAIN_ID" "${SRC_ENDPOINTS:-$SRC_CHAIN_ADDR}" "$OUTPUT_DIR" "$TX_DATA_ANALYSIS"
 
 # Get data for destination chain
-get_block_data "$DST_FIRST_BLOCK" "$DST_LAST_BLOCK" "$DST_CHAIN_ID" "$DST_CHAIN_ADDR" "$OUTPUT_DIR" "$TX_DATA_ANALYSIS"
+collect_sharded "block" "$DST_FIRST_BLOCK" "$DST_LAST_BLOCK" "$DST_CHAIN_ID" "${DST_ENDPOINTS:-$DST_CHAIN_ADDR}" "$OUTPUT_DIR" "$TX_DATA_ANALYSIS"
+
+# Get consensus commit data (rounds, proposers and validator signatures) for both chains
+collect_sharded "commit" "$SRC_FIRST_BLOCK" "$SRC_LAST_BLOCK" "$SRC_CHAIN_ID" "${SRC_ENDPOINTS:-$SRC_CHAIN_ADDR}" "$OUTPUT_DIR" "$TX_DATA_ANALYSIS"
+collect_sharded "commit" "$DST_FIRST_BLOCK" "$DST_LAST_BLOCK" "$DST_CHAIN_ID" "${DST_ENDPOINTS:-$DST_CHAIN_ADDR}" "$OUTPUT_DIR" "$TX_DATA_ANALYSIS"
+
+# Get the block size and gas limits of both chains for the block capacity analysis
+get_consensus_params "$SRC_CHAIN_ID" "$SRC_CHAIN_ADDR" "$OUTPUT_DIR"
+get_consensus_params "$DST_CHAIN_ID" "$DST_CHAIN_ADDR" "$OUTPUT_DIR"
 
 get_relayer_data "$SRC_CHAIN_ID" "$DST_CHAIN_ID"
 
 DATA_COLLECTION_TIME=$(( $SECONDS - $DATA_COLLECTION_TIME ))
+mark_phase "end"
+
+if [ -n "$SAMPLER_PID" ]; then
+    kill -TERM $SAMPLER_PID > /dev/null 2>&1
+    wait $SAMPLER_PID
+fi
 
 display_elapsed_time "Data collection" "$DATA_COLLECTION_TIME"
 
 DATA_ANALYSIS_TIME=$SECONDS
 
-python3 data_analysis.py "$OUTPUT_DIR" "$SRC_CHAIN_ID" "$DST_CHAIN_ID" "$SRC_CHAIN_ADDR" "$N_USERS" "$N_TRANSACTIONS" "$N_MESSAGES" "$TX_DATA_ANALYSIS" "$TRANSFERS_TIME" "$BLOCK_WAITING_TIME" "$DATA_COLLECTION_TIME" "$SRC_LAST_TPUT_BLOCK" "$DST_LAST_TPUT_BLOCK"
+python3 data_analysis.py "$OUTPUT_DIR" "$SRC_CHAIN_ID" "$DST_CHAIN_ID" "$SRC_CHAIN_ADDR" "$N_USERS" "$N_TRANSACTIONS" "$N_MESSAGES" "$TX_DATA_ANALYSIS" "$TRANSFERS_TIME" "$BLOCK_WAITING_TIME" "$DATA_COLLECTION_TIME" "$SRC_LAST_TPUT_BLOCK" "$DST_LAST_TPUT_BLOCK" "$N_CHANNELS" $ANALYSIS_FLAGS
 
 DATA_ANALYSIS_TIME=$(( $SECONDS - $DATA_ANALYSIS_TIME ))
 
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import tracemalloc
+import subprocess
+from analysis_functions import *
+from generate_dataset import generate_dataset
+
+# Times and memory-profiles every stage of the analysis pipeline (the same calls data_analysis.py makes) on synthetic
+# datasets of increasing size. Results are appended to a history file and compared with the previous entry for the
+# same scale, exiting with a non-zero status when a stage became slower than the allowed threshold.
+
+SRC_CHAIN_ID = "blockchain0"
+DST_CHAIN_ID = "blockchain1"
+N_USERS = 10
+MSGS_PER_TX = 100
+EMPTY_BLOCKS = 5
+
+
+def stage_read_files(ctx):
+    data_dir = ctx["data_dir"]
+    ctx["src_commit_data"] = read_file(data_dir, "commit_data_" + SRC_CHAIN_ID + ".txt")
+    ctx["dst_commit_data"] = read_file(data_dir, "commit_data_" + DST_CHAIN_ID + ".txt")
+    ctx["src_chain_latency_data"] = read_file(data_dir, "logs_" + SRC_CHAIN_ID + ".txt")
+    ctx["dst_chain_latency_data"] = read_file(data_dir, "logs_" + DST_CHAIN_ID + ".txt")
+    ctx["relayer_data"] = read_file(data_dir, "hermes_log.txt")
+
+
+def stage_read_block_metrics(ctx):
+    # Same streaming pass as data_analysis.py without --plots, the blocks are not kept
+    for prefix, chain_id in (("src", SRC_CHAIN_ID), ("dst", DST_CHAIN_ID)):
+        filename = "block_data_" + chain_id + ".txt"
+        with open(ctx["data_dir"] + filename, "r") as f:
+            n_blocks = sum(1 for line in f)
+        ctx[prefix + "_metrics"] = read_block_metrics(ctx["data_dir"], filename, n_blocks - EMPTY_BLOCKS)[1]
+
+
+def stage_load_json(ctx):
+    ctx["src_commits"] = load_json(ctx["src_commit_data"])
+    ctx["dst_commits"] = load_json(ctx["dst_commit_data"])
+
+
+def stage_format_block_metrics(ctx):
+    for metrics, chain_id in ((ctx["src_metrics"], SRC_CHAIN_ID), (ctx["dst_metrics"], DST_CHAIN_ID)):
+        format_tx_distribution(metrics.tx_distribution, chain_id)
+        format_throughput(chain_id, *metrics.get_throughput_window())
+        format_data_size(metrics.tx_classes, metrics.window_bytes, metrics.window_blocks, chain_id)
+    format_success_rate(ctx["src_metrics"].messages, ctx["dst_metrics"].messages, N_USERS, ctx["n_txs"], MSGS_PER_TX, SRC_CHAIN_ID, DST_CHAIN_ID)
+
+
+def stage_calc_block_utilization(ctx):
+    for metrics, chain_id in ((ctx["src_metrics"], SRC_CHAIN_ID), (ctx["dst_metrics"], DST_CHAIN_ID)):
+        consensus_params = read_consensus_params(ctx["data_dir"], "consensus_params_" + chain_id + ".txt")
+        format_block_utilization(metrics.window_block_sizes, metrics.window_block_gas_wanted, metrics.window_gas_used, metrics.window_has_gas,
+            consensus_params, chain_id)
+
+
+def stage_calc_commit_latency(ctx):
+    calc_commit_latency(ctx["src_commits"], SRC_CHAIN_ID)
+    calc_commit_latency(ctx["dst_commits"], DST_CHAIN_ID)
+
+
+def stage_calc_round_trip_time(ctx):
+    calc_round_trip_time(ctx["relayer_data"], SRC_CHAIN_ID, DST_CHAIN_ID, ctx["src_metrics"].txs, ctx["dst_metrics"].txs, ctx["data_dir"])
+
+
+def stage_calc_latency(ctx):
+    transfer_latency = parse_transfer_latency(ctx["src_chain_latency_data"])
+    recv_latency = parse_recv_latency(ctx["dst_chain_latency_data"])
+    ack_latency = parse_ack_latency(ctx["src_chain_latency_data"])
+    calc_latency(transfer_latency, recv_latency, ack_latency, SRC_CHAIN_ID, DST_CHAIN_ID)
+
+
+STAGES = [
+    ["read_file", stage_read_files],
+    ["read_block_metrics", stage_read_block_metrics],
+    ["load_json", stage_load_json],
+    ["format_block_metrics", stage_format_block_metrics],
+    ["calc_block_utilization", stage_calc_block_utilization],
+    ["calc_commit_latency", stage_calc_commit_latency],
+    ["calc_round_trip_time", stage_calc_round_trip_time],
+    ["calc_latency", stage_calc_latency],
+]
+
+
+def get_revision():
+    try:
+        revision = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr = subprocess.DEVNULL, cwd = os.path.dirname(os.path.abspath(__file__)))
+        return revision.decode("utf-8").strip()
+    except (subprocess.CalledProcessError, OSError):
+        return "unknown"
+
+
+def prepare_dataset(work_dir, n_messages, seed):
+    # Generated datasets are reused between runs, they only depend on the scale and the seed
+    n_txs = max(n_messages // (N_USERS * MSGS_PER_TX), 1)
+    data_dir = work_dir + "dataset_{}_{}/".format(n_messages, seed)
+    if not os.path.exists(data_dir + "hermes_log.txt"):
+        print("[+] Generating synthetic dataset with {} transfer messages...".format(N_USERS * n_txs * MSGS_PER_TX))
+        generate_dataset(data_dir, N_USERS, n_txs, MSGS_PER_TX, SRC_CHAIN_ID, DST_CHAIN_ID, empty_blocks = EMPTY_BLOCKS, seed = seed)
+    return data_dir, n_txs
+
+
+def run_stages(data_dir, n_txs, measure_memory):
+    # Run the pipeline once, returning {stage: {"wall": s, "cpu": s[, "peak_memory": bytes]}}
+    ctx = {"data_dir": data_dir, "n_txs": n_txs}
+    measurements = {}
+
+    for name, stage in STAGES:
+        if measure_memory:
+            tracemalloc.start()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        stage(ctx)
+        measurement = {"wall": time.perf_counter() - wall_start, "cpu": time.process_time() - cpu_start}
+        if measure_memory:
+            measurement["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        measurements[name] = measurement
+
+    return measurements
+
+
+def benchmark_scale(work_dir, n_messages, seed, repeat, measure_memory):
+    data_dir, n_txs = prepare_dataset(work_dir, n_messages, seed)
+
+    # Timings are taken without tracemalloc (which slows allocations down considerably), keeping the fastest run
+    stages = {}
+    for i in range(repeat):
+        for name, measurement in run_stages(data_dir, n_txs, False).items():
+            if name not in stages or measurement["wall"] < stages[name]["wall"]:
+                stages[name] = measurement
+
+    if measure_memory:
+        for name, measurement in run_stages(data_dir, n_txs, True).items():
+            stages[name]["peak_memory"] = measurement["peak_memory"]
+
+    return stages
+
+
+def load_history(history_file):
+    history = list()
+    if os.path.exists(history_file):
+        with open(history_file, "r") as f:
+            history = [json.loads(line) for line in f if line.strip()]
+    return history
+
+
+def find_regressions(previous, current, max_slowdown, min_time):
+    # Stages whose wall time grew by more than 'max_slowdown' (ignoring stages faster than 'min_time' seconds, which are noise)
+    regressions = list()
+    for name, measurement in current["stages"].items():
+        if name not in previous["stages"]:
+            continue
+        before = previous["stages"][name]["wall"]
+        after = measurement["wall"]
+        if max(before, after) >= min_time and after > before * (1 + max_slowdown):
+            regressions.append(" {} at {} messages: {:.3f}s -> {:.3f}s ({:+.1f}%) since {}".format(name, current["scale"], before, after,
+                (after - before) * 100 / before if before > 0 else float("inf"), previous["revision"]))
+    return regressions
+
+
+def format_results(entry):
+    results = list()
+    results.append("[+] Analysis benchmark for {} messages (revision {}):\n".format(entry["scale"], entry["revision"]))
+    for name, measurement in entry["stages"].items():
+        line = " {:<24} wall {:>10}  cpu {:>10}".format(name, format_time_unit(measurement["wall"]), format_time_unit(measurement["cpu"]))
+        if "peak_memory" in measurement:
+            line += "  peak memory {:>10}".format(format_size_unit(measurement["peak_memory"]))
+        results.append(line)
+    total = sum([measurement["wall"] for measurement in entry["stages"].values()])
+    results.append("")
+    results.append(" Total wall time: {}".format(format_time_unit(total)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Time and memory-profile the analysis pipeline on synthetic datasets.")
+    parser.add_argument("-s", "--scales", default = "10000,100000", help = "Comma separated numbers of transfer messages (default: 10000,100000).")
+    parser.add_argument("-w", "--work-dir", default = "analysis_benchmark", help = "Directory for generated datasets and the results history (default: analysis_benchmark).")
+    parser.add_argument("-r", "--repeat", type = int, default = 1, help = "Number of timing runs per scale, the fastest is kept (default: 1).")
+    parser.add_argument("--no-memory", action = "store_true", help = "Skip the tracemalloc pass that measures peak memory per stage.")
+    parser.add_argument("--max-slowdown", type = float, default = 0.25, help = "Allowed wall time increase per stage before failing (default: 0.25, i.e. 25%%).")
+    parser.add_argument("--min-time", type = float, default = 0.05, help = "Ignore regressions in stages faster than this many seconds (default: 0.05).")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    work_dir = sanitize_path(args.work_dir) if not args.work_dir.startswith("/") else args.work_dir.rstrip("/") + "/"
+    os.makedirs(work_dir, exist_ok = True)
+    history_file = work_dir + "history.jsonl"
+    history = load_history(history_file)
+    revision = get_revision()
+    regressions = list()
+    report = list()
+
+    for n_messages in [int(scale) for scale in args.scales.split(",")]:
+        entry = {"timestamp": datetime.datetime.now().isoformat(), "revision": revision, "scale": n_messages, "seed": args.seed,
+            "stages": benchmark_scale(work_dir, n_messages, args.seed, args.repeat, not args.no_memory)}
+
+        previous = [past for past in history if past["scale"] == n_messages and past["seed"] == args.seed]
+        if len(previous) > 0:
+            regressions += find_regressions(previous[-1], entry, args.max_slowdown, args.min_time)
+
+        report.append(format_results(entry))
+        with open(history_file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    if len(regressions) > 0:
+        report.append(["[+] Performance regressions (more than {:.0f}% slower):\n".format(args.max_slowdown * 100)] + regressions)
+
+    display_results(report)
+    write_results(work_dir, report, "analysis_benchmark_report.txt")
+
+    if len(regressions) > 0:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
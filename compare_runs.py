@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+import os
+import sys
+import math
+import argparse
+from analysis_functions import *
+from event_warehouse import open_database, import_run
+
+# Performance regression gate: compares a candidate run (or set of runs, e.g. after upgrading gaiad or hermes, or changing
+# the templates) against a baseline run or set of runs with the same workload. The runs are imported with event_warehouse.py,
+# throughput and success rate are averaged over the runs of each side, and the per-message latency samples of each side are
+# pooled and compared with a one-sided Mann-Whitney U test. Exits with a non-zero status when a threshold is exceeded.
+
+LATENCY_MESSAGES = ("transfer", "recv", "ack", "round_trip") # 'round_trip' are the round trip times computed by data_analysis.py
+
+
+def import_runs(db, run_dirs):
+    run_ids = list()
+    for run_dir in run_dirs:
+        if not os.path.exists(os.path.join(run_dir, "benchmarking_report.txt")):
+            raise ValueError("'{}' has no benchmarking report, run data_analysis.py on it first".format(run_dir))
+        run_ids.append(import_run(db, run_dir, replace = True))
+    return run_ids
+
+
+def get_latency_samples(db, run_ids, message):
+    # Sorted latencies of a message type pooled over the runs, round trip times over all channels for 'round_trip'
+    placeholders = ",".join("?" * len(run_ids))
+    if message == "round_trip":
+        rows = db.execute("SELECT round_trip_time FROM round_trips WHERE channel IS NULL AND run_id IN ({})".format(placeholders), run_ids).fetchall()
+    else:
+        rows = db.execute("SELECT latency FROM latencies WHERE message = ? AND run_id IN ({})".format(placeholders), [message] + run_ids).fetchall()
+    return sorted([row[0] for row in rows])
+
+
+def get_side_metrics(db, run_ids):
+    # Mean throughput (messages/s) of the source and destination chains and mean success rate over the runs of one side
+    src_throughput, dst_throughput, success = list(), list(), list()
+    for run_id in run_ids:
+        src_chain_id, dst_chain_id = db.execute("SELECT src_chain_id, dst_chain_id FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        throughput = dict(db.execute("SELECT chain_id, messages_per_sec FROM run_throughput WHERE run_id = ?", (run_id,)).fetchall())
+        if throughput.get(src_chain_id) is not None:
+            src_throughput.append(throughput[src_chain_id])
+        if throughput.get(dst_chain_id) is not None:
+            dst_throughput.append(throughput[dst_chain_id])
+        finished = db.execute("SELECT finished_percentage FROM run_success_rate WHERE run_id = ?", (run_id,)).fetchone()
+        if finished is not None and finished[0] is not None:
+            success.append(finished[0])
+
+    mean = lambda values: sum(values) / len(values) if len(values) > 0 else None
+    return {"src_throughput": mean(src_throughput), "dst_throughput": mean(dst_throughput), "success": mean(success),
+        "latency": {message: get_latency_samples(db, run_ids, message) for message in LATENCY_MESSAGES}}
+
+
+def mann_whitney(baseline, candidate):
+    # One-sided Mann-Whitney U test (normal approximation with tie correction) of the candidate samples being larger than the
+    # baseline samples. Returns (U of the candidate, p-value), or (None, None) when a side has no samples
+    n1, n2 = len(candidate), len(baseline)
+    if n1 == 0 or n2 == 0:
+        return None, None
+
+    # Average ranks of the pooled samples, tied values share the mean of their ranks
+    pooled = sorted([[value, 1] for value in candidate] + [[value, 0] for value in baseline])
+    candidate_ranks = 0.0
+    tie_term = 0
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j < len(pooled) and pooled[j][0] == pooled[i][0]:
+            j += 1
+        rank = (i + j + 1) / 2 # Mean of ranks i + 1 ... j
+        candidate_ranks += rank * sum([sample[1] for sample in pooled[i:j]])
+        tie_term += (j - i) ** 3 - (j - i)
+        i = j
+
+    n = n1 + n2
+    u = candidate_ranks - n1 * (n1 + 1) / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))) if n > 1 else 0
+    if variance <= 0: # All samples are equal
+        return u, 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance) # Continuity correction
+    return u, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def relative_change(before, after):
+    if before is None or after is None:
+        return None
+    if before == 0:
+        return 0.0 if after == 0 else float("inf")
+    return (after - before) / before
+
+
+def format_change(before, after, unit = "", precision = 2):
+    change = relative_change(before, after)
+    return "{} -> {} ({})".format("-" if before is None else "{:.{}f}{}".format(before, precision, unit), "-" if after is None else "{:.{}f}{}".format(after, precision, unit),
+        "-" if change is None else "{:+.1f}%".format(change * 100))
+
+
+def compare(baseline, candidate, max_throughput_drop, max_latency_increase, max_success_drop, alpha):
+    # Returns the comparison lines and the lines of the metrics that regressed
+    results = list()
+    regressions = list()
+
+    results.append(" Throughput:")
+    for key, label in (("src_throughput", "source chain"), ("dst_throughput", "destination chain")):
+        line = "  {:<22} {}".format(label, format_change(baseline[key], candidate[key], " msg/s"))
+        change = relative_change(baseline[key], candidate[key])
+        if change is not None and change < -max_throughput_drop:
+            regressions.append(" Throughput on the {}: {}".format(label, format_change(baseline[key], candidate[key], " msg/s")))
+            line += "  REGRESSION"
+        results.append(line)
+
+    results.append("")
+    results.append(" Success rate:")
+    line = "  {:<22} {}".format("finished transfers", format_change(baseline["success"], candidate["success"], "%"))
+    if baseline["success"] is not None and candidate["success"] is not None and candidate["success"] < baseline["success"] - max_success_drop:
+        regressions.append(" Finished transfers: {}".format(format_change(baseline["success"], candidate["success"], "%")))
+        line += "  REGRESSION"
+    results.append(line)
+
+    results.append("")
+    results.append(" Latency (p50 / p99, one-sided Mann-Whitney U test of the candidate being slower):")
+    for message in LATENCY_MESSAGES:
+        before, after = baseline["latency"][message], candidate["latency"][message]
+        if len(before) == 0 or len(after) == 0:
+            results.append("  {:<22} no samples ({} baseline, {} candidate)".format(message, len(before), len(after)))
+            continue
+
+        u, p_value = mann_whitney(before, after)
+        p50_change = relative_change(get_percentile(before, 50), get_percentile(after, 50))
+        p99_change = relative_change(get_percentile(before, 99), get_percentile(after, 99))
+        line = "  {:<22} p50 {}, p99 {}, p = {:.4g} ({} / {} samples)".format(message, format_change(get_percentile(before, 50), get_percentile(after, 50), "s"),
+            format_change(get_percentile(before, 99), get_percentile(after, 99), "s"), p_value, len(before), len(after))
+        # A latency regression must be both statistically significant and larger than the threshold, so neither noise in small samples
+        # nor negligible shifts in very large samples fail the gate
+        if p_value < alpha and max(p50_change, p99_change) > max_latency_increase:
+            regressions.append(" {} latency: p50 {}, p99 {}, p = {:.4g}".format(message, format_change(get_percentile(before, 50), get_percentile(after, 50), "s"),
+                format_change(get_percentile(before, 99), get_percentile(after, 99), "s"), p_value))
+            line += "  REGRESSION"
+        results.append(line)
+
+    return results, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare a candidate benchmark run against a baseline and fail on performance regressions.")
+    parser.add_argument("-b", "--baseline", nargs = "+", required = True, help = "Output directories of the baseline run(s).")
+    parser.add_argument("-c", "--candidate", nargs = "+", required = True, help = "Output directories of the candidate run(s).")
+    parser.add_argument("--max-throughput-drop", type = float, default = 0.1, help = "Allowed relative throughput decrease per chain (default: 0.1, i.e. 10%%).")
+    parser.add_argument("--max-latency-increase", type = float, default = 0.1, help = "Allowed relative p50/p99 latency increase (default: 0.1, i.e. 10%%).")
+    parser.add_argument("--max-success-drop", type = float, default = 1.0, help = "Allowed decrease of finished transfers in percentage points (default: 1.0).")
+    parser.add_argument("--alpha", type = float, default = 0.01, help = "Significance level of the latency test (default: 0.01).")
+    parser.add_argument("--database", default = ":memory:", help = "event_warehouse.py database the runs are imported into (default: in memory).")
+    parser.add_argument("-o", "--output", help = "Also write the comparison to this file.")
+    args = parser.parse_args()
+
+    db = open_database(args.database)
+    try:
+        baseline_ids = import_runs(db, args.baseline)
+        candidate_ids = import_runs(db, args.candidate)
+    except (OSError, ValueError) as error:
+        print("[!] Could not import the runs: {}".format(error), file = sys.stderr)
+        raise SystemExit(1)
+    baseline = get_side_metrics(db, baseline_ids)
+    candidate = get_side_metrics(db, candidate_ids)
+    db.close()
+
+    results, regressions = compare(baseline, candidate, args.max_throughput_drop, args.max_latency_increase, args.max_success_drop, args.alpha)
+    report = [["[+] Performance comparison of {} against {}:\n".format(", ".join(args.candidate), ", ".join(args.baseline))] + results]
+    if len(regressions) > 0:
+        report.append(["[+] Performance regressions:\n"] + regressions)
+
+    display_results(report)
+    if args.output:
+        write_results(os.path.dirname(os.path.abspath(args.output)) + "/", report, os.path.basename(args.output))
+
+    if len(regressions) > 0:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
+import os
+import glob
 from analysis_functions import *
 
 def main():
-    if len(sys.argv) != 14:
+    # Optional flags can be given anywhere after the positional arguments
+    flags = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    sys.argv = [arg for arg in sys.argv if not arg.startswith("--")]
+
+    if len(sys.argv) not in (14, 15) or len([flag for flag in flags if flag not in ("--profile", "--cprofile", "--plots")]) > 0:
         usage()
         raise SystemExit
     
@@ -20,6 +26,10 @@ def main():
     data_collection_time = int(sys.argv[11])
     src_last_throughput_block = int(sys.argv[12]) # Do not include blocks after this one for throughput calculation
     dst_last_throughput_block = int(sys.argv[13]) # Do not include blocks after this one for throughput calculation
+    n_channels = int(sys.argv[14]) if len(sys.argv) == 15 else 1 # Number of channels the users were distributed across
+
+    # Time and memory measurements for each analysis stage (--profile), optionally with cProfile output (--cprofile)
+    profiler = StageProfiler("--profile" in flags or "--cprofile" in flags, "--cprofile" in flags)
 
     benchmarking_report = list()
     
@@ -27,75 +37,136 @@ def main():
 
     benchmarking_report.append(get_benchmark_info(src_chain_id, dst_chain_id, n_validators, n_users, n_txs, msgs_per_tx, transfer_submission_time, waiting_time, data_collection_time))
 
-    # Read block data for source and destination chain
-    src_chain_data = read_file(data_dir, "block_data_" + src_chain_id + ".txt") # Read json 
-    dst_chain_data = read_file(data_dir, "block_data_" + dst_chain_id + ".txt")
+    # Stream block data for source and destination chain, computing every per-chain aggregate (message counts, tx distribution,
+    # tx classification, throughput window, block capacity, per-channel counts and tx hash index) in the same pass.
+    # The blocks themselves are only kept for the figures
+    keep_blocks = "--plots" in flags
+    src_blocks, src_metrics = profiler.run("read_block_metrics", read_block_metrics, data_dir, "block_data_" + src_chain_id + ".txt", src_last_throughput_block, keep_blocks)
+    dst_blocks, dst_metrics = profiler.run("read_block_metrics", read_block_metrics, data_dir, "block_data_" + dst_chain_id + ".txt", dst_last_throughput_block, keep_blocks)
 
 
     # Read transfer data from relayer log files
     # Relayer files contain log data from confirmed transactions on source and destination chains
-    src_chain_latency_data = read_file(data_dir, "logs_" + src_chain_id + ".txt")
-    dst_chain_latency_data = read_file(data_dir, "logs_" + dst_chain_id + ".txt")
+    src_chain_latency_data = profiler.run("read_file", read_file, data_dir, "logs_" + src_chain_id + ".txt")
+    dst_chain_latency_data = profiler.run("read_file", read_file, data_dir, "logs_" + dst_chain_id + ".txt")
     
     # Load data from hermes logs to calculate message round trip time
-    relayer_data = read_file(data_dir, "hermes_log.txt")
+    relayer_data = profiler.run("read_file", read_file, data_dir, "hermes_log.txt")
+
+    # Read consensus commit data (rounds, proposers and validator signatures) for source and destination chain
+    src_commit_data = profiler.run("read_file", read_file, data_dir, "commit_data_" + src_chain_id + ".txt")
+    dst_commit_data = profiler.run("read_file", read_file, data_dir, "commit_data_" + dst_chain_id + ".txt")
 
-    # Load json block data into dictionaries
-    src_blocks = load_json(src_chain_data)
-    dst_blocks = load_json(dst_chain_data)
+    # Load json commit data into dictionaries
+    src_commits = profiler.run("load_json", load_json, src_commit_data)
+    dst_commits = profiler.run("load_json", load_json, dst_commit_data)
 
-    # Extract transaction data from block data
-    src_txs = parse_txs_from_blocks(src_blocks)
-    dst_txs = parse_txs_from_blocks(dst_blocks)
+    # Transaction data indexed by tx hash
+    src_txs = src_metrics.txs
+    dst_txs = dst_metrics.txs
 
 
     # Tx distribution analysis
-    benchmarking_report.append(calc_tx_distribution(src_blocks, src_chain_id))
-    benchmarking_report.append(calc_tx_distribution(dst_blocks, dst_chain_id))
+    benchmarking_report.append(format_tx_distribution(src_metrics.tx_distribution, src_chain_id))
+    benchmarking_report.append(format_tx_distribution(dst_metrics.tx_distribution, dst_chain_id))
     
 
     # Throughput analysis
-    benchmarking_report.append(calc_throughput(src_blocks, src_last_throughput_block))
-    benchmarking_report.append(calc_throughput(dst_blocks, dst_last_throughput_block))
+    benchmarking_report.append(format_throughput(src_chain_id, *src_metrics.get_throughput_window()))
+    benchmarking_report.append(format_throughput(dst_chain_id, *dst_metrics.get_throughput_window()))
+
+    # Block capacity analysis (block size and gas against the max_bytes and max_gas consensus parameters)
+    src_consensus_params = read_consensus_params(data_dir, "consensus_params_" + src_chain_id + ".txt")
+    dst_consensus_params = read_consensus_params(data_dir, "consensus_params_" + dst_chain_id + ".txt")
+    for metrics, consensus_params, chain_id in ((src_metrics, src_consensus_params, src_chain_id), (dst_metrics, dst_consensus_params, dst_chain_id)):
+        benchmarking_report.append(profiler.run("calc_block_utilization", format_block_utilization, metrics.window_block_sizes, metrics.window_block_gas_wanted,
+            metrics.window_gas_used, metrics.window_has_gas, consensus_params, chain_id))
+
+    # Consensus commit analysis (vote latency per validator, multi-round blocks, block time per proposer)
+    benchmarking_report.append(profiler.run("calc_commit_latency", calc_commit_latency, src_commits, src_chain_id))
+    benchmarking_report.append(profiler.run("calc_commit_latency", calc_commit_latency, dst_commits, dst_chain_id))
 
     # Round trip time analysis
-    benchmarking_report.append(calc_round_trip_time(relayer_data, src_chain_id, dst_chain_id, src_txs, dst_txs, data_dir))
+    benchmarking_report.append(profiler.run("calc_round_trip_time", calc_round_trip_time, relayer_data, src_chain_id, dst_chain_id, src_txs, dst_txs, data_dir))
     
     # Calculate success rate given the number of blocks and confirmed transactions/messages
-    benchmarking_report.append(calc_success_rate(src_blocks, dst_blocks, n_users, n_txs, msgs_per_tx, src_chain_id, dst_chain_id))
+    benchmarking_report.append(format_success_rate(src_metrics.messages, dst_metrics.messages, n_users, n_txs, msgs_per_tx, src_chain_id, dst_chain_id))
+
+    # When multiple relayer instances were used, attribute relayed messages to each of them
+    relayer_log_files = sorted(glob.glob(data_dir + "hermes_log_relayer*.txt"))
+    if len(relayer_log_files) > 0:
+        relayer_logs = {}
+        for log_file in relayer_log_files:
+            relayer = os.path.basename(log_file)[len("hermes_log_"):-len(".txt")] # e.g. 'relayer0'
+            relayer_logs[relayer] = read_file(data_dir, os.path.basename(log_file))
+        benchmarking_report.append(profiler.run("calc_relayer_attribution", calc_relayer_attribution, relayer_logs, src_chain_id, dst_chain_id, src_metrics.messages, dst_metrics.messages, src_txs, dst_txs))
     
     # Parse relayer log data for source chain to get latency for transfer messages
-    transfer_latency = parse_transfer_latency(src_chain_latency_data)
+    transfer_latency = profiler.run("parse_latency", parse_transfer_latency, src_chain_latency_data)
     
     # Parse relayer log data for destination chain to get latency for recv messages
-    recv_latency = parse_recv_latency(dst_chain_latency_data)
+    recv_latency = profiler.run("parse_latency", parse_recv_latency, dst_chain_latency_data)
 
     # Parse relayer log data for source chain to get latency for acknowledgement messages 
-    ack_latency = parse_ack_latency(src_chain_latency_data)
+    ack_latency = profiler.run("parse_latency", parse_ack_latency, src_chain_latency_data)
 
     # Calculate latency
-    benchmarking_report.append(calc_latency(transfer_latency, recv_latency, ack_latency, src_chain_id, dst_chain_id))
+    benchmarking_report.append(profiler.run("calc_latency", calc_latency, transfer_latency, recv_latency, ack_latency, src_chain_id, dst_chain_id))
+
+    # Per-channel success rate, round trip time and latency when the users were distributed across several channels
+    if n_channels > 1:
+        for channel in sort_channels(src_metrics.channels.keys()):
+            src_channel = src_metrics.get_channel(channel)
+            dst_channel = dst_metrics.get_channel(channel)
+            src_channel_txs = src_channel["txs"]
+            dst_channel_txs = dst_channel["txs"]
+            channel_users = get_channel_users(n_users, n_channels, channel)
+
+            benchmarking_report.append(profiler.run("calc_round_trip_time", calc_round_trip_time, relayer_data, src_chain_id, dst_chain_id, src_channel_txs, dst_channel_txs, data_dir, channel))
+            benchmarking_report.append(format_success_rate(src_channel["messages"], dst_channel["messages"], channel_users, n_txs, msgs_per_tx, src_chain_id, dst_chain_id, channel))
+            benchmarking_report.append(calc_latency(filter_latency_by_txs(transfer_latency, src_channel_txs), filter_latency_by_txs(recv_latency, dst_channel_txs),
+                filter_latency_by_txs(ack_latency, src_channel_txs), src_chain_id, dst_chain_id, channel))
 
 
     if tx_data_analysis == "true":
 
-        src_transfer_info, src_recv_info, src_ack_info, src_timeout_info, src_block_info = get_detailed_tx_size(src_blocks)
-        dst_transfer_info, dst_recv_info, dst_ack_info, dst_timeout_info, dst_block_info = get_detailed_tx_size(dst_blocks)
-    
-        benchmarking_report.append(calc_detailed_data_size(src_transfer_info, src_recv_info, src_ack_info, timeout_info, src_block_info, src_chain_id))
-        benchmarking_report.append(calc_detailed_data_size(dst_transfer_info, dst_recv_info, dst_ack_info, timeout_info, dst_block_info, dst_chain_id))
+        # Tx sizes were accumulated from the tx data while streaming the blocks
+        benchmarking_report.append(format_detailed_data_size(src_metrics.tx_classes, src_metrics.tx_class_bytes, src_metrics.bytes, src_metrics.n_blocks, src_chain_id))
+        benchmarking_report.append(format_detailed_data_size(dst_metrics.tx_classes, dst_metrics.tx_class_bytes, dst_metrics.bytes, dst_metrics.n_blocks, dst_chain_id))
     
     else:
         
-        src_transfer_info, src_recv_info, src_ack_info, src_timeout_info, src_block_info = get_tx_size(src_blocks)
-        dst_transfer_info, dst_recv_info, dst_ack_info, dst_timeout_info, dst_block_info = get_tx_size(dst_blocks)
-    
-        benchmarking_report.append(calc_data_size(src_transfer_info, src_recv_info, src_ack_info, src_timeout_info, src_block_info, src_chain_id, src_last_throughput_block))
-        benchmarking_report.append(calc_data_size(dst_transfer_info, dst_recv_info, dst_ack_info, dst_timeout_info, dst_block_info, dst_chain_id, dst_last_throughput_block))
+        benchmarking_report.append(format_data_size(src_metrics.tx_classes, src_metrics.window_bytes, src_metrics.window_blocks, src_chain_id))
+        benchmarking_report.append(format_data_size(dst_metrics.tx_classes, dst_metrics.window_bytes, dst_metrics.window_blocks, dst_chain_id))
+
+    # Resource usage of the local gaiad and hermes processes in each benchmark phase, sampled by resource_sampler.py
+    resource_samples, resource_processes = read_resource_samples(data_dir)
+    if resource_samples is not None:
+        benchmarking_report.append(profiler.run("calc_resource_usage", calc_resource_usage, resource_samples, resource_processes,
+            read_benchmark_phases(data_dir, "benchmark_phases.txt")))
+
+    if profiler.enabled:
+        benchmarking_report.append(profiler.get_results())
+        profiler.write(data_dir, "analysis_profile.json")
 
     display_results(benchmarking_report)
     write_results(data_dir, benchmarking_report, "benchmarking_report.txt")
 
+    # Figures of the run in <data_dir>/plots/ (--plots), matplotlib is an optional dependency
+    if "--plots" in flags:
+        try:
+            from plot_results import plot_run
+            plot_run(data_dir, src_chain_id, dst_chain_id, src_blocks, dst_blocks, transfer_latency, recv_latency, ack_latency)
+            print("[+] Figures written to '{}plots/'".format(data_dir))
+        except ImportError:
+            print("[!] matplotlib is not installed, skipping figures (pip install matplotlib)")
+
+    # Run parameters, used by event_warehouse.py to import the run
+    with open(data_dir + "run_info.json", "w") as f:
+        json.dump({"src_chain_id": src_chain_id, "dst_chain_id": dst_chain_id, "n_validators": n_validators, "n_users": n_users, "n_txs": n_txs,
+            "msgs_per_tx": msgs_per_tx, "n_channels": n_channels, "src_last_throughput_block": src_last_throughput_block,
+            "dst_last_throughput_block": dst_last_throughput_block}, f, indent = 2)
+
     #del src_transfer_sizes
     
     #transaction_distribution(src_blocks)
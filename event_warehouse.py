@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+import os
+import sys
+import glob
+import json
+import time
+import sqlite3
+import argparse
+import datetime
+import dateutil.parser
+from analysis_functions import *
+
+# Imports the output directories of benchmark runs (block data, relayer logs and the round trip times computed by
+# data_analysis.py) into an indexed SQLite database, so metrics can be queried across many runs with plain SQL.
+# The views at the end of SCHEMA compute the same metrics as the benchmarking report, one row per run.
+
+BATCH_SIZE = 10000 # Rows per executemany() call during import
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    imported_at TEXT,
+    src_chain_id TEXT,
+    dst_chain_id TEXT,
+    n_validators INTEGER,
+    n_users INTEGER,
+    n_txs INTEGER,
+    msgs_per_tx INTEGER,
+    n_channels INTEGER,
+    src_last_throughput_block INTEGER,
+    dst_last_throughput_block INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS blocks (
+    run_id INTEGER NOT NULL,
+    chain_id TEXT NOT NULL,
+    position INTEGER NOT NULL, -- Index of the block in block_data_<chain>.txt, the report only uses the first 'last_throughput_block' blocks
+    height INTEGER NOT NULL,
+    time TEXT,
+    time_unix REAL,
+    size INTEGER,
+    num_txs INTEGER,
+    PRIMARY KEY (run_id, chain_id, height)
+);
+
+CREATE TABLE IF NOT EXISTS txs (
+    run_id INTEGER NOT NULL,
+    chain_id TEXT NOT NULL,
+    height INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    channel TEXT,
+    transfer INTEGER,
+    recv INTEGER,
+    ack INTEGER,
+    timeout INTEGER
+);
+CREATE INDEX IF NOT EXISTS txs_run_chain ON txs (run_id, chain_id, height);
+CREATE INDEX IF NOT EXISTS txs_hash ON txs (tx_hash);
+
+CREATE TABLE IF NOT EXISTS relayer_events (
+    run_id INTEGER NOT NULL,
+    relayer TEXT NOT NULL, -- 'relayer' for hermes_log.txt, 'relayer<N>' for the logs of each instance in multi-relayer runs
+    event TEXT NOT NULL, -- 'send_packet', 'broadcast' or 'confirmed'
+    chain_id TEXT, -- Chain the tx was broadcasted to, NULL for confirmations (resolve through the txs table)
+    time TEXT,
+    time_unix REAL,
+    tx_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS relayer_events_run ON relayer_events (run_id, event, time_unix);
+CREATE INDEX IF NOT EXISTS relayer_events_hash ON relayer_events (tx_hash);
+
+CREATE TABLE IF NOT EXISTS latencies (
+    run_id INTEGER NOT NULL,
+    message TEXT NOT NULL, -- 'transfer', 'recv' or 'ack'
+    tx_hash TEXT,
+    latency REAL
+);
+CREATE INDEX IF NOT EXISTS latencies_run ON latencies (run_id, message, latency);
+
+CREATE TABLE IF NOT EXISTS round_trips (
+    run_id INTEGER NOT NULL,
+    channel TEXT, -- NULL for round_trip_times.txt (all channels)
+    transfer_broadcast TEXT,
+    recv_broadcast TEXT,
+    ack_broadcast TEXT,
+    ack_confirmation TEXT,
+    round_trip_time REAL
+);
+CREATE INDEX IF NOT EXISTS round_trips_run ON round_trips (run_id, channel, round_trip_time);
+
+-- Message counts per run and chain (BlockMetrics.messages)
+CREATE VIEW IF NOT EXISTS run_messages AS
+SELECT run_id, chain_id, COUNT(*) AS txs, SUM(transfer) AS transfers, SUM(recv) AS recvs, SUM(ack) AS acks, SUM(timeout) AS timeouts
+FROM txs GROUP BY run_id, chain_id;
+
+-- Throughput analysis (format_throughput), restricted to the blocks before 'last_throughput_block'
+CREATE VIEW IF NOT EXISTS run_throughput AS
+SELECT b.run_id, b.chain_id, b.n_blocks, b.empty_blocks, b.empty_blocks * 100.0 / b.n_blocks AS empty_blocks_percentage,
+    b.avg_block_size, b.duration / (b.n_blocks - 1) AS avg_block_time,
+    COALESCE(t.txs, 0) * 1.0 / b.n_blocks AS avg_txs_per_block,
+    COALESCE(t.txs, 0) / b.duration AS txs_per_sec,
+    COALESCE(t.messages, 0) / b.duration AS messages_per_sec,
+    COALESCE(t.transfers, 0) / b.duration AS transfers_per_sec
+FROM (
+    SELECT blocks.run_id, blocks.chain_id, COUNT(*) AS n_blocks, SUM(num_txs = 0) AS empty_blocks, AVG(size) AS avg_block_size,
+        MAX(time_unix) - MIN(time_unix) AS duration
+    FROM blocks JOIN runs ON runs.run_id = blocks.run_id
+    WHERE position < (CASE WHEN blocks.chain_id = runs.src_chain_id THEN runs.src_last_throughput_block ELSE runs.dst_last_throughput_block END)
+    GROUP BY blocks.run_id, blocks.chain_id
+) b LEFT JOIN (
+    SELECT txs.run_id, txs.chain_id, COUNT(*) AS txs, SUM(transfer + recv + ack + timeout) AS messages, SUM(transfer) AS transfers
+    FROM txs JOIN blocks ON blocks.run_id = txs.run_id AND blocks.chain_id = txs.chain_id AND blocks.height = txs.height
+    JOIN runs ON runs.run_id = txs.run_id
+    WHERE blocks.position < (CASE WHEN txs.chain_id = runs.src_chain_id THEN runs.src_last_throughput_block ELSE runs.dst_last_throughput_block END)
+    GROUP BY txs.run_id, txs.chain_id
+) t ON t.run_id = b.run_id AND t.chain_id = b.chain_id;
+
+-- Success rate analysis (format_success_rate and get_transfer_status)
+CREATE VIEW IF NOT EXISTS run_success_rate AS
+SELECT run_id, submitted, transfers, recvs, acks, timeouts, finished, partially_finished,
+    transfers - (partially_finished + finished + timeouts) AS initiated, submitted - transfers AS not_initiated,
+    finished * 100.0 / submitted AS finished_percentage
+FROM (
+    SELECT run_id, submitted, transfers, recvs, acks, timeouts, MIN(acks, transfers) AS finished,
+        MIN(CASE WHEN recvs > transfers THEN transfers ELSE recvs - acks END, transfers - acks - timeouts) AS partially_finished
+    FROM (
+        SELECT runs.run_id, runs.n_users * runs.n_txs * runs.msgs_per_tx AS submitted,
+            COALESCE(src.transfers, 0) AS transfers, COALESCE(dst.recvs, 0) AS recvs, COALESCE(src.acks, 0) AS acks, COALESCE(src.timeouts, 0) AS timeouts
+        FROM runs
+        LEFT JOIN run_messages src ON src.run_id = runs.run_id AND src.chain_id = runs.src_chain_id
+        LEFT JOIN run_messages dst ON dst.run_id = runs.run_id AND dst.chain_id = runs.dst_chain_id
+    )
+);
+
+-- Round trip time analysis (calc_round_trip_time), 'channel' is NULL for all channels together
+CREATE VIEW IF NOT EXISTS run_round_trip_time AS
+SELECT run_id, channel, COUNT(*) AS round_trips, AVG(round_trip_time) AS avg_rtt, MIN(round_trip_time) AS shortest_rtt, MAX(round_trip_time) AS longest_rtt
+FROM round_trips GROUP BY run_id, channel;
+
+-- Confirmation latency analysis (calc_latency) with nearest-rank percentiles
+CREATE VIEW IF NOT EXISTS run_latency AS
+SELECT run_id, message, COUNT(*) AS samples, AVG(latency) AS avg_latency, MIN(latency) AS shortest_latency, MAX(latency) AS longest_latency,
+    MIN(CASE WHEN rank * 1.0 >= 0.50 * n THEN latency END) AS p50_latency,
+    MIN(CASE WHEN rank * 1.0 >= 0.90 * n THEN latency END) AS p90_latency,
+    MIN(CASE WHEN rank * 1.0 >= 0.99 * n THEN latency END) AS p99_latency
+FROM (
+    SELECT run_id, message, latency, ROW_NUMBER() OVER (PARTITION BY run_id, message ORDER BY latency) AS rank,
+        COUNT(*) OVER (PARTITION BY run_id, message) AS n
+    FROM latencies
+) GROUP BY run_id, message;
+"""
+
+
+def parse_time(timestamp):
+    return dateutil.parser.parse(timestamp).timestamp()
+
+
+def open_database(db_file):
+    db = sqlite3.connect(db_file)
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+
+def insert_rows(db, table, rows):
+    # Batched bulk insert, 'rows' can be any iterable of tuples
+    batch = list()
+    placeholders = None
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            placeholders = placeholders or ",".join("?" * len(row))
+            db.executemany("INSERT INTO {} VALUES ({})".format(table, placeholders), batch)
+            batch = list()
+    if len(batch) > 0:
+        db.executemany("INSERT INTO {} VALUES ({})".format(table, ",".join("?" * len(batch[0]))), batch)
+
+
+def get_run_info(run_dir):
+    # Run parameters written by data_analysis.py, older runs only have them in the report
+    run_info_file = os.path.join(run_dir, "run_info.json")
+    if os.path.exists(run_info_file):
+        with open(run_info_file, "r") as f:
+            return json.load(f)
+
+    run_info = {}
+    report_file = os.path.join(run_dir, "benchmarking_report.txt")
+    if os.path.exists(report_file):
+        report_fields = {"Source chain": "src_chain_id", "Destination chain": "dst_chain_id", "Number of validators in each chain": "n_validators",
+            "Number of user accounts": "n_users", "Transactions submitted per user": "n_txs", "Transfer messages per transaction": "msgs_per_tx"}
+        with open(report_file, "r") as f:
+            for line in f:
+                key, _, value = line.strip().partition(": ")
+                if key in report_fields:
+                    value = value.strip()
+                    run_info[report_fields[key]] = int(value) if value.isdigit() else value
+    return run_info
+
+
+def get_chain_ids(run_dir, run_info):
+    if "src_chain_id" in run_info and "dst_chain_id" in run_info:
+        return run_info["src_chain_id"], run_info["dst_chain_id"]
+    # Without run info, assume the setup_testnet.py naming where the source chain comes first
+    chain_ids = sorted([os.path.basename(f)[len("block_data_"):-len(".txt")] for f in glob.glob(os.path.join(run_dir, "block_data_*.txt"))])
+    if len(chain_ids) != 2:
+        raise ValueError("cannot determine the chain ids of '{}'".format(run_dir))
+    return chain_ids[0], chain_ids[1]
+
+
+def iter_blocks(data_dir, filename):
+    # Parse a block data file one JSON block per line, like read_block_metrics, so only one block is held in memory at a time
+    with open(data_dir + filename, "r") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def get_block_row(run_id, position, block):
+    return (run_id, block["chain-id"], position, block["block_height"], block["block_time"], parse_time(block["block_time"]), block["block_size"], block["num_transactions"])
+
+
+def iter_tx_rows(run_id, block):
+    for tx in block["transactions"]:
+        yield (run_id, block["chain-id"], block["block_height"], tx["tx_hash"], tx.get("channel") or None,
+            tx["MsgTransfer"], tx["MsgRecvPacket"], tx["MsgAcknowledgement"], tx["MsgTimeout"])
+
+
+def insert_blocks(db, run_id, blocks):
+    # Insert the blocks and their txs in batches from a single pass over 'blocks' (any iterable), returning the number of blocks
+    block_rows = list()
+    tx_rows = list()
+    n_blocks = 0
+    for block in blocks:
+        block_rows.append(get_block_row(run_id, n_blocks, block))
+        tx_rows.extend(iter_tx_rows(run_id, block))
+        n_blocks += 1
+        if len(block_rows) >= BATCH_SIZE or len(tx_rows) >= BATCH_SIZE:
+            insert_rows(db, "blocks", block_rows)
+            insert_rows(db, "txs", tx_rows)
+            block_rows = list()
+            tx_rows = list()
+    insert_rows(db, "blocks", block_rows)
+    insert_rows(db, "txs", tx_rows)
+    return n_blocks
+
+
+def iter_relayer_event_rows(run_id, relayer, relayer_data):
+    # The same events calc_round_trip_time extracts from the hermes log
+    for event in relayer_data:
+        if "ERROR" in event:
+            continue
+        if 'event="SendPacket"' in event:
+            timestamp = event[:27]
+            yield (run_id, relayer, "send_packet", None, timestamp, parse_time(timestamp), event.split(" ")[-2])
+        elif "send_tx_with_account_sequence_retry{id=" in event and "broadcast_tx_sync" in event:
+            timestamp = event[:27]
+            chain_id = event.split("send_tx_with_account_sequence_retry{id=")[-1].split("}")[0]
+            tx_hash = event.split("transaction::Hash")[-1].split()[0].strip("()")
+            yield (run_id, relayer, "broadcast", chain_id, timestamp, parse_time(timestamp), tx_hash)
+        elif "transactions confirmed" in event:
+            timestamp = event[:27]
+            for tx_hash in event.split(";")[1:]:
+                yield (run_id, relayer, "confirmed", None, timestamp, parse_time(timestamp), tx_hash.strip())
+
+
+def iter_round_trip_rows(run_id, channel, rtt_data):
+    for line in rtt_data[1:]: # Skip header
+        fields = line.strip().split(";")
+        if len(fields) == 5:
+            yield (run_id, channel, fields[0], fields[1], fields[2], fields[3], float(fields[4]))
+
+
+def import_run(db, run_dir, replace = False):
+    # Import one benchmark output directory in a single transaction, returning its run_id (None if already imported)
+    path = os.path.abspath(run_dir)
+    existing = db.execute("SELECT run_id FROM runs WHERE path = ?", (path,)).fetchone()
+    if existing is not None:
+        if not replace:
+            return None
+        delete_run(db, existing[0])
+
+    data_dir = path + "/" # analysis_functions read helpers expect a trailing slash
+    run_info = get_run_info(path)
+    src_chain_id, dst_chain_id = get_chain_ids(path, run_info)
+
+    with db:
+        cursor = db.execute("INSERT INTO runs VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (path, datetime.datetime.now().isoformat(),
+            src_chain_id, dst_chain_id, run_info.get("n_validators"), run_info.get("n_users"), run_info.get("n_txs"), run_info.get("msgs_per_tx"),
+            run_info.get("n_channels", 1), run_info.get("src_last_throughput_block"), run_info.get("dst_last_throughput_block")))
+        run_id = cursor.lastrowid
+
+        # Blocks are streamed from the files, without run info every block counts for throughput
+        n_src_blocks = insert_blocks(db, run_id, iter_blocks(data_dir, "block_data_" + src_chain_id + ".txt"))
+        n_dst_blocks = insert_blocks(db, run_id, iter_blocks(data_dir, "block_data_" + dst_chain_id + ".txt"))
+        db.execute("UPDATE runs SET src_last_throughput_block = COALESCE(src_last_throughput_block, ?), dst_last_throughput_block = COALESCE(dst_last_throughput_block, ?) WHERE run_id = ?",
+            (n_src_blocks, n_dst_blocks, run_id))
+
+        relayer_logs = [["relayer", "hermes_log.txt"]]
+        for log_file in sorted(glob.glob(os.path.join(path, "hermes_log_relayer*.txt"))):
+            relayer_logs.append([os.path.basename(log_file)[len("hermes_log_"):-len(".txt")], os.path.basename(log_file)])
+        for relayer, filename in relayer_logs:
+            if os.path.exists(data_dir + filename):
+                insert_rows(db, "relayer_events", iter_relayer_event_rows(run_id, relayer, read_file(data_dir, filename)))
+
+        if os.path.exists(data_dir + "logs_" + src_chain_id + ".txt") and os.path.exists(data_dir + "logs_" + dst_chain_id + ".txt"):
+            src_chain_latency_data = read_file(data_dir, "logs_" + src_chain_id + ".txt")
+            dst_chain_latency_data = read_file(data_dir, "logs_" + dst_chain_id + ".txt")
+            for message, latency in (("transfer", parse_transfer_latency(src_chain_latency_data)), ("recv", parse_recv_latency(dst_chain_latency_data)),
+                    ("ack", parse_ack_latency(src_chain_latency_data))):
+                insert_rows(db, "latencies", ((run_id, message, tx_hash, float(delay)) for tx_hash, delay in latency))
+
+        # Round trip times are computed by data_analysis.py, the analysis must have been run on the directory
+        for rtt_file in sorted(glob.glob(os.path.join(path, "round_trip_times*.txt"))):
+            channel = os.path.basename(rtt_file)[len("round_trip_times"):-len(".txt")].lstrip("_") or None
+            insert_rows(db, "round_trips", iter_round_trip_rows(run_id, channel, read_file(data_dir, os.path.basename(rtt_file))))
+
+    return run_id
+
+
+def delete_run(db, run_id):
+    with db:
+        for table in ("blocks", "txs", "relayer_events", "latencies", "round_trips", "runs"):
+            db.execute("DELETE FROM {} WHERE run_id = ?".format(table), (run_id,))
+
+
+def run_query(db, query):
+    cursor = db.execute(query)
+    rows = cursor.fetchall()
+    if cursor.description is None:
+        return list()
+
+    columns = [column[0] for column in cursor.description]
+    rows = [["" if value is None else "{:.6g}".format(value) if isinstance(value, float) else str(value) for value in row] for row in rows]
+    widths = [max([len(column)] + [len(row[i]) for row in rows]) for i, column in enumerate(columns)]
+
+    results = list()
+    results.append("  ".join(column.ljust(widths[i]) for i, column in enumerate(columns)))
+    results.append("  ".join("-" * width for width in widths))
+    for row in rows:
+        results.append("  ".join(value.ljust(widths[i]) for i, value in enumerate(row)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Import benchmark runs into a SQLite database and query metrics across runs.")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+
+    import_parser = subparsers.add_parser("import", help = "Import benchmark output directories (run data_analysis.py on them first for round trip times).")
+    import_parser.add_argument("database")
+    import_parser.add_argument("run_dirs", nargs = "+")
+    import_parser.add_argument("--replace", action = "store_true", help = "Re-import directories that are already in the database.")
+
+    query_parser = subparsers.add_parser("query", help = "Run a SQL query, e.g. \"SELECT * FROM run_latency JOIN runs USING (run_id) WHERE n_validators = 10\".")
+    query_parser.add_argument("database")
+    query_parser.add_argument("sql")
+
+    args = parser.parse_args()
+    db = open_database(args.database)
+
+    if args.command == "import":
+        for run_dir in args.run_dirs:
+            start = time.perf_counter()
+            try:
+                run_id = import_run(db, run_dir, args.replace)
+            except (OSError, ValueError) as error:
+                print("[!] Could not import '{}': {}".format(run_dir, error), file = sys.stderr)
+                continue
+            if run_id is None:
+                print("[+] '{}' was already imported, use --replace to import it again".format(run_dir))
+            else:
+                print("[+] Imported '{}' as run {} in {}".format(run_dir, run_id, format_time_unit(time.perf_counter() - start)))
+    else:
+        for line in run_query(db, args.sql):
+            print(line)
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
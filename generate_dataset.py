@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+import os
+import math
+import base64
+import random
+import hashlib
+import argparse
+import datetime
+
+# Generates a synthetic benchmark output directory with the same files benchmark.sh collects from a live testnet
+# (block_data_<chain>.txt, commit_data_<chain>.txt, consensus_params_<chain>.txt, logs_<chain>.txt, transfer_log.txt and hermes_log.txt),
+# so the analysis pipeline can be run and measured without gaiad or hermes.
+
+START_TIME = datetime.datetime(2023, 3, 1, 12, 0, 0)
+TX_GAS = 80000 # Gas used by a tx regardless of its messages (signature verification, fees)
+MSG_GAS = {"MsgTransfer": 25000, "MsgRecvPacket": 60000, "MsgAcknowledgement": 45000, "MsgTimeout": 45000} # Gas used per message
+GAS_ADJUSTMENT = 1.1 # Gas wanted over gas used, as estimated by the relayer and the gaiad CLI
+
+
+def format_log_time(timestamp):
+    # Hermes log timestamps are 27 characters long, e.g. 2023-03-01T12:00:00.123456Z
+    return timestamp.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def format_block_time(timestamp):
+    # Tendermint block times have nanosecond precision
+    return timestamp.strftime("%Y-%m-%dT%H:%M:%S.%f") + "000Z"
+
+
+def make_tx_hash(rng):
+    return hashlib.sha256(rng.getrandbits(64).to_bytes(8, "little")).hexdigest().upper()
+
+
+def get_tx_data(size, encoded_txs):
+    # Base64 encoded tx bytes of 'size' bytes, as collected for the detailed tx size analysis. Txs of the same size share
+    # the same (zeroed) payload, so each size is only encoded once
+    if size not in encoded_txs:
+        encoded_txs[size] = base64.b64encode(bytes(size)).decode("utf-8")
+    return encoded_txs[size]
+
+
+def get_tx_gas(tx):
+    return TX_GAS + sum([tx[msg_type] * gas for msg_type, gas in MSG_GAS.items()])
+
+
+def sample_latency(rng, mean, stddev):
+    # Latencies are log-normally distributed (long right tail), never below 10% of the mean
+    if mean <= 0:
+        return 0
+    if stddev <= 0:
+        return mean
+    variance = (stddev / mean) ** 2 + 1
+    mu = math.log(mean / variance ** 0.5)
+    sigma = math.log(variance) ** 0.5
+    return max(rng.lognormvariate(mu, sigma), mean * 0.1)
+
+
+class Chain:
+    # Block producer for one synthetic chain, blocks are created on demand as events need to be committed
+    def __init__(self, chain_id, rng, block_time, block_time_jitter, max_txs_per_block, n_validators, first_height):
+        self.chain_id = chain_id
+        self.rng = rng
+        self.block_time = block_time
+        self.block_time_jitter = block_time_jitter
+        self.max_txs_per_block = max_txs_per_block
+        self.validators = [hashlib.sha1("{}-{}".format(chain_id, i).encode()).hexdigest().upper() for i in range(n_validators)]
+        self.blocks = [] # [height, time, [txs]]
+        self.next_height = first_height
+        self.next_time = START_TIME
+
+    def new_block(self):
+        block = [self.next_height, self.next_time, []]
+        self.blocks.append(block)
+        self.next_height += 1
+        interval = self.rng.gauss(self.block_time, self.block_time_jitter)
+        self.next_time += datetime.timedelta(seconds = max(interval, self.block_time * 0.2))
+        return block
+
+    def commit(self, tx, not_before):
+        # Commit 'tx' to the first block created at or after 'not_before' that still has room for it
+        index = self.find_block(not_before)
+        while True:
+            while index >= len(self.blocks):
+                self.new_block()
+            if len(self.blocks[index][2]) < self.max_txs_per_block:
+                self.blocks[index][2].append(tx)
+                return self.blocks[index]
+            index += 1
+
+    def find_block(self, not_before):
+        # Binary search for the first block with time >= not_before
+        low, high = 0, len(self.blocks)
+        while low < high:
+            middle = (low + high) // 2
+            if self.blocks[middle][1] < not_before:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(self.blocks):
+            while self.next_time < not_before:
+                self.new_block()
+            return len(self.blocks)
+        return low
+
+    def add_empty_blocks(self, n_blocks):
+        for i in range(n_blocks):
+            self.new_block()
+
+    def write_blocks(self, output_dir, block_overhead, tx_data = False):
+        # With 'tx_data', every tx carries an encoded payload of its size, like the block data collected with tx_data_analysis
+        encoded_txs = {}
+        with open(output_dir + "block_data_" + self.chain_id + ".txt", "w") as f:
+            for height, timestamp, txs in self.blocks:
+                block_size = block_overhead + sum([tx["size"] for tx in txs])
+                transactions = ", ".join(['{{"tx_hash": "{}", "channel": "{}", "MsgTransfer": {}, "MsgRecvPacket": {}, "MsgAcknowledgement": {}, "MsgTimeout": {}, "gas_wanted": {}, "gas_used": {}{}}}'.format(
+                    tx["hash"], tx["channel"], tx["MsgTransfer"], tx["MsgRecvPacket"], tx["MsgAcknowledgement"], tx["MsgTimeout"], int(get_tx_gas(tx) * GAS_ADJUSTMENT),
+                    get_tx_gas(tx), ', "tx_data": "{}"'.format(get_tx_data(tx["size"], encoded_txs)) if tx_data else "") for tx in txs])
+                f.write('{{"chain-id": "{}", "block_height": {}, "block_time": "{}", "block_size": {}, "num_transactions": {}, "transactions": [{}]}}\n'.format(
+                    self.chain_id, height, format_block_time(timestamp), block_size, len(txs), transactions))
+
+    def write_commits(self, output_dir, vote_delay):
+        with open(output_dir + "commit_data_" + self.chain_id + ".txt", "w") as f:
+            for height, timestamp, txs in self.blocks:
+                commit_round = 1 if self.rng.random() < 0.02 else 0 # A few blocks need a second round
+                signatures = ", ".join(['{{"validator": "{}", "timestamp": "{}", "flag": 2}}'.format(validator,
+                    format_block_time(timestamp + datetime.timedelta(seconds = self.rng.expovariate(1 / vote_delay)))) for validator in self.validators])
+                f.write('{{"chain-id": "{}", "block_height": {}, "block_time": "{}", "proposer": "{}", "round": {}, "signatures": [{}]}}\n'.format(
+                    self.chain_id, height, format_block_time(timestamp), self.validators[height % len(self.validators)], commit_round, signatures))
+
+
+def generate_dataset(output_dir, n_users, n_txs, msgs_per_tx, src_chain_id = "blockchain0", dst_chain_id = "blockchain1", n_channels = 1,
+        block_time = 5.0, block_time_jitter = 0.5, max_txs_per_block = 50, n_validators = 5, submission_interval = 1.0,
+        recv_latency = 12.0, recv_latency_stddev = 6.0, ack_latency = 8.0, ack_latency_stddev = 2.0,
+        loss = 0.0, ack_loss = 0.0, timeout_blocks = 50, empty_blocks = 5, msg_size = 350, max_bytes = 22020096, max_gas = -1, tx_data = False, seed = 0):
+    # Simulate a benchmark run and write the files collected by benchmark.sh to 'output_dir'.
+    # Returns the number of blocks generated on the source and destination chains.
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok = True)
+    if not output_dir.endswith("/"):
+        output_dir += "/"
+
+    src = Chain(src_chain_id, rng, block_time, block_time_jitter, max_txs_per_block, n_validators, 100)
+    dst = Chain(dst_chain_id, rng, block_time, block_time_jitter, max_txs_per_block, n_validators, 100)
+
+    hermes_events = [] # [time, line] or [time, line_template, repetitions] entries, sorted before being written
+    transfer_events = []
+    src_confirmations = [] # Relayer "transactions confirmed" lines for acks (logs_<src>.txt)
+    dst_confirmations = [] # Relayer "transactions confirmed" lines for recvs (logs_<dst>.txt)
+
+    # Each user submits its transactions sequentially, waiting for the confirmation of the previous one
+    user_times = [START_TIME + datetime.timedelta(seconds = rng.uniform(0, submission_interval)) for user in range(n_users)]
+
+    for tx_number in range(n_txs):
+        for user in range(n_users):
+            channel = "channel-{}".format(user % n_channels)
+            submit_time = user_times[user]
+            transfer = {"hash": make_tx_hash(rng), "channel": channel, "MsgTransfer": msgs_per_tx, "MsgRecvPacket": 0, "MsgAcknowledgement": 0,
+                "MsgTimeout": 0, "size": msgs_per_tx * msg_size}
+            transfer_block = src.commit(transfer, submit_time)
+            committed_time = transfer_block[1]
+            user_times[user] = committed_time + datetime.timedelta(seconds = rng.uniform(0, submission_interval))
+
+            transfer_events.append([submit_time, "{} DEBUG ThreadId(01) wait_for_block_commits: waiting for commit of tx hashes(s) {} id={}".format(
+                format_log_time(submit_time), transfer["hash"], src_chain_id)])
+            transfer_events.append([committed_time, "{} DEBUG ThreadId(01) wait_for_block_commits: retrieved 1 tx results after {:.0f}ms id={}".format(
+                format_log_time(committed_time), (committed_time - submit_time).total_seconds() * 1000, src_chain_id)])
+            # One SendPacket event for each message in the transfer tx, expanded only when the log is written to keep memory low
+            hermes_events.append([committed_time, '{} TRACE ThreadId(14) packet_cmd{{src_chain={} src_port=transfer src_channel={}}}: event="SendPacket" sequence=<SEQUENCE> tx {} '.format(
+                format_log_time(committed_time), src_chain_id, channel, transfer["hash"]), msgs_per_tx])
+
+            # Packets that were lost are never received on the destination and time out on the source
+            delivered = sum([1 for msg in range(msgs_per_tx) if rng.random() >= loss]) if loss > 0 else msgs_per_tx
+            lost = msgs_per_tx - delivered
+
+            if lost > 0:
+                timeout = {"hash": make_tx_hash(rng), "channel": channel, "MsgTransfer": 0, "MsgRecvPacket": 0, "MsgAcknowledgement": 0,
+                    "MsgTimeout": lost, "size": lost * msg_size}
+                src.commit(timeout, committed_time + datetime.timedelta(seconds = timeout_blocks * block_time))
+
+            if delivered == 0:
+                continue
+
+            recv_broadcast = committed_time + datetime.timedelta(seconds = rng.uniform(0, block_time / 2))
+            recv = {"hash": make_tx_hash(rng), "channel": channel, "MsgTransfer": 0, "MsgRecvPacket": delivered, "MsgAcknowledgement": 0,
+                "MsgTimeout": 0, "size": delivered * msg_size * 3}
+            recv_time = dst.commit(recv, recv_broadcast + datetime.timedelta(seconds = sample_latency(rng, recv_latency, recv_latency_stddev)))[1]
+            hermes_events.append([recv_broadcast, "{} DEBUG ThreadId(25) send_tx_with_account_sequence_retry{{id={}}}: broadcast_tx_sync: Response {{ code: Ok, hash: transaction::Hash({}) }}".format(
+                format_log_time(recv_broadcast), dst_chain_id, recv["hash"])])
+            confirmation = "{} INFO ThreadId(25) packet_cmd{{src_chain={} dst_chain={}}}: transactions confirmed elapsed={:.3f}s ok: ; {}".format(
+                format_log_time(recv_time), src_chain_id, dst_chain_id, (recv_time - recv_broadcast).total_seconds(), recv["hash"])
+            hermes_events.append([recv_time, confirmation])
+            dst_confirmations.append([recv_time, confirmation])
+
+            acked = sum([1 for msg in range(delivered) if rng.random() >= ack_loss]) if ack_loss > 0 else delivered
+            if acked == 0:
+                continue
+
+            ack_broadcast = recv_time + datetime.timedelta(seconds = rng.uniform(0, block_time / 2))
+            ack = {"hash": make_tx_hash(rng), "channel": channel, "MsgTransfer": 0, "MsgRecvPacket": 0, "MsgAcknowledgement": acked,
+                "MsgTimeout": 0, "size": acked * msg_size * 2}
+            ack_time = src.commit(ack, ack_broadcast + datetime.timedelta(seconds = sample_latency(rng, ack_latency, ack_latency_stddev)))[1]
+            hermes_events.append([ack_broadcast, "{} DEBUG ThreadId(26) send_tx_with_account_sequence_retry{{id={}}}: broadcast_tx_sync: Response {{ code: Ok, hash: transaction::Hash({}) }}".format(
+                format_log_time(ack_broadcast), src_chain_id, ack["hash"])])
+            confirmation = "{} INFO ThreadId(26) packet_cmd{{src_chain={} dst_chain={}}}: transactions confirmed elapsed={:.3f}s ok: ; {}".format(
+                format_log_time(ack_time), dst_chain_id, src_chain_id, (ack_time - ack_broadcast).total_seconds(), ack["hash"])
+            hermes_events.append([ack_time, confirmation])
+            src_confirmations.append([ack_time, confirmation])
+
+    # The benchmark ends after a number of empty blocks in a row
+    src.add_empty_blocks(empty_blocks)
+    dst.add_empty_blocks(empty_blocks)
+
+    for chain in (src, dst):
+        chain.write_blocks(output_dir, 500 + n_validators * 100, tx_data) # Header and commit grow with the validator set
+        chain.write_commits(output_dir, block_time * 0.05)
+        with open(output_dir + "consensus_params_" + chain.chain_id + ".txt", "w") as f:
+            f.write('{{"block": {{"max_bytes": "{}", "max_gas": "{}", "time_iota_ms": "1000"}}}}\n'.format(max_bytes, max_gas))
+
+    for filename, events in (("hermes_log.txt", hermes_events), ("transfer_log.txt", transfer_events)):
+        events.sort(key = lambda event: event[0])
+        with open(output_dir + filename, "w") as f:
+            for event in events:
+                if len(event) == 3:
+                    for sequence in range(event[2]):
+                        f.write(event[1].replace("<SEQUENCE>", str(sequence)) + "\n")
+                else:
+                    f.write(event[1] + "\n")
+
+    # Same content get_relayer_data() in benchmark.sh extracts from the relayer logs
+    src_confirmations.sort(key = lambda event: event[0])
+    dst_confirmations.sort(key = lambda event: event[0])
+    with open(output_dir + "logs_" + src_chain_id + ".txt", "w") as f:
+        for event in src_confirmations:
+            f.write(event[1] + "\n")
+        for event in transfer_events:
+            f.write(event[1] + "\n")
+    with open(output_dir + "logs_" + dst_chain_id + ".txt", "w") as f:
+        for event in dst_confirmations:
+            f.write(event[1] + "\n")
+
+    return len(src.blocks), len(dst.blocks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Generate a synthetic benchmark data directory for the analysis pipeline.")
+    parser.add_argument("output_dir", help = "Directory in which to write the generated files.")
+    parser.add_argument("-u", "--users", type = int, default = 10, help = "Number of users submitting transactions (default: 10).")
+    parser.add_argument("-t", "--transactions", type = int, default = 25, help = "Number of transactions submitted per user (default: 25).")
+    parser.add_argument("-m", "--messages", type = int, default = 20, help = "Number of transfer messages per transaction (default: 20).")
+    parser.add_argument("-c", "--channels", type = int, default = 1, help = "Number of channels users are distributed across (default: 1).")
+    parser.add_argument("--src-chain-id", default = "blockchain0")
+    parser.add_argument("--dst-chain-id", default = "blockchain1")
+    parser.add_argument("--validators", type = int, default = 5, help = "Number of validators signing each block (default: 5).")
+    parser.add_argument("--block-time", type = float, default = 5.0, help = "Mean block interval in seconds (default: 5).")
+    parser.add_argument("--block-time-jitter", type = float, default = 0.5, help = "Standard deviation of the block interval in seconds (default: 0.5).")
+    parser.add_argument("--max-txs-per-block", type = int, default = 50, help = "Maximum number of transactions per block (default: 50).")
+    parser.add_argument("--max-bytes", type = int, default = 22020096, help = "Block size limit written to the consensus parameters (default: 22020096).")
+    parser.add_argument("--max-gas", type = int, default = -1, help = "Block gas limit written to the consensus parameters, -1 for unlimited (default: -1).")
+    parser.add_argument("--recv-latency", type = float, default = 12.0, help = "Mean seconds between a recv broadcast and its commit (default: 12).")
+    parser.add_argument("--recv-latency-stddev", type = float, default = 6.0)
+    parser.add_argument("--ack-latency", type = float, default = 8.0, help = "Mean seconds between an ack broadcast and its commit (default: 8).")
+    parser.add_argument("--ack-latency-stddev", type = float, default = 2.0)
+    parser.add_argument("--loss", type = float, default = 0.0, help = "Probability of a packet never being received (times out instead) (default: 0).")
+    parser.add_argument("--ack-loss", type = float, default = 0.0, help = "Probability of a received packet never being acknowledged (default: 0).")
+    parser.add_argument("--msg-size", type = int, default = 350, help = "Encoded size in bytes of a transfer message, recv and ack messages are 3 and 2 times larger (default: 350).")
+    parser.add_argument("--tx-data", action = "store_true", help = "Include the encoded tx bytes in the block data, for data_analysis.py with tx_data_analysis set to 'true'.")
+    parser.add_argument("--seed", type = int, default = 0, help = "Random seed, the same seed generates the same dataset (default: 0).")
+    args = parser.parse_args()
+
+    src_blocks, dst_blocks = generate_dataset(args.output_dir, args.users, args.transactions, args.messages, args.src_chain_id, args.dst_chain_id,
+        n_channels = args.channels, block_time = args.block_time, block_time_jitter = args.block_time_jitter, max_txs_per_block = args.max_txs_per_block,
+        n_validators = args.validators, recv_latency = args.recv_latency, recv_latency_stddev = args.recv_latency_stddev, ack_latency = args.ack_latency,
+        ack_latency_stddev = args.ack_latency_stddev, loss = args.loss, ack_loss = args.ack_loss, msg_size = args.msg_size,
+        max_bytes = args.max_bytes, max_gas = args.max_gas, tx_data = args.tx_data, seed = args.seed)
+
+    print("[+] Generated {} transfer messages in {} '{}' blocks and {} '{}' blocks in '{}'".format(args.users * args.transactions * args.messages,
+        src_blocks, args.src_chain_id, dst_blocks, args.dst_chain_id, args.output_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import datetime
+from analysis_functions import *
+
+# Renders the figures of a benchmark run to <data_dir>/plots/: confirmation latency and round trip time CDFs, round trip
+# time over time, per-block message timelines and tx distribution histograms. Series are downsampled before rendering
+# (min/max buckets for time series, evenly spaced ranks for CDFs, binning for histograms), so runs with millions of
+# messages still render quickly into small files. matplotlib is only needed when the figures are rendered.
+
+MAX_POINTS = 4000 # Maximum number of points drawn per series
+MAX_BINS = 60 # Maximum number of histogram bars
+
+
+def get_pyplot():
+    # Imported on demand, the analysis does not depend on matplotlib
+    import matplotlib
+    matplotlib.use("Agg") # Render to files, no display needed
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def minmax_downsample(xs, ys, max_points = MAX_POINTS):
+    # Split the series (sorted by x) into max_points / 2 buckets and keep the minimum and maximum of each, in x order,
+    # so spikes survive the downsampling
+    if len(xs) <= max_points:
+        return list(xs), list(ys)
+
+    n_buckets = max(max_points // 2, 1)
+    bucket_size = len(xs) / n_buckets
+    sampled_xs = list()
+    sampled_ys = list()
+    for bucket in range(n_buckets):
+        first = int(bucket * bucket_size)
+        last = max(int((bucket + 1) * bucket_size), first + 1)
+        low = min(range(first, last), key = lambda i: ys[i])
+        high = max(range(first, last), key = lambda i: ys[i])
+        for i in sorted(set([low, high])):
+            sampled_xs.append(xs[i])
+            sampled_ys.append(ys[i])
+    return sampled_xs, sampled_ys
+
+
+def cdf_points(values, max_points = MAX_POINTS):
+    # (value, cumulative fraction) pairs of the empirical CDF, at most max_points evenly spaced ranks (always including both ends)
+    values = sorted(values)
+    n = len(values)
+    if n == 0:
+        return [], []
+    if n <= max_points:
+        ranks = range(n)
+    else:
+        ranks = sorted(set([int(i * (n - 1) / (max_points - 1)) for i in range(max_points)]))
+    return [values[i] for i in ranks], [(i + 1) / n for i in ranks]
+
+
+def bin_values(values, max_bins = MAX_BINS):
+    # Histogram of integer values as (bin start, bin width, count). One bin per value when there are few distinct values
+    if len(values) == 0:
+        return []
+    low, high = min(values), max(values)
+    width = max(-(-(high - low + 1) // max_bins), 1)
+    counts = {}
+    for value in values:
+        start = low + (value - low) // width * width
+        counts[start] = counts.get(start, 0) + 1
+    return [[start, width, counts[start]] for start in sorted(counts.keys())]
+
+
+def parse_timestamp(timestamp):
+    # Fixed-format UTC timestamps of the relayer logs ('2023-03-01T12:00:04.593323Z') and the block data (nanoseconds), much faster
+    # than dateutil on millions of rows. The fraction is truncated to microseconds
+    date, _, fraction = timestamp.rstrip("Z").partition(".")
+    return datetime.datetime.fromisoformat(date + "." + (fraction + "000000")[:6])
+
+
+def read_round_trip_times(data_dir, filename):
+    # Transfer broadcast timestamps (unparsed, in broadcast order) and round trip times from the file written by calc_round_trip_time
+    if not os.path.exists(data_dir + filename):
+        return [], []
+    rows = [line.strip().split(";") for line in read_file(data_dir, filename)[1:]]
+    rows = [row for row in rows if len(row) == 5]
+    return [row[0] for row in rows], [float(row[4]) for row in rows]
+
+
+def get_round_trip_timeline(timestamps, rtts):
+    # (seconds since the first transfer broadcast, round trip time) pairs, min/max downsampled in broadcast order so only the
+    # timestamps of the kept rows are parsed
+    if len(rtts) == 0:
+        return [], []
+    indexes, rtts = minmax_downsample(range(len(rtts)), rtts)
+    first = parse_timestamp(timestamps[0])
+    return [(parse_timestamp(timestamps[i]) - first).total_seconds() for i in indexes], rtts
+
+
+def get_block_timeline(block_data):
+    # (seconds since the first block, messages committed in the block), min/max downsampled in height order so only the
+    # block times of the kept blocks are parsed
+    if len(block_data) == 0:
+        return [], []
+    messages = [sum([tx["MsgTransfer"] + tx["MsgRecvPacket"] + tx["MsgAcknowledgement"] + tx["MsgTimeout"] for tx in block["transactions"]]) for block in block_data]
+    indexes, messages = minmax_downsample(range(len(block_data)), messages)
+    first = parse_timestamp(block_data[0]["block_time"])
+    return [(parse_timestamp(block_data[i]["block_time"]) - first).total_seconds() for i in indexes], messages
+
+
+def plot_latency_cdf(plt, output_file, series):
+    # 'series' is a list of [label, values]
+    figure, axis = plt.subplots(figsize = (8, 5))
+    for label, values in series:
+        xs, ps = cdf_points(values)
+        if len(xs) > 0:
+            axis.step(xs, ps, where = "post", label = "{} ({} samples)".format(label, len(values)))
+    axis.set_xlabel("Latency (s)")
+    axis.set_ylabel("Cumulative fraction")
+    axis.set_ylim(0, 1)
+    axis.grid(alpha = 0.3)
+    axis.legend()
+    figure.tight_layout()
+    figure.savefig(output_file, dpi = 100)
+    plt.close(figure)
+
+
+def plot_round_trip_times(plt, output_file, timestamps, rtts):
+    xs, ys = get_round_trip_timeline(timestamps, rtts)
+    figure, axis = plt.subplots(figsize = (10, 5))
+    axis.scatter(xs, ys, s = 2, alpha = 0.5, linewidths = 0)
+    axis.set_xlabel("Transfer broadcast (s since the first transfer)")
+    axis.set_ylabel("Round trip time (s)")
+    axis.set_title("Round trip time of {} messages{}".format(len(rtts), " (min/max downsampled)" if len(xs) < len(rtts) else ""))
+    axis.grid(alpha = 0.3)
+    figure.tight_layout()
+    figure.savefig(output_file, dpi = 100)
+    plt.close(figure)
+
+
+def plot_block_timelines(plt, output_file, chains):
+    # 'chains' is a list of [chain_id, block_data]
+    figure, axes = plt.subplots(len(chains), 1, figsize = (10, 3 * len(chains)), sharex = True, squeeze = False)
+    for axis, (chain_id, block_data) in zip(axes[:, 0], chains):
+        times, messages = get_block_timeline(block_data)
+        axis.plot(times, messages, linewidth = 0.8)
+        axis.set_ylabel("Messages per block")
+        axis.set_title(chain_id)
+        axis.grid(alpha = 0.3)
+    axes[-1, 0].set_xlabel("Block time (s since the first block)")
+    figure.tight_layout()
+    figure.savefig(output_file, dpi = 100)
+    plt.close(figure)
+
+
+def plot_tx_distribution(plt, output_file, chains):
+    figure, axes = plt.subplots(1, len(chains), figsize = (5 * len(chains), 4), squeeze = False)
+    for axis, (chain_id, block_data) in zip(axes[0], chains):
+        bins = bin_values([len(block["transactions"]) for block in block_data])
+        axis.bar([b[0] for b in bins], [b[2] for b in bins], width = [b[1] * 0.9 for b in bins], align = "edge")
+        axis.set_xlabel("Txs per block")
+        axis.set_ylabel("Blocks")
+        axis.set_title(chain_id)
+        axis.grid(alpha = 0.3, axis = "y")
+    figure.tight_layout()
+    figure.savefig(output_file, dpi = 100)
+    plt.close(figure)
+
+
+def plot_run(data_dir, src_chain_id, dst_chain_id, src_blocks = None, dst_blocks = None, transfer_latency = None, recv_latency = None, ack_latency = None):
+    # Render every figure of the run in data_dir (with a trailing slash), reusing data already loaded by the analysis when given.
+    # Returns the list of files written
+    plt = get_pyplot()
+    plot_dir = data_dir + "plots/"
+    os.makedirs(plot_dir, exist_ok = True)
+    written = list()
+
+    if src_blocks is None:
+        src_blocks = load_json(read_file(data_dir, "block_data_" + src_chain_id + ".txt"))
+        dst_blocks = load_json(read_file(data_dir, "block_data_" + dst_chain_id + ".txt"))
+    if transfer_latency is None:
+        src_chain_latency_data = read_file(data_dir, "logs_" + src_chain_id + ".txt")
+        transfer_latency = parse_transfer_latency(src_chain_latency_data)
+        recv_latency = parse_recv_latency(read_file(data_dir, "logs_" + dst_chain_id + ".txt"))
+        ack_latency = parse_ack_latency(src_chain_latency_data)
+
+    timestamps, rtts = read_round_trip_times(data_dir, "round_trip_times.txt")
+
+    latency_series = [["transfer", [float(tx[1]) for tx in transfer_latency]], ["recv", [float(tx[1]) for tx in recv_latency]], ["ack", [float(tx[1]) for tx in ack_latency]]]
+    plot_latency_cdf(plt, plot_dir + "latency_cdf.png", [series for series in latency_series if len(series[1]) > 0])
+    written.append(plot_dir + "latency_cdf.png")
+
+    if len(rtts) > 0:
+        plot_latency_cdf(plt, plot_dir + "round_trip_time_cdf.png", [["round trip", rtts]])
+        plot_round_trip_times(plt, plot_dir + "round_trip_time.png", timestamps, rtts)
+        written += [plot_dir + "round_trip_time_cdf.png", plot_dir + "round_trip_time.png"]
+
+    chains = [[src_chain_id, src_blocks], [dst_chain_id, dst_blocks]]
+    plot_block_timelines(plt, plot_dir + "block_messages.png", chains)
+    plot_tx_distribution(plt, plot_dir + "tx_distribution.png", chains)
+    written += [plot_dir + "block_messages.png", plot_dir + "tx_distribution.png"]
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Render latency, round trip time and throughput figures of a benchmark run (requires matplotlib).")
+    parser.add_argument("data_dir", help = "Benchmark output directory, data_analysis.py must have been run for the round trip time figures.")
+    parser.add_argument("src_chain_id")
+    parser.add_argument("dst_chain_id")
+    args = parser.parse_args()
+
+    try:
+        written = plot_run(sanitize_path(args.data_dir) if not args.data_dir.startswith("/") else args.data_dir.rstrip("/") + "/", args.src_chain_id, args.dst_chain_id)
+    except ImportError:
+        print("[!] matplotlib is required to render the figures (pip install matplotlib)", file = sys.stderr)
+        raise SystemExit(1)
+
+    for filename in written:
+        print("[+] Wrote {}".format(filename))
+
+
+if __name__ == "__main__":
+    main()
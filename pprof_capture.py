@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import glob
+import json
+import time
+import fcntl
+import signal
+import argparse
+import threading
+import http.client
+
+# Captures CPU and heap profiles from the pprof endpoints (pprof_laddr in config.toml) of the local gaiad nodes:
+#  capture - profiles every local node of the given chains now, labelled with a benchmark phase
+#  watch   - follows the chains through RPC and profiles the nodes of a chain once it saturates: for several blocks
+#            in a row, the block is close to max_bytes or the mempool holds more txs than the block committed
+# Profiles are written to <output_dir>/pprof/<chain>_<node>_<phase>_<cpu|heap>.pb.gz (readable with 'go tool pprof')
+# and listed in <output_dir>/pprof/captures.txt with their start and end times, to align them with benchmark_phases.txt.
+# Nodes whose endpoint is not reachable (e.g. running on another machine) are recorded as unreachable and skipped.
+# A gaiad node serves a single CPU profile at a time, so CPU captures of the same node (from the phase captures and the
+# watcher alike) wait for each other through a lock file per node.
+
+CAPTURES_HEADER = "chain,node,phase,profile,start,end,file,status\n"
+
+
+def get_pprof_nodes(base_dir, chain_id):
+    # [node, pprof address] of the nodes created by setup_testnet.py for a chain, e.g. ['node1', 'localhost:6070']
+    nodes = list()
+    for config_file in glob.glob(os.path.join(base_dir, chain_id, "node*", "gaiad", "config", "config.toml")):
+        node = config_file.split(os.sep)[-4]
+        with open(config_file, "r") as f:
+            match = re.search(r'^pprof_laddr\s*=\s*"([^"]*)"', f.read(), re.MULTILINE)
+        if match and match.group(1):
+            nodes.append([node, match.group(1).replace("tcp://", "")])
+    return sorted(nodes, key = lambda node: int(node[0][len("node"):]) if node[0][len("node"):].isdigit() else 0)
+
+
+class HTTPStatusError(http.client.HTTPException):
+    def __init__(self, status, path):
+        super().__init__("HTTP {} for {}".format(status, path))
+        self.status = status
+
+
+def http_get(address, path, timeout):
+    host, port = address.rsplit(":", 1)
+    connection = http.client.HTTPConnection(host, int(port), timeout = timeout)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise HTTPStatusError(response.status, path)
+        return body
+    finally:
+        connection.close()
+
+
+def capture_profile(output_dir, chain_id, node, address, phase, profile, seconds, lock):
+    # Heap profiles are a snapshot, CPU profiles block for 'seconds' while the node is sampled
+    path = "/debug/pprof/profile?seconds={}".format(seconds) if profile == "cpu" else "/debug/pprof/heap"
+    filename = "{}_{}_{}_{}.pb.gz".format(chain_id, node, phase, profile)
+
+    node_lock = None
+    if profile == "cpu": # Wait for a CPU profile of the node that is still running, a concurrent request would be rejected
+        node_lock = open(output_dir + "pprof/.{}_{}_cpu.lock".format(chain_id, node), "w")
+        fcntl.flock(node_lock, fcntl.LOCK_EX)
+
+    start = time.time()
+    try:
+        data = http_get(address, path, seconds + 30)
+        with open(output_dir + "pprof/" + filename, "wb") as f:
+            f.write(data)
+        status = "ok"
+    except HTTPStatusError as error:
+        filename = ""
+        status = "error: {}".format(error.status)
+    except (OSError, http.client.HTTPException):
+        filename = ""
+        status = "unreachable"
+    finally:
+        if node_lock is not None:
+            node_lock.close() # Releases the lock
+    end = time.time()
+
+    with lock:
+        with open(output_dir + "pprof/captures.txt", "a") as f:
+            f.write("{},{},{},{},{:.6f},{:.6f},{},{}\n".format(chain_id, node, phase, profile, start, end, filename, status))
+    return status
+
+
+def start_captures(output_dir, base_dir, chain_ids, phase, seconds, lock):
+    # CPU and heap profiles of every node of the chains, in parallel so all nodes are profiled over the same period
+    threads = list()
+    for chain_id in chain_ids:
+        for node, address in get_pprof_nodes(base_dir, chain_id):
+            for profile in ("cpu", "heap"):
+                thread = threading.Thread(target = capture_profile, args = (output_dir, chain_id, node, address, phase, profile, seconds, lock))
+                thread.start()
+                threads.append(thread)
+    return threads
+
+
+def prepare_output(output_dir):
+    os.makedirs(output_dir + "pprof", exist_ok = True)
+    if not os.path.exists(output_dir + "pprof/captures.txt"):
+        with open(output_dir + "pprof/captures.txt", "w") as f:
+            f.write(CAPTURES_HEADER)
+
+
+def rpc_query(node_addr, path):
+    return json.loads(http_get(node_addr, path, 10))["result"]
+
+
+def get_max_bytes(node_addr):
+    return int(rpc_query(node_addr, "/consensus_params")["consensus_params"]["block"]["max_bytes"])
+
+
+def is_saturated(block_size, num_txs, pending_txs, max_bytes, threshold):
+    # The block is (almost) full, or more txs are waiting in the mempool than the block was able to commit
+    return block_size >= threshold * max_bytes or pending_txs > max(num_txs, 0)
+
+
+def watch(output_dir, base_dir, chains, seconds, threshold, n_blocks, interval):
+    # 'chains' is a list of [chain_id, rpc address]. Each chain is profiled at most once, when it saturates for n_blocks blocks in a row
+    running = [True]
+
+    def stop(signum, frame):
+        running[0] = False
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    lock = threading.Lock()
+    threads = list()
+    state = {}
+    for chain_id, node_addr in chains:
+        state[chain_id] = {"height": int(rpc_query(node_addr, "/status")["sync_info"]["latest_block_height"]), "max_bytes": get_max_bytes(node_addr),
+            "saturated_blocks": 0, "captured": False}
+
+    while running[0] and not all([state[chain_id]["captured"] for chain_id, node_addr in chains]):
+        for chain_id, node_addr in chains:
+            chain = state[chain_id]
+            if chain["captured"]:
+                continue
+            try:
+                height = int(rpc_query(node_addr, "/status")["sync_info"]["latest_block_height"])
+                if height <= chain["height"]:
+                    continue
+                pending_txs = int(rpc_query(node_addr, "/num_unconfirmed_txs")["n_txs"])
+                block_metas = rpc_query(node_addr, "/blockchain?minHeight={}&maxHeight={}".format(chain["height"] + 1, height))["block_metas"]
+            except (OSError, http.client.HTTPException, ValueError, KeyError):
+                continue # Node busy or restarting, try again on the next interval
+            chain["height"] = height
+
+            for block_meta in sorted(block_metas, key = lambda block_meta: int(block_meta["header"]["height"])):
+                if is_saturated(int(block_meta["block_size"]), int(block_meta["num_txs"]), pending_txs, chain["max_bytes"], threshold):
+                    chain["saturated_blocks"] += 1
+                else:
+                    chain["saturated_blocks"] = 0
+
+            if chain["saturated_blocks"] >= n_blocks:
+                print("[+] {} saturated at height {} ({} txs pending), capturing pprof profiles".format(chain_id, height, pending_txs))
+                threads += start_captures(output_dir, base_dir, [chain_id], "saturation", seconds, lock)
+                chain["captured"] = True
+        time.sleep(interval)
+
+    for thread in threads:
+        thread.join()
+
+
+def get_output_dir(path):
+    return path.rstrip("/") + "/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Capture CPU and heap profiles from the pprof endpoints of the local gaiad nodes.")
+    parser.add_argument("--base-dir", default = ".", help = "Directory containing the chain directories created by setup_chains.sh (default: current directory).")
+    parser.add_argument("--seconds", type = int, default = 10, help = "Duration of the CPU profiles (default: 10).")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+
+    capture_parser = subparsers.add_parser("capture", help = "Profile every local node of the chains now.")
+    capture_parser.add_argument("output_dir")
+    capture_parser.add_argument("phase", help = "Label of the profiles, e.g. the current benchmark phase.")
+    capture_parser.add_argument("chain_ids", nargs = "+")
+
+    watch_parser = subparsers.add_parser("watch", help = "Profile the nodes of a chain when it saturates, until terminated.")
+    watch_parser.add_argument("output_dir")
+    watch_parser.add_argument("chains", nargs = "+", help = "<chain_id>=<rpc address>, e.g. blockchain0=localhost:26657.")
+    watch_parser.add_argument("--threshold", type = float, default = 0.9, help = "Fraction of max_bytes from which a block is considered full (default: 0.9).")
+    watch_parser.add_argument("--blocks", type = int, default = 3, help = "Number of saturated blocks in a row that trigger the capture (default: 3).")
+    watch_parser.add_argument("--interval", type = float, default = 1.0, help = "Seconds between RPC polls (default: 1).")
+
+    args = parser.parse_args()
+    output_dir = get_output_dir(args.output_dir)
+    prepare_output(output_dir)
+
+    if args.command == "capture":
+        lock = threading.Lock()
+        threads = start_captures(output_dir, args.base_dir, args.chain_ids, args.phase, args.seconds, lock)
+        if len(threads) == 0:
+            print("[!] No gaiad node with a pprof address found for {}".format(", ".join(args.chain_ids)), file = sys.stderr)
+            raise SystemExit(1)
+        for thread in threads:
+            thread.join()
+
+    else:
+        chains = [chain.split("=", 1) for chain in args.chains]
+        if any([len(chain) != 2 for chain in chains]):
+            parser.error("chains must be given as <chain_id>=<rpc address>")
+        try:
+            watch(output_dir, args.base_dir, chains, args.seconds, args.threshold, args.blocks, args.interval)
+        except (OSError, http.client.HTTPException, ValueError, KeyError) as error:
+            print("[!] Could not watch the chains for saturation: {}".format(error), file = sys.stderr)
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
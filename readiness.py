@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import argparse
+import http.client
+
+# Readiness probes used by setup_chains.sh and benchmark.sh instead of fixed sleeps:
+#  nodes    - polls the /status endpoint of every node until it is not catching up and its height has advanced
+#  relayers - waits until every hermes instance logged that it started, or its REST endpoint reports packet workers
+# Returns as soon as everything is ready. On timeout, reports what was not ready and exits with a non-zero status.
+
+HERMES_STARTED = "Hermes has started"
+
+
+def http_get_json(address, path, timeout = 5):
+    host, port = address.replace("http://", "").replace("tcp://", "").rstrip("/").rsplit(":", 1)
+    connection = http.client.HTTPConnection(host, int(port), timeout = timeout)
+    try:
+        connection.request("GET", path)
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+
+def probe_node(address):
+    # (height, catching up) reported by the node
+    sync_info = http_get_json(address, "/status")["result"]["sync_info"]
+    return int(sync_info["latest_block_height"]), sync_info["catching_up"]
+
+
+def wait_for_nodes(addresses, timeout, interval):
+    # A node is ready when it is synchronized and produced (or received) a block after the probing started.
+    # Returns (ready, [address, state] of the nodes that are not ready)
+    first_heights = {}
+    states = {address: "no response" for address in addresses}
+    ready = set()
+    deadline = time.time() + timeout
+
+    while time.time() < deadline:
+        for address in addresses:
+            if address in ready:
+                continue
+            try:
+                height, catching_up = probe_node(address)
+            except (OSError, http.client.HTTPException, ValueError, KeyError) as error:
+                states[address] = "no response ({})".format(error)
+                continue
+            first_heights.setdefault(address, height)
+            if catching_up:
+                states[address] = "catching up at height {}".format(height)
+            elif height <= first_heights[address]:
+                states[address] = "height not advancing ({})".format(height)
+            else:
+                states[address] = "ready at height {}".format(height)
+                ready.add(address)
+
+        if len(ready) == len(addresses):
+            return True, []
+        time.sleep(interval)
+
+    return False, [[address, states[address]] for address in addresses if address not in ready]
+
+
+def relayer_started(log_file):
+    if not os.path.exists(log_file):
+        return False
+    with open(log_file, "r", errors = "replace") as f:
+        return any([HERMES_STARTED in line for line in f])
+
+
+def relayer_has_workers(rest_address):
+    # Hermes REST API (/state) lists the workers it spawned, packet workers relay the transfers
+    try:
+        state = http_get_json(rest_address, "/state")
+    except (OSError, http.client.HTTPException, ValueError):
+        return False
+    return state.get("status") == "success" and len(state.get("result", {}).get("workers", {}).get("Packet", [])) > 0
+
+
+def get_last_lines(log_file, n_lines):
+    if not os.path.exists(log_file):
+        return ["(no log file)"]
+    with open(log_file, "r", errors = "replace") as f:
+        return [line.rstrip("\n") for line in f.readlines()[-n_lines:]]
+
+
+def wait_for_relayers(relayers, timeout, interval):
+    # 'relayers' is a list of [log file, REST address or None]. Returns (ready, log files of the relayers that are not ready)
+    ready = set()
+    deadline = time.time() + timeout
+
+    while time.time() < deadline:
+        for log_file, rest_address in relayers:
+            if log_file not in ready and (relayer_started(log_file) or (rest_address and relayer_has_workers(rest_address))):
+                ready.add(log_file)
+        if len(ready) == len(relayers):
+            return True, []
+        time.sleep(interval)
+
+    return False, [log_file for log_file, rest_address in relayers if log_file not in ready]
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Wait until the chain nodes or the hermes relayers are ready.")
+    parser.add_argument("--timeout", type = float, default = 180, help = "Seconds to wait before giving up (default: 180).")
+    parser.add_argument("--interval", type = float, default = 1.0, help = "Seconds between probes (default: 1).")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+
+    nodes_parser = subparsers.add_parser("nodes", help = "Wait until every node is synchronized and its height advances.")
+    nodes_parser.add_argument("addresses", nargs = "+", help = "RPC addresses of the nodes, e.g. localhost:26657.")
+
+    relayers_parser = subparsers.add_parser("relayers", help = "Wait until every hermes instance has started.")
+    relayers_parser.add_argument("relayers", nargs = "+", help = "<log file>[=<REST address>], e.g. hermes_log.txt=localhost:3000.")
+
+    args = parser.parse_args()
+    start = time.time()
+
+    if args.command == "nodes":
+        ready, not_ready = wait_for_nodes(args.addresses, args.timeout, args.interval)
+        if not ready:
+            print("[!] {} of {} nodes not ready after {:.0f}s:".format(len(not_ready), len(args.addresses), args.timeout), file = sys.stderr)
+            for address, state in not_ready:
+                print("    {}: {}".format(address, state), file = sys.stderr)
+            raise SystemExit(1)
+        print("[+] {} nodes ready after {:.1f}s".format(len(args.addresses), time.time() - start))
+
+    else:
+        relayers = [relayer.split("=", 1) if "=" in relayer else [relayer, None] for relayer in args.relayers]
+        ready, not_ready = wait_for_relayers(relayers, args.timeout, args.interval)
+        if not ready:
+            print("[!] {} of {} relayers not started after {:.0f}s:".format(len(not_ready), len(relayers), args.timeout), file = sys.stderr)
+            for log_file in not_ready:
+                print("    {}, last log lines:".format(log_file), file = sys.stderr)
+                for line in get_last_lines(log_file, 5):
+                    print("      " + line, file = sys.stderr)
+            raise SystemExit(1)
+        print("[+] {} relayers started after {:.1f}s".format(len(relayers), time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import glob
+import shutil
+import argparse
+import itertools
+import subprocess
+from analysis_functions import *
+from event_warehouse import open_database, import_run
+
+# Sweeps hermes settings for throughput:
+#  run    - renders a hermes configuration for every combination of a parameter grid (e.g. max_msg_num, clear_interval,
+#           max_gas, gas_multiplier) and runs the same benchmark.sh workload against each of them
+#  report - imports the runs into <sweep_dir>/sweep.db (event_warehouse.py) and compares throughput, recv/ack latency and
+#           success rate per configuration, recommending the best one for each chain configuration
+# Layout: <sweep_dir>/sweep.json (grid and cells), <sweep_dir>/config<N>/hermes_config.toml, <sweep_dir>/config<N>/run<R>/ (benchmark output)
+
+SUCCESS_TOLERANCE = 1.0 # Configurations within this many percentage points of the best success rate are considered equally reliable
+
+
+def parse_grid(grid_args):
+    # ['max_msg_num=30,100', 'clear_interval=0,50'] -> [['max_msg_num', ['30', '100']], ['clear_interval', ['0', '50']]]
+    grid = list()
+    for grid_arg in grid_args:
+        key, _, values = grid_arg.partition("=")
+        if not key or not values:
+            raise ValueError("grid parameters must be given as <key>=<value>[,<value>...], got '{}'".format(grid_arg))
+        grid.append([key.strip(), [value.strip() for value in values.split(",")]])
+    return grid
+
+
+def render_config(template, params):
+    # Replace the value of every 'key = value' line of each parameter, in all sections (e.g. both [[chains]])
+    config = template
+    for key, value in params.items():
+        pattern = re.compile(r"^{} = .*$".format(re.escape(key)), re.MULTILINE)
+        if not pattern.search(config):
+            raise ValueError("'{}' is not set in the hermes configuration".format(key))
+        config = pattern.sub(lambda match: "{} = {}".format(key, value), config)
+    return config
+
+
+def get_cells(grid):
+    # Every combination of the grid values as {key: value}, in grid order
+    keys = [key for key, values in grid]
+    return [dict(zip(keys, values)) for values in itertools.product(*[values for key, values in grid])]
+
+
+def run_sweep(sweep_dir, template_file, grid, repetitions, benchmark_args, setup_command):
+    with open(template_file, "r") as f:
+        template = f.read()
+
+    cells = get_cells(grid)
+    # Render every configuration first, so an unknown parameter fails before any benchmark runs
+    configs = [render_config(template, params) for params in cells]
+
+    os.makedirs(sweep_dir, exist_ok = True)
+    with open(os.path.join(sweep_dir, "sweep.json"), "w") as f:
+        json.dump({"template": template_file, "grid": grid, "repetitions": repetitions, "benchmark_args": benchmark_args, "setup": setup_command,
+            "cells": [{"name": "config{}".format(i), "params": params} for i, params in enumerate(cells)]}, f, indent = 2)
+
+    failed = 0
+    for repetition in range(repetitions):
+        # Repetitions are the outer loop, so slow drifts of the testbed affect every configuration alike
+        for i, (params, config) in enumerate(zip(cells, configs)):
+            cell_dir = os.path.join(sweep_dir, "config{}".format(i))
+            os.makedirs(cell_dir, exist_ok = True)
+            config_file = os.path.join(cell_dir, "hermes_config.toml")
+            with open(config_file, "w") as f:
+                f.write(config)
+
+            print("[+] Running config{} ({}), repetition {} of {}".format(i, format_params(params), repetition + 1, repetitions))
+            if setup_command and subprocess.call(setup_command, shell = True) != 0:
+                print("[!] Setup command failed, skipping config{}".format(i), file = sys.stderr)
+                failed += 1
+                continue
+            run_dir = os.path.join(cell_dir, "run{}".format(repetition))
+            if subprocess.call(["./benchmark.sh"] + benchmark_args + ["-o", run_dir, "--hermes-config", config_file]) != 0:
+                print("[!] Benchmark failed for config{}".format(i), file = sys.stderr)
+                failed += 1
+    return failed
+
+
+def format_params(params):
+    return ", ".join("{} = {}".format(key, value) for key, value in params.items())
+
+
+def get_run_metrics(db, run_id):
+    # Throughput (messages/s) of both chains, success rate and recv/ack latency percentiles of an imported run
+    run = db.execute("SELECT src_chain_id, dst_chain_id, n_validators, n_users, n_txs, msgs_per_tx, n_channels FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    throughput = dict(db.execute("SELECT chain_id, messages_per_sec FROM run_throughput WHERE run_id = ?", (run_id,)).fetchall())
+    success = db.execute("SELECT finished_percentage FROM run_success_rate WHERE run_id = ?", (run_id,)).fetchone()
+    latency = {row[0]: row[1:] for row in db.execute("SELECT message, p50_latency, p99_latency FROM run_latency WHERE run_id = ?", (run_id,)).fetchall()}
+    return {"chain_config": "validators={} users={} txs={} msgs_per_tx={} channels={}".format(*run[2:]),
+        "src_throughput": throughput.get(run[0]), "dst_throughput": throughput.get(run[1]), "success": success[0] if success else None,
+        "recv_p50": latency.get("recv", (None, None))[0], "recv_p99": latency.get("recv", (None, None))[1],
+        "ack_p50": latency.get("ack", (None, None))[0], "ack_p99": latency.get("ack", (None, None))[1]}
+
+
+def average_metrics(runs):
+    # Mean of every metric over the repetitions of a configuration (metrics missing in a run are left out)
+    metrics = {}
+    for key in runs[0]:
+        if key == "chain_config":
+            continue
+        values = [run[key] for run in runs if run[key] is not None]
+        metrics[key] = sum(values) / len(values) if len(values) > 0 else None
+    return metrics
+
+
+def recommend(cells):
+    # Highest destination throughput (packets relayed to the destination chain per second) among the configurations whose success rate is
+    # within SUCCESS_TOLERANCE of the best one, ties broken by the lowest recv p99 latency
+    candidates = [cell for cell in cells if cell["metrics"]["success"] is not None and cell["metrics"]["dst_throughput"] is not None]
+    if len(candidates) == 0:
+        return None
+    best_success = max([cell["metrics"]["success"] for cell in candidates])
+    candidates = [cell for cell in candidates if cell["metrics"]["success"] >= best_success - SUCCESS_TOLERANCE]
+    return max(candidates, key = lambda cell: (cell["metrics"]["dst_throughput"], -(cell["metrics"]["recv_p99"] or float("inf"))))
+
+
+def format_metric(value, unit = ""):
+    return "-" if value is None else "{:.2f}{}".format(value, unit)
+
+
+def sweep_report(sweep_dir):
+    with open(os.path.join(sweep_dir, "sweep.json"), "r") as f:
+        sweep = json.load(f)
+
+    db = open_database(os.path.join(sweep_dir, "sweep.db"))
+    groups = {} # Cells grouped by chain configuration
+    for cell in sweep["cells"]:
+        runs = list()
+        for run_dir in sorted(glob.glob(os.path.join(sweep_dir, cell["name"], "run*"))):
+            if not os.path.exists(os.path.join(run_dir, "benchmarking_report.txt")): # Failed or unfinished run
+                continue
+            try:
+                run_id = import_run(db, run_dir, replace = True)
+            except (OSError, ValueError) as error:
+                print("[!] Could not import '{}': {}".format(run_dir, error), file = sys.stderr)
+                continue
+            runs.append(get_run_metrics(db, run_id))
+        if len(runs) == 0:
+            continue
+        for chain_config in sorted(set([run["chain_config"] for run in runs])):
+            group_runs = [run for run in runs if run["chain_config"] == chain_config]
+            groups.setdefault(chain_config, []).append({"name": cell["name"], "params": cell["params"], "runs": len(group_runs), "metrics": average_metrics(group_runs)})
+    db.close()
+
+    results = list()
+    results.append("[+] Hermes configuration sweep ({}):\n".format(", ".join("{} in [{}]".format(key, ", ".join(values)) for key, values in sweep["grid"])))
+    if len(groups) == 0:
+        results.append("  No finished runs")
+        return results, {}
+
+    recommendations = {}
+    for chain_config, cells in sorted(groups.items()):
+        results.append(" Chain configuration: {}".format(chain_config))
+        results.append("  {:<8} {:>4} {:>11} {:>11} {:>8} {:>9} {:>9} {:>9} {:>9}  {}".format("Config", "Runs", "Src msg/s", "Dst msg/s", "Success",
+            "Recv p50", "Recv p99", "Ack p50", "Ack p99", "Parameters"))
+        for cell in cells:
+            metrics = cell["metrics"]
+            results.append("  {:<8} {:>4} {:>11} {:>11} {:>8} {:>9} {:>9} {:>9} {:>9}  {}".format(cell["name"], cell["runs"], format_metric(metrics["src_throughput"]),
+                format_metric(metrics["dst_throughput"]), format_metric(metrics["success"], "%"), format_metric(metrics["recv_p50"], "s"),
+                format_metric(metrics["recv_p99"], "s"), format_metric(metrics["ack_p50"], "s"), format_metric(metrics["ack_p99"], "s"), format_params(cell["params"])))
+
+        best = recommend(cells)
+        if best is not None:
+            recommendations[chain_config] = best
+            results.append("  Recommended: {} ({}), {} msg/s on the destination chain with {} of the transfers finished".format(best["name"],
+                format_params(best["params"]), format_metric(best["metrics"]["dst_throughput"]), format_metric(best["metrics"]["success"], "%")))
+        results.append("")
+
+    return results, recommendations
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Run the same benchmark against hermes configurations rendered from a parameter grid and compare them.")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+
+    run_parser = subparsers.add_parser("run", help = "Render the configurations and run benchmark.sh against each (arguments after '--' are passed to benchmark.sh).")
+    run_parser.add_argument("sweep_dir")
+    run_parser.add_argument("-g", "--grid", action = "append", required = True,
+        help = "<key>=<value>[,<value>...] of a hermes setting, repeat for every swept setting (values are TOML literals without commas).")
+    run_parser.add_argument("--template", default = "hermes_config.toml", help = "Configuration the variants are rendered from (default: hermes_config.toml).")
+    run_parser.add_argument("-r", "--repetitions", type = int, default = 1, help = "Runs of every configuration, metrics are averaged (default: 1).")
+    run_parser.add_argument("--setup", default = "", help = "Shell command run before every benchmark, e.g. './setup_chains.sh -n 2 -a 10 --local' for a fresh testnet.")
+    run_parser.add_argument("benchmark_args", nargs = argparse.REMAINDER, help = "benchmark.sh arguments (without -o), e.g. -- -S localhost:26657 -D localhost:36657 -u 10 -t 25 -m 20")
+
+    report_parser = subparsers.add_parser("report", help = "Compare the configurations of a sweep and recommend the best one.")
+    report_parser.add_argument("sweep_dir")
+
+    args = parser.parse_args()
+    sweep_dir = args.sweep_dir.rstrip("/")
+
+    if args.command == "run":
+        benchmark_args = args.benchmark_args[1:] if args.benchmark_args[:1] == ["--"] else args.benchmark_args
+        if "-o" in benchmark_args or "--output-dir" in benchmark_args or "--hermes-config" in benchmark_args:
+            parser.error("-o and --hermes-config are set by the sweep for every run")
+        try:
+            failed = run_sweep(sweep_dir, args.template, parse_grid(args.grid), args.repetitions, benchmark_args, args.setup)
+        except (OSError, ValueError) as error:
+            print("[!] Could not run the sweep: {}".format(error), file = sys.stderr)
+            raise SystemExit(1)
+        if failed > 0:
+            print("[!] {} benchmark(s) failed".format(failed), file = sys.stderr)
+
+    results, recommendations = sweep_report(sweep_dir)
+    display_results([results])
+    write_results(sweep_dir + "/", [results], "sweep_report.txt")
+
+    # The recommended configuration of a single chain configuration is copied next to the report, ready to be used by benchmark.sh --hermes-config
+    if len(recommendations) == 1:
+        best = list(recommendations.values())[0]
+        shutil.copy2(os.path.join(sweep_dir, best["name"], "hermes_config.toml"), os.path.join(sweep_dir, "recommended_hermes_config.toml"))
+        print("[+] Recommended configuration written to '{}'".format(os.path.join(sweep_dir, "recommended_hermes_config.toml")))
+
+
+if __name__ == "__main__":
+    main()
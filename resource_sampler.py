@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+from analysis_functions import *
+
+# Samples CPU time, resident memory and disk I/O of every local gaiad and hermes process from /proc at a fixed interval.
+# Samples are appended to resource_samples.bin as fixed size records (RESOURCE_SAMPLE in analysis_functions.py), the processes they belong
+# to are described in resource_processes.json. Processes started after the sampler (e.g. restarted relayers) are picked
+# up on the next interval. Stops on SIGTERM/SIGINT.
+
+PROCESS_NAMES = ("gaiad", "hermes")
+
+
+def get_process_label(name, cmdline):
+    # Identify the node or relayer instance by its --home or --config argument, e.g. 'gaiad blockchain0/node1/gaiad'
+    for option in ("--home", "--config"):
+        if option in cmdline and cmdline.index(option) + 1 < len(cmdline):
+            return "{} {}".format(name, cmdline[cmdline.index(option) + 1].rstrip("/"))
+    return name
+
+
+def find_processes(names):
+    # {pid: label} of the running processes whose name is in 'names'
+    processes = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/{}/comm".format(entry), "r") as f:
+                name = f.read().strip()
+            if name not in names:
+                continue
+            with open("/proc/{}/cmdline".format(entry), "rb") as f:
+                cmdline = f.read().decode("utf-8", "replace").split("\0")
+        except OSError: # Process exited while being inspected
+            continue
+        processes[int(entry)] = get_process_label(name, cmdline)
+    return processes
+
+
+def read_process_sample(pid):
+    # (cpu ticks, rss kB, read bytes, write bytes) of a process, None if it exited. I/O counters are 0 when /proc/<pid>/io is not readable
+    try:
+        with open("/proc/{}/stat".format(pid), "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split() # The process name may contain spaces, fields start after it
+        cpu_ticks = int(fields[11]) + int(fields[12]) # utime + stime
+
+        rss = 0
+        with open("/proc/{}/status".format(pid), "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1])
+                    break
+    except (OSError, IndexError, ValueError):
+        return None
+
+    read_bytes = 0
+    write_bytes = 0
+    try:
+        with open("/proc/{}/io".format(pid), "r") as f:
+            for line in f:
+                if line.startswith("read_bytes:"):
+                    read_bytes = int(line.split()[1])
+                elif line.startswith("write_bytes:"):
+                    write_bytes = int(line.split()[1])
+    except OSError:
+        pass
+
+    return cpu_ticks, rss, read_bytes, write_bytes
+
+
+def write_processes(output_dir, processes):
+    with open(output_dir + "resource_processes.json", "w") as f:
+        json.dump({"clock_ticks": os.sysconf("SC_CLK_TCK"), "processes": {str(pid): label for pid, label in processes.items()}}, f, indent = 2)
+
+
+def run_sampler(output_dir, interval, names):
+    processes = {}
+    running = [True]
+
+    def stop(signum, frame):
+        running[0] = False
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    with open(output_dir + "resource_samples.bin", "ab") as f:
+        next_sample = time.time()
+        while running[0]:
+            current = find_processes(names)
+            if any([pid not in processes for pid in current]):
+                processes.update(current)
+                write_processes(output_dir, processes)
+
+            timestamp = time.time()
+            for pid in current:
+                sample = read_process_sample(pid)
+                if sample is not None:
+                    f.write(RESOURCE_SAMPLE.pack(timestamp, pid, *sample))
+            f.flush()
+
+            next_sample += interval
+            delay = next_sample - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_sample = time.time() # Fell behind, do not try to catch up with a burst of samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Sample CPU, memory and disk I/O of local gaiad and hermes processes until terminated.")
+    parser.add_argument("output_dir", help = "Directory in which to write resource_samples.bin and resource_processes.json.")
+    parser.add_argument("-i", "--interval", type = float, default = 1.0, help = "Seconds between samples (default: 1).")
+    args = parser.parse_args()
+
+    if not os.path.isdir("/proc"):
+        print("[!] /proc is not available, resource usage will not be sampled", file = sys.stderr)
+        raise SystemExit(1)
+
+    output_dir = sanitize_path(args.output_dir) if not args.output_dir.startswith("/") else args.output_dir.rstrip("/") + "/"
+    run_sampler(output_dir, args.interval, PROCESS_NAMES)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,24 @@
 #!/bin/bash
 
+# Number of relayer instances with funded keys on both chains
+NUM_RELAYERS=2
+
+# Number of transfer channels and whether they share connection-0 or get their own connection
+NUM_CHANNELS=1
+SEPARATE_CONNECTIONS="false"
+
+# Seconds to wait for every node to synchronize before giving up
+READY_TIMEOUT=180
+
+# Comma separated addresses of the machines running the nodes in remote mode, this machine first (node i runs on machine
+# i modulo the number of machines). Used for the peer addresses, the ssh/rsync steps and the readiness probes
+MACHINE_ADDRESSES=""
+
+# Single host mode: every node of both chains runs on this machine, optionally pinned to dedicated CPUs and with its data on tmpfs
+LOCAL_MODE="false"
+CPUS_PER_NODE=0
+TMPFS_DIR=""
+
 display_usage() {
   echo -e "$1"
   echo " Usage: ./$(basename $BASH_SOURCE)  -n <NUMBER_OF_NODES> -a <FUNDED_ACCOUNTS> -t [TIMEOUT_COMMIT]"
@@ -7,6 +26,14 @@ display_usage() {
   echo "   --nodes          | -n       Number of consensus nodes to run for each chain."
   echo "   --accounts       | -a       Number of funded accounts initialized in the source chain's genesis."
   echo "   --timeout-commit | -t       Minimum block interval in seconds (default: 5 seconds)."
+  echo "   --relayers       | -r       Number of relayer instances to create funded keys for (default: 2)."
+  echo "   --channels       | -c       Number of unordered transfer channels to create between the chains (default: 1)."
+  echo "   --separate-connections      Create every channel after the first over its own client and connection."
+  echo "   --ready-timeout             Seconds to wait for every node to synchronize and produce blocks (default: 180)."
+  echo "   --machines                  Comma separated addresses of the machines running the nodes, this machine first (required without --local)."
+  echo "   --local                     Run every node of both chains on this machine instead of the remote machines."
+  echo "   --pin-cpus                  With --local, pin every gaiad process to its own set of this many CPUs (default: 0, no pinning)."
+  echo "   --tmpfs                     With --local, place the data directory of every node in this tmpfs directory (e.g. /dev/shm)."
   echo -e "\n Example: ./$(basename $BASH_SOURCE) -n 5 -a 10 -t 5 \n"
   exit 1
 }
@@ -30,6 +57,44 @@ while [[ $# -gt 0 ]]; do
       shift
       shift
       ;;
+    -r|--relayers)
+      NUM_RELAYERS="$2"
+      shift
+      shift
+      ;;
+    -c|--channels)
+      NUM_CHANNELS="$2"
+      shift
+      shift
+      ;;
+    --separate-connections)
+      SEPARATE_CONNECTIONS="true"
+      shift
+      ;;
+    --ready-timeout)
+      READY_TIMEOUT="$2"
+      shift
+      shift
+      ;;
+    --machines)
+      MACHINE_ADDRESSES="$2"
+      shift
+      shift
+      ;;
+    --local)
+      LOCAL_MODE="true"
+      shift
+      ;;
+    --pin-cpus)
+      CPUS_PER_NODE="$2"
+      shift
+      shift
+      ;;
+    --tmpfs)
+      TMPFS_DIR="$2"
+      shift
+      shift
+      ;;
     -h|--help)
       display_usage
       ;;
@@ -49,6 +114,72 @@ if [[ -z "$NUM_NODES" || -z "$NUM_ACCOUNTS" ]]; then
   exit 1
 fi
 
+if [[ "$LOCAL_MODE" != "true" && ( -z "$MACHINE_ADDRESSES" || "$MACHINE_ADDRESSES" =~ (^|,)(,|$) ) ]]; then
+  display_usage " Remote mode requires the address of every machine running nodes (--machines or MACHINE_ADDRESSES), or use --local.\n"
+fi
+
+if [[ "$LOCAL_MODE" != "true" && ( "$CPUS_PER_NODE" -gt 0 || -n "$TMPFS_DIR" ) ]]; then
+  display_usage " --pin-cpus and --tmpfs require --local.\n"
+fi
+
+
+get_node_cpus() {
+    # CPU list (for taskset) of the NODE_INDEX-th gaiad process. Nodes take the last CPUs of the machine, the first ones are left to hermes and benchmark.sh
+    NODE_INDEX=$1
+    FIRST_CPU=$(( $(nproc) - $NUM_NODES * 2 * $CPUS_PER_NODE + $NODE_INDEX * $CPUS_PER_NODE ))
+    echo "$FIRST_CPU-$(( $FIRST_CPU + $CPUS_PER_NODE - 1 ))"
+}
+
+
+move_data_to_tmpfs() {
+    # Replace the data directory of a node with a symlink to a directory in TMPFS_DIR
+    CHAIN=$1
+    NODE_NUM=$2
+    NODE_HOME=$(pwd)/$CHAIN/node${NODE_NUM}/gaiad
+    TMPFS_DATA=$TMPFS_DIR/ibc_benchmark_${CHAIN}_node${NODE_NUM}
+
+    rm -rf $TMPFS_DATA
+    mv $NODE_HOME/data $TMPFS_DATA
+    ln -s $TMPFS_DATA $NODE_HOME/data
+}
+
+
+start_local_nodes() {
+    for chain in blockchain0 blockchain1; do
+        for node_num in `seq 0 1 $(( $NUM_NODES - 1 ))`; do
+            NODE_HOME=$(pwd)/$chain/node${node_num}/gaiad
+            if [ -n "$TMPFS_DIR" ]; then
+                move_data_to_tmpfs "$chain" "$node_num"
+            fi
+
+            if [ "$CPUS_PER_NODE" -gt 0 ]; then
+                NODE_INDEX=$(( ${chain#blockchain} * $NUM_NODES + $node_num ))
+                nohup taskset -c $(get_node_cpus "$NODE_INDEX") gaiad start --home $NODE_HOME --x-crisis-skip-assert-invariants --log_level error > /dev/null 2>&1 &
+            else
+                nohup gaiad start --home $NODE_HOME --x-crisis-skip-assert-invariants --log_level error > /dev/null 2>&1 &
+            fi
+        done
+    done
+}
+
+
+if [ "$LOCAL_MODE" = "true" ]; then
+    if [ "$CPUS_PER_NODE" -gt 0 ]; then
+        if ! command -v taskset > /dev/null; then
+            echo "[!] taskset (util-linux) is required for --pin-cpus. Aborting..."
+            exit 1
+        fi
+        FREE_CPUS=$(( $(nproc) - $NUM_NODES * 2 * $CPUS_PER_NODE ))
+        if [ $FREE_CPUS -lt 1 ]; then
+            echo "[!] $(( $NUM_NODES * 2 )) nodes with $CPUS_PER_NODE CPUs each need more than the $(nproc) CPUs of this machine (at least one is left for hermes). Aborting..."
+            exit 1
+        fi
+    fi
+    if [[ -n "$TMPFS_DIR" && "$(stat -f -c %T "$TMPFS_DIR" 2> /dev/null)" != "tmpfs" ]]; then
+        echo "[!] '$TMPFS_DIR' is not a tmpfs mount, node data will not be kept in memory"
+    fi
+fi
+
 
 # Stop running hermes processes
 killall hermes &> /dev/null 2>&1
@@ -60,8 +191,11 @@ sleep 1
 
 echo "[+] Generating testnet nodes..."
 # Start two gaiad chains with multiple nodes and configure them
-python3 setup_testnet.py blockchain0 defaults_chain0.txt $NUM_NODES $NUM_ACCOUNTS 'true' $TIMEOUT_COMMIT # chain0
-python3 setup_testnet.py blockchain1 defaults_chain1.txt $NUM_NODES $NUM_ACCOUNTS 'false' $TIMEOUT_COMMIT # chain1
+if [ "$LOCAL_MODE" = "true" ]; then
+    MACHINE_ADDRESSES="127.0.0.1" # Nodes peer with each other over the loopback interface
+fi
+python3 setup_testnet.py blockchain0 defaults_chain0.txt $NUM_NODES $NUM_ACCOUNTS 'true' ${TIMEOUT_COMMIT:-10} $NUM_RELAYERS $MACHINE_ADDRESSES # chain0
+python3 setup_testnet.py blockchain1 defaults_chain1.txt $NUM_NODES $NUM_ACCOUNTS 'false' ${TIMEOUT_COMMIT:-10} $NUM_RELAYERS $MACHINE_ADDRESSES # chain1
 
 sleep 1
 
@@ -75,6 +209,13 @@ hermes --config hermes_config.toml keys add --chain blockchain0 --overwrite --ke
 hermes --config hermes_config.toml keys add --chain blockchain1 --overwrite --key-file $(pwd)/blockchain1/node0/gaiad/testkey_hermes0_chain1_keys.json 
 #hermes -c hermes_config.toml keys add blockchain2 -f $(pwd)/chain2/node0/gaiad/testkey_keys.json
 
+# Keys for additional relayer instances started by benchmark.sh with --relayers (testkey_hermes1_*, testkey_hermes2_*, ...)
+for (( r=1; r<$NUM_RELAYERS; r++ ));
+do
+    hermes --config hermes_config.toml keys add --chain blockchain0 --overwrite --key-file $(pwd)/blockchain0/node0/gaiad/testkey_hermes"$r"_chain0_keys.json --key-name testkey_hermes"$r"_chain0
+    hermes --config hermes_config.toml keys add --chain blockchain1 --overwrite --key-file $(pwd)/blockchain1/node0/gaiad/testkey_hermes"$r"_chain1_keys.json --key-name testkey_hermes"$r"_chain1
+done
+
 
 # Kill gaiad daemons that were started when creating the testnet
 killall gaiad &> /dev/null 2>&1
@@ -89,42 +230,64 @@ do
 done 
 
 
-echo "[+] Setting up remote machines..."
-
 #  Copy testnet and node data to other machines
-machine_addresses=("" "" "" "" "") # Machines running tendermint nodes
-
-# For all the machines in the list, except the first one (this one), sync blockchain data
-for machine in "${machine_addresses[@]:1}"
-do
-    ssh jotavio@"${machine}" killall gaiad &> /dev/null 2>&1
-    ssh jotavio@"${machine}" rm -r /home/mula/jotavio/ibc_benchmark/blockchain0 &> /dev/null 2>&1
-    ssh jotavio@"${machine}" rm -r /home/mula/jotavio/ibc_benchmark/blockchain1 &> /dev/null 2>&1
-    rsync -a ~/ibc_benchmark/blockchain0 jotavio@${machine}:/home/mula/jotavio/ibc_benchmark/
-    rsync -a ~/ibc_benchmark/blockchain1 jotavio@${machine}:/home/mula/jotavio/ibc_benchmark/
-done
+IFS="," read -r -a machine_addresses <<< "$MACHINE_ADDRESSES" # Machines running tendermint nodes, the same list setup_testnet.py uses for the peers
+
+if [ "$LOCAL_MODE" = "true" ]; then
+    echo "[+] Starting $(( $NUM_NODES * 2 )) nodes on this machine..."
+    start_local_nodes
+    if [ "$CPUS_PER_NODE" -gt 0 ]; then
+        echo "[+] Nodes pinned to CPUs $(get_node_cpus 0) to $(get_node_cpus $(( $NUM_NODES * 2 - 1 ))), run benchmark.sh with --cpus 0-$(( $FREE_CPUS - 1 ))"
+    fi
+else
+    echo "[+] Setting up remote machines..."
+
+    # For all the machines in the list, except the first one (this one), sync blockchain data
+    for machine in "${machine_addresses[@]:1}"
+    do
+        ssh jotavio@"${machine}" killall gaiad &> /dev/null 2>&1
+        ssh jotavio@"${machine}" rm -r /home/mula/jotavio/ibc_benchmark/blockchain0 &> /dev/null 2>&1
+        ssh jotavio@"${machine}" rm -r /home/mula/jotavio/ibc_benchmark/blockchain1 &> /dev/null 2>&1
+        rsync -a ~/ibc_benchmark/blockchain0 jotavio@${machine}:/home/mula/jotavio/ibc_benchmark/
+        rsync -a ~/ibc_benchmark/blockchain1 jotavio@${machine}:/home/mula/jotavio/ibc_benchmark/
+    done
+
+
+    # Start the blockchain nodes in every machine
+    for node_num in `seq 0 1 $(( $NUM_NODES - 1 ))`
+    do
+        machine_index=$(( $node_num % ${#machine_addresses[@]} ))
+        ssh jotavio@"${machine_addresses[$machine_index]}" "killall hermes &> /dev/null 2>&1" # Kill running hermes processes in all machines
+        ssh jotavio@"${machine_addresses[$machine_index]}" "nohup /home/mula/jotavio/go/bin/gaiad start --home /home/mula/jotavio/ibc_benchmark/blockchain0/node${node_num}/gaiad --x-crisis-skip-assert-invariants --log_level error > /dev/null 2>&1 &"
+        ssh jotavio@"${machine_addresses[$machine_index]}" "nohup /home/mula/jotavio/go/bin/gaiad start --home /home/mula/jotavio/ibc_benchmark/blockchain1/node${node_num}/gaiad --x-crisis-skip-assert-invariants --log_level error > /dev/null 2>&1 &"
+    done
+
+
+    ssh ... "/home/mula/jotavio/.cargo/bin/hermes --config /home/mula/jotavio/ibc_benchmark/hermes_config.toml keys add --chain blockchain0 --overwrite --key-file /home/mula/jotavio/ibc_benchmark/blockchain0/node0/gaiad/testkey_hermes1_chain0_keys.json"
+
+    ssh ... "/home/mula/jotavio/.cargo/bin/hermes --config /home/mula/jotavio/ibc_benchmark/hermes_config.toml keys add --chain blockchain1 --overwrite --key-file /home/mula/jotavio/ibc_benchmark/blockchain1/node0/gaiad/testkey_hermes1_chain1_keys.json"
+fi
 
+echo "[+] Waiting for nodes to synchronize before establishing cross-chain channel..."
 
-# Start the blockchain nodes in every machine
+# Let the blockchain nodes synchronize before establishing cross-chain channel: poll the RPC endpoint of every node
+# (ports are incremented by 10 for each node by setup_testnet.py) until it is caught up and its height advances
+SRC_RPC_PORT=$(grep "^RPC_LADDR_PORT=" templates/defaults_chain0.txt | cut -d "=" -f 2)
+DST_RPC_PORT=$(grep "^RPC_LADDR_PORT=" templates/defaults_chain1.txt | cut -d "=" -f 2)
+node_endpoints=()
 for node_num in `seq 0 1 $(( $NUM_NODES - 1 ))`
 do
-    machine_index=$(( $node_num % 5 ))
-    ssh jotavio@"${machine_addresses[$machine_index]}" "killall hermes &> /dev/null 2>&1" # Kill running hermes processes in all machines
-    ssh jotavio@"${machine_addresses[$machine_index]}" "nohup /home/mula/jotavio/go/bin/gaiad start --home /home/mula/jotavio/ibc_benchmark/blockchain0/node${node_num}/gaiad --x-crisis-skip-assert-invariants --log_level error > /dev/null 2>&1 &"
-    ssh jotavio@"${machine_addresses[$machine_index]}" "nohup /home/mula/jotavio/go/bin/gaiad start --home /home/mula/jotavio/ibc_benchmark/blockchain1/node${node_num}/gaiad --x-crisis-skip-assert-invariants --log_level error > /dev/null 2>&1 &"
+    machine_address=${machine_addresses[$(( $node_num % ${#machine_addresses[@]} ))]}
+    node_endpoints+=("$machine_address:$(( $SRC_RPC_PORT + $node_num * 10 ))")
+    node_endpoints+=("$machine_address:$(( $DST_RPC_PORT + $node_num * 10 ))")
 done
 
+if ! python3 readiness.py --timeout "$READY_TIMEOUT" nodes "${node_endpoints[@]}"; then
+    echo "[!] The testnet nodes did not synchronize. Aborting..."
+    exit 1
+fi
 
-ssh ... "/home/mula/jotavio/.cargo/bin/hermes --config /home/mula/jotavio/ibc_benchmark/hermes_config.toml keys add --chain blockchain0 --overwrite --key-file /home/mula/jotavio/ibc_benchmark/blockchain0/node0/gaiad/testkey_hermes1_chain0_keys.json"
-
-ssh ... "/home/mula/jotavio/.cargo/bin/hermes --config /home/mula/jotavio/ibc_benchmark/hermes_config.toml keys add --chain blockchain1 --overwrite --key-file /home/mula/jotavio/ibc_benchmark/blockchain1/node0/gaiad/testkey_hermes1_chain1_keys.json"
-
-echo "[+] Waiting for nodes to synchronize before establishing cross-chain channel..."
-
-# Let the blockchain nodes synchronize before establishing cross-chain channel
-sleep 45
-
-echo "[+] Creating channel to relay packets between chain0 and chain1..."
+echo "[+] Creating $NUM_CHANNELS channel(s) to relay packets between chain0 and chain1..."
 # Create a path to relay packets between chain0 and chain1
 
 hermes --config hermes_config.toml create client --host-chain blockchain0 --reference-chain blockchain1
@@ -136,6 +299,16 @@ hermes --config hermes_config.toml create connection --a-chain blockchain0 --a-c
 
 hermes --config hermes_config.toml create channel --a-chain blockchain0 --a-connection connection-0 --a-port transfer --b-port transfer --order unordered
 
+# Additional channels (channel-1 ... channel-<N-1>), used by benchmark.sh --channels
+for (( c=1; c<$NUM_CHANNELS; c++ ));
+do
+    if [ "$SEPARATE_CONNECTIONS" = "true" ]; then
+        hermes --config hermes_config.toml create channel --a-chain blockchain0 --b-chain blockchain1 --a-port transfer --b-port transfer --order unordered --new-client-connection --yes
+    else
+        hermes --config hermes_config.toml create channel --a-chain blockchain0 --a-connection connection-0 --a-port transfer --b-port transfer --order unordered
+    fi
+done
+
 # hermes --config hermes_config.toml create channel --a-chain blockchain0 --b-chain blockchain1 --a-port transfer --b-port transfer --new-client-connection
 
 
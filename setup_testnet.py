@@ -64,7 +64,7 @@ def get_validator_id(node_dir):
 #---------------------------------- MAIN BODY ----------------------------------------
 
 if len(sys.argv) < 6:
-    print("[+] Usage: python3 {} <CHAIN_ID> <NETWORK_DEFAULTS.txt> <NUMBER_OF_NODES> <NUMBER_OF_ACCOUNTS> [TIMEOUT_COMMIT]".format(sys.argv[0].lstrip("./")))
+    print("[+] Usage: python3 {} <CHAIN_ID> <NETWORK_DEFAULTS.txt> <NUMBER_OF_NODES> <NUMBER_OF_ACCOUNTS> <INIT_ACCOUNTS> [TIMEOUT_COMMIT] [NUMBER_OF_RELAYERS] [MACHINE_ADDRESSES]".format(sys.argv[0].lstrip("./")))
     raise SystemExit
     
 chain_id = sys.argv[1] 
@@ -72,6 +72,8 @@ network_defaults = sys.argv[2] # File containing default network configuration
 number_of_nodes = int(sys.argv[3]) # Number of nodes to add to the testnet
 number_of_accounts = int(sys.argv[4])
 init_accounts = sys.argv[5] # If it's the source chain, initialize user accounts for transfers
+number_of_relayers = int(sys.argv[7]) if len(sys.argv) >= 8 else 2 # Number of relayer instances that need funded keys on the chain
+machine_addresses = sys.argv[8].split(",") if len(sys.argv) >= 9 else None # Comma separated addresses of the machines running the nodes (e.g. 127.0.0.1 for a single host)
 
 
 working_directory = os.getcwd() + "/" # Get current working directory
@@ -92,7 +94,7 @@ network_template = read_network_template(network_template_file)
 
 configuration_template = read_configuration_template(configuration_template_file)
 
-if len(sys.argv) == 7:
+if len(sys.argv) >= 7:
     try:
         tendermint_timeout_commit = int(sys.argv[6])
     except ValueError:
@@ -128,7 +130,7 @@ peer_ids = [get_validator_id(node_dir) for node_dir in node_directories]
 
 # Change peer addresses to the addresses of the remote machines
 
-remote_machine_addresses = ["", "", "", "", ""]
+remote_machine_addresses = machine_addresses if machine_addresses is not None else ["", "", "", "", ""]
 
 for i in range(len(peer_ids)):
     peer_id = peer_ids[i].split("@")[0]
@@ -152,18 +154,13 @@ print("\n[+] Testnet validator pubkeys: " + str(testnet_validator_pubkeys))
 node_dir = node_directories[0] # Directory for node0
 
 
-# Add a key named "testkey" that will be used by hermes to open a channel between the IBC chains (the key used by the relayer is defined in the hermes_config.toml file)
-subprocess.call(['gaiad --home {0} --keyring-backend=test keys add testkey_hermes0_chain0 --output json 2> {0}/testkey_hermes0_chain0_keys.json'.format(node_dir.rstrip('/config'))], shell=True)
-subprocess.call(['gaiad --home {0} --keyring-backend=test add-genesis-account $(gaiad --home {0} --keyring-backend=test keys show testkey_hermes0_chain0 -a) 1000000000000000stake,10000000000coins'.format(node_dir.rstrip('/config'))], shell=True)
-
-subprocess.call(['gaiad --home {0} --keyring-backend=test keys add testkey_hermes0_chain1 --output json 2> {0}/testkey_hermes0_chain1_keys.json'.format(node_dir.rstrip('/config'))], shell=True)
-subprocess.call(['gaiad --home {0} --keyring-backend=test add-genesis-account $(gaiad --home {0} --keyring-backend=test keys show testkey_hermes0_chain1 -a) 1000000000000000stake,10000000000coins'.format(node_dir.rstrip('/config'))], shell=True)
-
-subprocess.call(['gaiad --home {0} --keyring-backend=test keys add testkey_hermes1_chain0 --output json 2> {0}/testkey_hermes1_chain0_keys.json'.format(node_dir.rstrip('/config'))], shell=True)
-subprocess.call(['gaiad --home {0} --keyring-backend=test add-genesis-account $(gaiad --home {0} --keyring-backend=test keys show testkey_hermes1_chain0 -a) 1000000000000000stake,10000000000coins'.format(node_dir.rstrip('/config'))], shell=True)
-
-subprocess.call(['gaiad --home {0} --keyring-backend=test keys add testkey_hermes1_chain1 --output json 2> {0}/testkey_hermes1_chain1_keys.json'.format(node_dir.rstrip('/config'))], shell=True)
-subprocess.call(['gaiad --home {0} --keyring-backend=test add-genesis-account $(gaiad --home {0} --keyring-backend=test keys show testkey_hermes1_chain1 -a) 1000000000000000stake,10000000000coins'.format(node_dir.rstrip('/config'))], shell=True)
+# Add keys named "testkey_hermes<N>_chain<C>" that will be used by the relayer instances to open a channel between the IBC chains and relay packets
+# (the key used by each relayer is defined in its hermes configuration file). Each relayer instance needs its own key on both chains
+for relayer_number in range(number_of_relayers):
+    for chain_number in range(2):
+        key_name = 'testkey_hermes{}_chain{}'.format(relayer_number, chain_number)
+        subprocess.call(['gaiad --home {0} --keyring-backend=test keys add {1} --output json 2> {0}/{1}_keys.json'.format(node_dir.rstrip('/config'), key_name)], shell=True)
+        subprocess.call(['gaiad --home {0} --keyring-backend=test add-genesis-account $(gaiad --home {0} --keyring-backend=test keys show {1} -a) 1000000000000000stake,10000000000coins'.format(node_dir.rstrip('/config'), key_name)], shell=True)
 
 if init_accounts == 'true':
     print("\n[+] Generating {} user accounts and keys...".format(number_of_accounts))
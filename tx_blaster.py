@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+import http.server
+import concurrent.futures
+
+# Separates client-side submission cost from chain and relayer performance:
+#  prepare - builds and signs the whole workload of MsgTransfer txs offline and in parallel, with the account sequences
+#            of every user precomputed, writing them to a tx pool file (one base64 encoded tx per line)
+#  blast   - pushes the pool to a node through broadcast_tx_async over pooled keep-alive connections at a controlled rate,
+#            recording every broadcast in the workload trace format of benchmark.sh
+#  stub    - local RPC server answering broadcast_tx_async, to test the blaster without a testnet
+
+TX_GAS = 100000 # Gas requested by a tx regardless of its messages
+MSG_GAS = 60000 # Gas requested per MsgTransfer
+
+
+def run_gaiad(args):
+    return subprocess.check_output(["gaiad"] + args, stderr = subprocess.DEVNULL).decode("utf-8")
+
+
+def get_account(home, node, key_name):
+    # Address, account number and next sequence of a key in the test keyring
+    address = run_gaiad(["keys", "show", key_name, "-a", "--keyring-backend", "test", "--home", home]).strip()
+    account = json.loads(run_gaiad(["query", "auth", "account", address, "--node", "tcp://" + node, "-o", "json"]))
+    return address, int(account["account_number"]), int(account["sequence"])
+
+
+def generate_unsigned_tx(home, node, chain_id, key_name, channel, receiver, n_messages, timeout_height_offset):
+    # Unsigned transfer tx with 'n_messages' copies of the same MsgTransfer. The packet timeout is computed by gaiad
+    # from the destination height at preparation time
+    unsigned_tx = json.loads(run_gaiad(["tx", "ibc-transfer", "transfer", "transfer", channel, receiver, "1coins", "--from", key_name,
+        "--keyring-backend", "test", "--home", home, "--chain-id", chain_id, "--node", "tcp://" + node, "--generate-only",
+        "--packet-timeout-height", "0-{}".format(timeout_height_offset), "--packet-timeout-timestamp", "0",
+        "--gas", str(TX_GAS + MSG_GAS * n_messages)]))
+    unsigned_tx["body"]["messages"] = unsigned_tx["body"]["messages"] * n_messages
+    return unsigned_tx
+
+
+def sign_tx(home, chain_id, key_name, unsigned_file, account_number, sequence):
+    # Sign offline with an explicit sequence, so all txs of a user can be signed at the same time, and encode to base64
+    with tempfile.NamedTemporaryFile("w", suffix = ".json", delete = False) as signed_file:
+        signed_file.write(run_gaiad(["tx", "sign", unsigned_file, "--from", key_name, "--keyring-backend", "test", "--home", home, "--chain-id", chain_id,
+            "--offline", "--account-number", str(account_number), "--sequence", str(sequence)]))
+    try:
+        return run_gaiad(["tx", "encode", signed_file.name]).strip()
+    finally:
+        os.remove(signed_file.name)
+
+
+def prepare_pool(pool_file, home, node, chain_id, receiver, n_users, n_txs, n_messages, n_channels, timeout_height_offset, workers, synthetic):
+    # Sign the n_users * n_txs transfer txs, users are distributed across channels in round robin as in benchmark.sh.
+    # Pool lines: user,sequence,channel,messages,tx (base64), ordered by sequence so users are interleaved
+    jobs = list()
+    unsigned_files = list()
+
+    for user in range(1, n_users + 1):
+        key_name = "user{}".format(user)
+        channel = "channel-{}".format((user - 1) % n_channels)
+        if synthetic: # Random tx bytes, only useful against the stub RPC
+            for sequence in range(n_txs):
+                jobs.append([user, sequence, channel, None])
+            continue
+
+        address, account_number, first_sequence = get_account(home, node, key_name)
+        unsigned_tx = generate_unsigned_tx(home, node, chain_id, key_name, channel, receiver, n_messages, timeout_height_offset)
+        with tempfile.NamedTemporaryFile("w", suffix = ".json", delete = False) as unsigned_file:
+            json.dump(unsigned_tx, unsigned_file)
+        unsigned_files.append(unsigned_file.name)
+        for sequence in range(first_sequence, first_sequence + n_txs):
+            jobs.append([user, sequence, channel, [home, chain_id, key_name, unsigned_file.name, account_number, sequence]])
+
+    def sign_job(job):
+        if job[3] is None:
+            return base64.b64encode(random.getrandbits(8 * 256).to_bytes(256, "little")).decode("ascii")
+        return sign_tx(*job[3])
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers = workers) as executor: # Each job runs gaiad processes, threads are enough
+            encoded_txs = list(executor.map(sign_job, jobs))
+    finally:
+        for unsigned_file in unsigned_files:
+            os.remove(unsigned_file)
+
+    with open(pool_file, "w") as f:
+        for (user, sequence, channel, sign_args), encoded_tx in sorted(zip(jobs, encoded_txs), key = lambda item: (item[0][1], item[0][0])):
+            f.write("{},{},{},{},{}\n".format(user, sequence, channel, n_messages, encoded_tx))
+
+    return len(jobs)
+
+
+def read_pool(pool_file):
+    pool = list()
+    with open(pool_file, "r") as f:
+        for line in f:
+            user, sequence, channel, messages, encoded_tx = line.strip().split(",")
+            pool.append([int(user), int(sequence), channel, int(messages), encoded_tx])
+    return pool
+
+
+def broadcast_worker(node, txs, start, rate, records, lock):
+    # Send 'txs' in order over a single keep-alive connection. Tx number i of the pool is due at start + i / rate
+    host, port = node.split(":")
+    connection = http.client.HTTPConnection(host, int(port), timeout = 30)
+
+    for index, tx_number, (user, sequence, channel, messages, encoded_tx) in txs:
+        intended = start + index / rate if rate > 0 else start
+        delay = intended - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+        request = json.dumps({"jsonrpc": "2.0", "id": index, "method": "broadcast_tx_async", "params": {"tx": encoded_tx}})
+        actual = time.time()
+        try:
+            connection.request("POST", "/", request, {"Content-Type": "application/json"})
+            response = json.loads(connection.getresponse().read())
+            status = response["result"]["code"] if "result" in response else 1
+        except (OSError, http.client.HTTPException, ValueError):
+            connection.close() # Reconnects on the next request
+            status = 1
+        duration = time.time() - actual
+
+        with lock:
+            records.append([user, tx_number, channel, messages, intended - start, actual - start, duration, status])
+
+    connection.close()
+
+
+def blast(node, pool, rate, connections):
+    # Returns the workload trace records (user, tx, channel, messages, intended, actual, duration, status), times relative to the start.
+    # 'tx' numbers the txs of each user from 1 in sequence order, like the traces of benchmark.sh (the sequence stays in the pool file).
+    # All txs of a user go through the same connection, so they reach the mempool in sequence order
+    assignments = [list() for i in range(connections)]
+    tx_numbers = {} # User -> number of its txs assigned so far
+    for index, tx in sorted(enumerate(pool), key = lambda item: (item[1][1], item[0])):
+        tx_numbers[tx[0]] = tx_numbers.get(tx[0], 0) + 1
+        assignments[tx[0] % connections].append([index, tx_numbers[tx[0]], tx])
+    for txs in assignments:
+        txs.sort() # Pool order, which is the broadcast schedule
+
+    records = list()
+    lock = threading.Lock()
+    start = time.time()
+    threads = [threading.Thread(target = broadcast_worker, args = (node, txs, start, rate, records, lock)) for txs in assignments if len(txs) > 0]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return sorted(records, key = lambda record: record[5])
+
+
+def write_trace(trace_file, records, n_users, n_txs, n_messages, n_channels, tx_timeout):
+    # Same format as the workload traces written by benchmark.sh
+    with open(trace_file, "w") as f:
+        f.write("# users={} transactions={} messages={} channels={} tx_timeout={}\n".format(n_users, n_txs, n_messages, n_channels, tx_timeout))
+        f.write("user,tx,channel,messages,intended,actual,duration,status\n")
+        for record in records:
+            f.write("{},{},{},{},{:.6f},{:.6f},{:.6f},{}\n".format(*record))
+
+
+class StubRPCHandler(http.server.BaseHTTPRequestHandler):
+    # Answers broadcast_tx_async like a Tendermint node would, without checking the tx
+    protocol_version = "HTTP/1.1" # Keep-alive, as the blaster reuses its connections
+    disable_nagle_algorithm = True # Headers and body are written separately, avoid the delayed ACK stall on every response
+    latency = 0
+    received = 0
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if StubRPCHandler.latency > 0:
+            time.sleep(StubRPCHandler.latency)
+        StubRPCHandler.received += 1
+        tx_hash = hashlib.sha256(base64.b64decode(request["params"]["tx"])).hexdigest().upper()
+        body = json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": {"code": 0, "data": "", "log": "", "codespace": "", "hash": tx_hash}}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        return
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Pre-sign a pool of IBC transfer txs and broadcast it asynchronously at a controlled rate.")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+
+    prepare_parser = subparsers.add_parser("prepare", help = "Sign the whole workload offline and write it to a tx pool file.")
+    prepare_parser.add_argument("node", help = "RPC address of the source chain (used to query accounts and the packet timeout height).")
+    prepare_parser.add_argument("chain_id")
+    prepare_parser.add_argument("pool_file")
+    prepare_parser.add_argument("--home", default = "blockchain0/node0/gaiad", help = "gaiad home containing the user keys (default: blockchain0/node0/gaiad).")
+    prepare_parser.add_argument("--receiver", default = "", help = "Address receiving the transfers on the destination chain.")
+    prepare_parser.add_argument("-u", "--users", type = int, required = True)
+    prepare_parser.add_argument("-t", "--transactions", type = int, required = True, help = "Number of transactions per user.")
+    prepare_parser.add_argument("-m", "--messages", type = int, required = True, help = "Number of transfer messages per transaction.")
+    prepare_parser.add_argument("-c", "--channels", type = int, default = 1)
+    prepare_parser.add_argument("--tx-timeout", type = int, default = 50, help = "Packet timeout in destination blocks after preparation (default: 50).")
+    prepare_parser.add_argument("--workers", type = int, default = os.cpu_count(), help = "Number of txs signed in parallel (default: number of CPUs).")
+    prepare_parser.add_argument("--synthetic", action = "store_true", help = "Write random tx bytes instead of signing with gaiad (for testing against the stub RPC).")
+
+    blast_parser = subparsers.add_parser("blast", help = "Broadcast a tx pool with broadcast_tx_async.")
+    blast_parser.add_argument("node", help = "RPC address to broadcast to, e.g. localhost:26657.")
+    blast_parser.add_argument("pool_file")
+    blast_parser.add_argument("-r", "--rate", type = float, default = 0, help = "Txs per second, 0 sends as fast as possible (default: 0).")
+    blast_parser.add_argument("--connections", type = int, default = 8, help = "Number of pooled connections to the node (default: 8).")
+    blast_parser.add_argument("--trace", default = "", help = "Write the broadcasts to this file in the workload trace format.")
+    blast_parser.add_argument("-c", "--channels", type = int, default = 1, help = "Number of channels, recorded in the trace header (default: 1).")
+    blast_parser.add_argument("--tx-timeout", type = int, default = 50, help = "Packet timeout of the pool, recorded in the trace header (default: 50).")
+
+    stub_parser = subparsers.add_parser("stub", help = "Run a local RPC server that accepts every broadcast_tx_async.")
+    stub_parser.add_argument("--port", type = int, default = 26999)
+    stub_parser.add_argument("--latency", type = float, default = 0, help = "Seconds to wait before answering each request (default: 0).")
+
+    args = parser.parse_args()
+
+    if args.command == "prepare":
+        if not args.receiver and not args.synthetic:
+            parser.error("prepare needs a --receiver address unless --synthetic is given")
+        start = time.perf_counter()
+        try:
+            n_txs = prepare_pool(args.pool_file, args.home, args.node, args.chain_id, args.receiver, args.users, args.transactions, args.messages,
+                args.channels, args.tx_timeout, args.workers, args.synthetic)
+        except (OSError, subprocess.CalledProcessError, ValueError, KeyError) as error:
+            print("[!] Could not prepare the tx pool: {}".format(error), file = sys.stderr)
+            raise SystemExit(1)
+        print("[+] Signed {} txs in {:.2f}s and wrote them to '{}'".format(n_txs, time.perf_counter() - start, args.pool_file))
+
+    elif args.command == "blast":
+        pool = read_pool(args.pool_file)
+        records = blast(args.node, pool, args.rate, args.connections)
+        duration = max([record[5] + record[6] for record in records]) if len(records) > 0 else 0
+        failed = sum([1 for record in records if record[7] != 0])
+        lateness = [record[5] - record[4] for record in records]
+        print("[+] Broadcasted {} txs in {:.2f}s ({:.2f} txs/s), {} rejected or failed".format(len(records), duration, len(records) / duration if duration > 0 else 0, failed))
+        if len(lateness) > 0:
+            print("[+] Broadcasts started avg. {:.3f}s and max. {:.3f}s after their scheduled time".format(sum(lateness) / len(lateness), max(lateness)))
+        if args.trace:
+            users = set([tx[0] for tx in pool])
+            write_trace(args.trace, records, len(users), len(pool) // max(len(users), 1), pool[0][3] if len(pool) > 0 else 0, args.channels, args.tx_timeout)
+        if failed > 0:
+            raise SystemExit(1)
+
+    else:
+        StubRPCHandler.latency = args.latency
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", args.port), StubRPCHandler)
+        print("[+] Stub RPC listening on 127.0.0.1:{}".format(args.port))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("[+] Received {} broadcasts".format(StubRPCHandler.received))
+
+
+if __name__ == "__main__":
+    main()